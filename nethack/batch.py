@@ -0,0 +1,287 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Batch goes through an archive of recorded games, a worker process per core,
+# and runs extractors over every frame of every game to sum each one up in a
+# row.  The rows are merged in columns, one entry per game:
+#
+#   python batch.py --journal stats.journal stats.json games/*.ttyrec.gz
+#
+# Every game that's done is written down in the journal, so if the batch is
+# stopped, running it again picks up where it left off, and tries the games
+# that failed again.
+
+import multiprocessing
+import traceback
+import optparse
+import json
+import os
+import re
+
+from scraper import Screen
+from ttyrec import TtyrecReader, HEADER, GZIP, ZLIB
+
+class Extractor (object):
+    """ Base class for extractors.  A new one is made for each game; 'frame'
+        is called after each frame of the game is played, with the Frame and
+        the Screen, and 'finish' at the end returns the game's row, a dict of
+        column names to values that can be written as JSON. """
+    def frame (self, frame, screen):
+        pass
+
+    def finish (self):
+        return {}
+
+class StatusExtractor (Extractor):
+    """ I follow the status lines: how far the game got, how deep, how it
+        ended, and how many turns were spent on each dungeon level. """
+    def __init__ (self):
+        self.status = None
+        self.turns = 0
+        self.deepest = None
+        self.turnsPerLevel = {}
+
+    def frame (self, frame, screen):
+        status = frame.status
+        if status is self.status or status.dungeonLevel is None:
+            return
+        if status.turn > self.turns:
+            # The turns went by where the hero was before
+            level = str((self.status or status).dungeonLevel)
+            self.turnsPerLevel[level] = self.turnsPerLevel.get(level, 0) + status.turn - self.turns
+            self.turns = status.turn
+        self.status = status
+        if self.deepest is None or status.dungeonLevel > self.deepest:
+            self.deepest = status.dungeonLevel
+
+    def finish (self):
+        last = self.status
+        if last is None:
+            return {'turns': None, 'deepest': None, 'depth': None, 'hit_points': None,
+                    'max_hit_points': None, 'experience_level': None, 'gold': None,
+                    'turns_per_level': {}}
+        return {'turns': self.turns, 'deepest': self.deepest, 'depth': last.dungeonLevel,
+                'hit_points': last.hitPoints, 'max_hit_points': last.maxHitPoints,
+                'experience_level': last.experienceLevel, 'gold': last.gold,
+                'turns_per_level': self.turnsPerLevel}
+
+class MessageExtractor (Extractor):
+    """ I read the messages on the top line: how many there were, whether the
+        hero died, and how many times each of 'uses' matched, a list of (name,
+        regex) pairs of things done with items.  Subclasses can add to it. """
+    uses = [('eat', re.compile(r'This .* is delicious|You finish eating|You stop eating')),
+            ('read', re.compile(r'As you read the scroll')),
+            ('wear', re.compile(r'You are now wearing')),
+            ('engrave', re.compile(r'You write in the dust')),
+            ('pray', re.compile(r'You begin praying'))]
+    death = re.compile(r'You die\.\.\.|Do you want your possessions identified\?')
+
+    def __init__ (self):
+        self.version = 0
+        self.last = ''
+        self.messages = 0
+        self.died = False
+        self.counts = dict([(name, 0) for name, pattern in self.uses])
+
+    def frame (self, frame, screen):
+        if screen.rowVersions[0] <= self.version:
+            return
+        self.version = screen.version
+        line = screen.getRow(0).replace('--More--', '').strip()
+        if not line or line == self.last:
+            return
+        self.last = line
+        self.messages += 1
+        if self.death.search(line):
+            self.died = True
+        for name, pattern in self.uses:
+            if pattern.search(line):
+                self.counts[name] += 1
+
+    def finish (self):
+        return {'messages': self.messages, 'died': self.died, 'uses': self.counts}
+
+defaultExtractors = [StatusExtractor, MessageExtractor]
+
+suffixes = {'.gz': GZIP, '.z': ZLIB, '.zz': ZLIB, '.zlib': ZLIB}
+
+def compressionOf (filename):
+    """ How a ttyrec is compressed, going by its name, or by how it starts
+        if the name doesn't say """
+    compression = suffixes.get(os.path.splitext(filename)[1].lower())
+    if not compression is None:
+        return compression
+    try:
+        f = open(filename, 'rb')
+        try:
+            head = f.read(HEADER.size)
+        finally:
+            f.close()
+    except IOError:
+        return None
+    if head.startswith('\x1f\x8b'):
+        return GZIP
+    if (len(head) >= 2 and ord(head[0]) & 0x0f == 8 and
+        (ord(head[0]) * 256 + ord(head[1])) % 31 == 0):
+        # A zlib header, unless it's just as good as a frame's
+        if len(head) < HEADER.size or HEADER.unpack(head)[1] >= 1000000:
+            return ZLIB
+    return None
+
+def extract (job):
+    """ Internal auxiliary method.  What the workers do: play one game
+        through the extractors, and return (filename, frames, row, error) """
+    filename, extractorClasses = job
+    try:
+        reader = TtyrecReader(filename, compressionOf(filename))
+        try:
+            extractors = [extractorClass() for extractorClass in extractorClasses]
+            screen = Screen()
+            frames = 0
+            for frame in reader.replay(screen, timestamps=False):
+                for extractor in extractors:
+                    extractor.frame(frame, screen)
+                frames += 1
+        finally:
+            reader.close()
+        row = {}
+        for extractor in extractors:
+            row.update(extractor.finish())
+        return filename, frames, row, None
+    except Exception:
+        return filename, None, None, traceback.format_exc()
+
+class Batch (object):
+    """ I run 'extractors' (classes of Extractor; StatusExtractor and
+        MessageExtractor by default) over each of the ttyrecs in 'files',
+        on 'processes' worker processes, one for each core by default.
+        Iterate over 'results' to get a dict for each game as soon as it's
+        done, with its 'file', 'frames', 'row' and 'error' (the traceback, if
+        reading it failed).  If there's a 'journal' file, games already in it
+        aren't played again, but for the ones that failed, unless not 'retry'. """
+    def __init__ (self, files, extractors=None, journal=None, processes=None, retry=True):
+        if extractors is None:
+            extractors = defaultExtractors
+        self.files = list(files)
+        self.extractors = extractors
+        self.journal = journal
+        self.processes = processes or multiprocessing.cpu_count()
+        self.retry = retry
+        self.done = {}
+        self.torn = False # Whether the journal's last line was cut short
+        if not journal is None and os.path.exists(journal):
+            self.readJournal()
+
+    def readJournal (self):
+        """ Internal auxiliary method.  Loads the games that are done """
+        f = open(self.journal)
+        try:
+            for line in f:
+                self.torn = not line.endswith('\n')
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # Cut short when the batch was stopped
+                if entry['error'] and self.retry:
+                    self.done.pop(entry['file'], None)
+                else:
+                    self.done[entry['file']] = entry
+        finally:
+            f.close()
+
+    def pending (self):
+        """ Returns the files that still have to be played """
+        return [filename for filename in self.files if not self.done.has_key(filename)]
+
+    def results (self):
+        """ Plays the games that are pending, and yields each one's dict as
+            it's done, in whatever order they finish """
+        pending = self.pending()
+        if not pending:
+            return
+        log = None
+        if not self.journal is None:
+            log = open(self.journal, 'a')
+            if self.torn:
+                log.write('\n')
+                self.torn = False
+        pool = multiprocessing.Pool(min(self.processes, len(pending)))
+        try:
+            jobs = [(filename, self.extractors) for filename in pending]
+            for filename, frames, row, error in pool.imap_unordered(extract, jobs):
+                entry = {'file': filename, 'frames': frames, 'row': row, 'error': error}
+                if not log is None:
+                    # Messages are bytes off the terminal, that needn't be UTF-8
+                    log.write(json.dumps(entry, encoding='latin-1') + '\n')
+                    log.flush()
+                self.done[filename] = entry
+                yield entry
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            if not log is None:
+                log.close()
+
+    def run (self):
+        """ Plays all of the games that are pending, and returns how many """
+        count = 0
+        for entry in self.results():
+            count += 1
+        return count
+
+    def columns (self):
+        """ Returns the rows of the games that are done, merged in columns: a
+            dict of lists, with an entry for each game, in the order of 'files'.
+            There's a 'file', 'frames' and 'error' column, and a column for
+            each value in the rows; games that have no value for it get None. """
+        entries = [self.done[filename] for filename in self.files if self.done.has_key(filename)]
+        names = set()
+        for entry in entries:
+            names.update((entry['row'] or {}).keys())
+        result = {'file': [entry['file'] for entry in entries],
+                  'frames': [entry['frames'] for entry in entries],
+                  'error': [entry['error'] for entry in entries]}
+        for name in sorted(names):
+            result[name] = [(entry['row'] or {}).get(name) for entry in entries]
+        return result
+
+    def save (self, filename):
+        """ Write the columns to 'filename', as JSON """
+        f = open(filename, 'w')
+        try:
+            json.dump(self.columns(), f, encoding='latin-1', sort_keys=True)
+        finally:
+            f.close()
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage='%prog [options] OUTPUT TTYREC...')
+    parser.add_option('--journal', default=None,
+                      help='write down the games that are done here, and skip them next time')
+    parser.add_option('--processes', type='int', default=None,
+                      help='how many worker processes to use (one per core)')
+    parser.add_option('--no-retry', dest='retry', action='store_false', default=True,
+                      help="don't play the games that failed in the journal again")
+    options, args = parser.parse_args()
+    if len(args) < 2:
+        parser.error('an output file and some ttyrecs are needed')
+    batch = Batch(args[1:], journal=options.journal, processes=options.processes,
+                  retry=options.retry)
+    total = len(batch.pending())
+    for count, entry in enumerate(batch.results()):
+        status = entry['error'] and 'failed' or '%d frames' % entry['frames']
+        print '%d/%d %s: %s' % (count + 1, total, entry['file'], status)
+    batch.save(args[0])
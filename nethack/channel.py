@@ -0,0 +1,72 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# BufferedChannel is the part of a pexpect child that NetHackConnection
+# relies on, for children that get their output from somewhere else than
+# pexpect: a recording, the reactor...
+
+import re
+import pexpect
+
+class BufferedChannel (object):
+    """ I keep the output that's been read but not matched yet in 'buffer', and
+        match patterns against it the way pexpect does, leaving 'before',
+        'after' and 'match' as pexpect would. """
+    def __init__ (self):
+        self.buffer = ''
+        self.before = ''
+        self.after = ''
+        self.match = None
+        self.flag_eof = False
+        self.compiled = {}
+
+    def compile (self, pattern):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        if not self.compiled.has_key(pattern):
+            self.compiled[pattern] = re.compile(pattern)
+        return self.compiled[pattern]
+
+    def search (self, patterns):
+        """ Returns the index of the pattern that matches earliest in the buffer,
+            and takes the output up to the end of the match off the buffer, or
+            returns None if none of them match.  TIMEOUT and EOF are skipped. """
+        best = None
+        for index, pattern in enumerate(patterns):
+            if pattern is pexpect.TIMEOUT or pattern is pexpect.EOF:
+                continue
+            match = self.compile(pattern).search(self.buffer)
+            if not match is None and (best is None or match.start() < best[1].start()):
+                best = (index, match)
+        if best is None:
+            return None
+        index, self.match = best
+        self.before = self.buffer[:self.match.start()]
+        self.after = self.match.group(0)
+        self.buffer = self.buffer[self.match.end():]
+        return index
+
+    def special (self, special, patterns):
+        """ Returns the index of 'special' (TIMEOUT or EOF) in 'patterns', handing
+            out the whole buffer as 'before'.  Raises it if it isn't there. """
+        self.before, self.buffer = self.buffer, ''
+        self.after = special
+        self.match = special
+        if not special in patterns:
+            raise special ("%s: %s" % (self.__class__.__name__, special.__name__))
+        return patterns.index(special)
+
+    def sendline (self, msg=''):
+        return self.send (msg + '\n')
@@ -0,0 +1,107 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# InteractionClassifier recognises the questions the game asks, so that
+# NetHackConnection.watch can return the right Interaction.
+
+import re
+from interactions import Interaction, YesNoInteraction, YesNoQuitInteraction, \
+     SelectInteraction, SelectDialogInteraction, DirectionInteraction
+
+def selectDialog (server, question, selectDialogQuestion=None):
+    """ Factory for SelectDialogInteraction: the dialog's question isn't the
+        text that matched, but usually what the caller asked about. """
+    return SelectDialogInteraction (server, question=selectDialogQuestion)
+
+class InteractionClassifier (object):
+    """ I hold a list of prompt types, each a regular expression and a factory.
+        A prompt type matches if its pattern matches the text right before the
+        cursor (as Screen.matches does).  Prompt types are tried in the order
+        they were registered, but all of them are compiled in to a single
+        regular expression, so classifying costs a single match however many
+        there are.
+
+        The factory can be an Interaction class, that gets instantiated as
+        factory(server, question), or any other callable, that gets called as
+        factory(server, question, selectDialogQuestion).  'question' is the
+        text that matched. """
+    def __init__ (self):
+        self.prompts = []
+        self.compiled = None
+        self.groups = {}
+
+    def register (self, pattern, factory, name=None, first=False):
+        """ Add a new prompt type.  If 'first' is True it is tried before the
+            ones already registered. """
+        if name is None:
+            name = pattern
+        prompt = (name, pattern, factory)
+        if first:
+            self.prompts.insert(0, prompt)
+        else:
+            self.prompts.append(prompt)
+        self.compiled = None
+
+    def unregister (self, name):
+        """ Remove the prompt type called 'name' """
+        self.prompts = [prompt for prompt in self.prompts if prompt[0] != name]
+        self.compiled = None
+
+    def compile (self):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        alternatives = []
+        self.groups = {}
+        group = 1
+        for position, (name, pattern, factory) in enumerate(self.prompts):
+            if not pattern.endswith('$'):
+                pattern = pattern + '$'
+            alternatives.append('.*?(%s)' % pattern)
+            self.groups[group] = position
+            group += 1 + re.compile(pattern).groups
+        self.compiled = re.compile('|'.join(alternatives) or '(?!)')
+
+    def find (self, text):
+        """ Returns the first prompt type that matches 'text', as a (name, pattern,
+            factory) tuple, and the part of 'text' that matched.  Returns None if
+            no prompt type matches. """
+        if self.compiled is None:
+            self.compile()
+        match = self.compiled.match(text)
+        if match is None:
+            return None
+        group = match.lastindex
+        return self.prompts[self.groups[group]], match.group(group)
+
+    def classify (self, server, text, selectDialogQuestion=None):
+        """ Returns a new Interaction for the first prompt type that matches 'text',
+            or None if 'text' isn't a question we know about. """
+        found = self.find(text)
+        if found is None:
+            return None
+        (name, pattern, factory), question = found
+        if isinstance(factory, type) and issubclass(factory, Interaction):
+            return factory (server, question)
+        return factory (server, question, selectDialogQuestion)
+
+def defaultClassifier ():
+    """ Returns a classifier that knows about the questions watch has always recognised """
+    classifier = InteractionClassifier()
+    classifier.register (r'.* \[yn\]( \(.\))? ?', YesNoInteraction, 'yesno')
+    classifier.register (r'.* \[ynq\]( \(.\))? ?', YesNoQuitInteraction, 'yesnoquit')
+    classifier.register (r'.* \[.* or \?\*\] ', SelectInteraction, 'select')
+    classifier.register (r'\(end\) |\(\d+ of \d+\)', selectDialog, 'selectdialog')
+    classifier.register (r'In what direction.*\?.*', DirectionInteraction, 'direction')
+    return classifier
@@ -19,8 +19,22 @@
 
 import pexpect
 from scraper import Screen, WIDTH, HEIGHT
+from settle import SettleDetector
+from classifier import defaultClassifier
 import os
-from interactions import YesNoInteraction, YesNoQuitInteraction, SelectInteraction, SelectDialogInteraction, DirectionInteraction, FreeEntryInteraction, Information
+import logging
+from interactions import FreeEntryInteraction, Information
+from telnet import TelnetChild, address
+from instrumentation import WAIT, PARSE, CLASSIFY, OTHER
+from history import MessageHistory
+
+class Expect (object):
+    """ A step of NetHackConnection.watching: read until one of 'patterns' matches,
+        waiting up to 'timeout' seconds """
+    __slots__ = ['patterns', 'timeout']
+    def __init__ (self, patterns, timeout):
+        self.patterns = patterns
+        self.timeout = timeout
 
 class NetHackConnection(object):
     """ Base class for Nethack connections.  Instantiating this class won't
@@ -32,9 +46,13 @@ class NetHackConnection(object):
             screen = Screen()
         self.screen = screen
         self.info = None
-        self.history = []
+        self.history = MessageHistory()
         self.child = None # The actual connection
         self.pendingInteraction = None
+        self.settle = SettleDetector()
+        self.classifier = defaultClassifier()
+        self.instrumentation = None # Set it to an Instrumentation to see where the time goes
+        self.ttyrec = None # Set it to a TtyrecWriter to archive the game
         self.patchEnvironment()
 
     def patchEnvironment(self):
@@ -45,33 +63,96 @@ class NetHackConnection(object):
     def __getstate__(self):
         state = dict(self.__dict__)
         del state['child']
+        # Bots may have registered prompt types that can't be pickled
+        state.pop('classifier', None)
+        # The file it's writing to stays with this process
+        state['ttyrec'] = None
         return state
 
+    def __setstate__(self, state):
+        self.__dict__ = state
+        if not state.has_key('settle'):
+            self.settle = SettleDetector()
+        if not state.has_key('instrumentation'):
+            self.instrumentation = None
+        if not state.has_key('ttyrec'):
+            self.ttyrec = None
+        if isinstance(self.history, list):
+            history = MessageHistory()
+            for info in self.history:
+                history.append(info)
+            self.history = history
+        self.classifier = defaultClassifier()
+
     def send (self, msg):
         """ Sends 'msg' down the wire. """
+        self.settle.sent()
         self.child.send (msg)
 
     def sendline (self, msg):
         """ Sends 'msg' down the wire followed by a newline character. """
+        self.settle.sent()
         self.child.sendline (msg)
 
     def watch (self, expecting=None, selectDialogQuestion=None):
         """ Update the screen and see what happens.
             'expecting' is a regex or list of regexes that are checked before regular interactions.
             'selectDialogQuestion' is a question for selectDialogs, that often show the question before
-                                   the dialog. """    
+                                   the dialog.
+            Output is read as it comes in.  Once the screen settles (see SettleDetector) and
+            no more output follows, the game is waiting for us. """
+        steps = self.watching (expecting, selectDialogQuestion)
+        step = steps.next()
+        while isinstance(step, Expect):
+            step = steps.send(self.child.expect (step.patterns, timeout=step.timeout))
+        return step
+
+    def watching (self, expecting=None, selectDialogQuestion=None):
+        """ watch, one step at a time, for connections that don't read by
+            blocking in the child's expect.  This generator yields an Expect
+            each time it needs to read, and must be sent the index that the
+            child's expect would have returned for it.  The last thing it
+            yields is what watch returns. """
         if isinstance(expecting, basestring):
             expecting = [expecting]
-        patterns = ['--More--', pexpect.TIMEOUT, pexpect.EOF]
+        # The last pattern takes whatever output is available as soon as it comes in
+        patterns = ['--More--', pexpect.TIMEOUT, pexpect.EOF, '(?s).+']
         matched = None
         found = False
         info = []
         self.info = None
+        timing = self.instrumentation
+        if not timing is None:
+            cycle = timing.cycle()
         while not found:
-            i = self.child.expect (patterns, timeout=0.3)
+            step = Expect (patterns, self.settle.timeout(self.screen, expecting))
+            if not timing is None:
+                cycle.lap(OTHER)
+            i = yield step
+            if not timing is None:
+                cycle.lap(WAIT)
             self.screen.printstr(self.child.before)
+            received = len(self.child.before) > 0
             if not self.child.after in [pexpect.TIMEOUT, pexpect.EOF]:
                 self.screen.printstr(self.child.after)
+                received = received or len(self.child.after) > 0
+            if not self.ttyrec is None:
+                if self.child.after in [pexpect.TIMEOUT, pexpect.EOF]:
+                    self.record(self.child.before)
+                else:
+                    self.record(self.child.before + self.child.after)
+            if not timing is None:
+                cycle.lap(PARSE)
+                cycle.received(self.child.before)
+                if not self.child.after in [pexpect.TIMEOUT, pexpect.EOF]:
+                    cycle.received(self.child.after)
+            if received:
+                self.settle.received()
+            if i == 3:
+                if not self.screen.matches('--More--'):
+                    # Keep reading until the screen settles
+                    continue
+                i = 0
             if i == 0:
                 # --More--
                 if self.screen.cursorY == 0:
@@ -83,40 +164,30 @@ class NetHackConnection(object):
                     msg = self.screen.getArea(self.screen.cursorX - 9, 0, 80, self.screen.cursorY)
                 info += msg
                 self.send (' ')
+                if not timing is None:
+                    cycle.more()
             elif i == 1:
                 # Timed out.
+                text = self.screen.textBeforeCursor()
+                found = True
+                if not timing is None:
+                    cycle.lap(OTHER)
                 #  First: attempt to match what the user is expecting.
                 if not expecting is None:
-                    matched = self.screen.multiMatch(expecting)
-                    if not matched is None:
-                        found = True
-                if not found:
-                    if self.screen.matches (r'.* \[yn\]( \(.\))? ?'):
-                        matched = YesNoInteraction (self, self.screen.lastMatch().group(0))
-                        found = True
-                    elif self.screen.matches (r'.* \[ynq\]( \(.\))? ?'):
-                        matched = YesNoQuitInteraction (self, self.screen.lastMatch().group(0))
-                        found = True
-                    elif self.screen.matches (r'.* \[.* or \?\*\] '):
-                        matched = SelectInteraction (self, self.screen.lastMatch().group(0))
-                        found = True
-                    elif self.screen.matches (r'\(end\) |\(\d of \d\)'):
-                        matched = SelectDialogInteraction (self, question=selectDialogQuestion)
-                        found = True
-                    elif self.screen.matches (r'In what direction.*\?.*'):
-                        matched = DirectionInteraction (self, self.screen.lastMatch().group(0))
-                        found = True
-                    elif self.screen.cursorY == 0:
-                        # This can't be waiting for the player to move, we guess it's a free entry question
-                        matched = FreeEntryInteraction (self, self.screen.getRow(0).strip())
-                        found = True
-                    #elif... select position with cursor interaction
-                    #  Finally, assume the next turn is ready, and hand over control
-                    else:
-                        msg = self.screen.getRow(0).strip()
-                        if len(msg) > 0:
-                            info += [msg]
-                        found = True
+                    matched = self.screen.multiMatch(expecting, text)
+                if matched is None:
+                    matched = self.classifier.classify (self, text, selectDialogQuestion)
+                if matched is None and self.screen.cursorY == 0:
+                    # This can't be waiting for the player to move, we guess it's a free entry question
+                    matched = FreeEntryInteraction (self, self.screen.getRow(0).strip())
+                #elif... select position with cursor interaction
+                #  Finally, assume the next turn is ready, and hand over control
+                elif matched is None:
+                    msg = self.screen.getRow(0).strip()
+                    if len(msg) > 0:
+                        info += [msg]
+                if not timing is None:
+                    cycle.lap(CLASSIFY)
             elif i == 2:
                 # Game finished
                 found = True
@@ -127,7 +198,18 @@ class NetHackConnection(object):
             self.history.append(self.info)
             if matched is None:
                 matched = self.info
-        return matched
+        if not timing is None:
+            cycle.end()
+        yield matched
+
+    def record (self, data):
+        """ Internal auxiliary method.  Adds 'data' to the ttyrec.  If it can't
+            be written, recording stops, but the game goes on. """
+        try:
+            self.ttyrec.write(data)
+        except (IOError, ValueError), e:
+            logging.getLogger('nethack').error("Stopped recording the game: %s", e)
+            self.ttyrec = None
 
     def getArea (self, x=0, y=0, w=WIDTH, h=HEIGHT):
         """ Retrieve a rectangular area of the screen """
@@ -147,7 +229,7 @@ class NetHackConnection(object):
 
     def cellAt (self, x, y):
         """ Returns the current contents of the Cell at position (x, y) """
-        return self.screen.screen[y][x]
+        return self.screen.cellAt(x, y)
         
     def interact(self):
         self.child.send (chr(18)) # CTRL+R to redraw screen
@@ -165,7 +247,7 @@ class LocalNetHackConnection(NetHackConnection):
     def __setstate__(self, state):
         """ FIXME: __setstate__ duplicates constructor functionallity """
         self.patchEnvironment()
-        self.__dict__ = state
+        super (LocalNetHackConnection, self).__setstate__(state)
         userstr = (not self.username is None) and ('-u ' + self.username) or ''
         self.child = pexpect.spawn ("nethack %s" % userstr)
 
@@ -175,14 +257,14 @@ class RemoteNetHackConnection(NetHackConnection):
         self.user = user
         self.passwd = passwd
         self.host = host
-        self.child = pexpect.spawn ("telnet %s" % host)
+        self.child = TelnetChild (*address(host))
         self.login()
 
     def __setstate__(self, state):
         """ FIXME: __setstate__ duplicates constructor functionallity """
         self.patchEnvironment()
-        self.__dict__ = state
-        self.child = pexpect.spawn ("telnet %s" % self.host)
+        super (RemoteNetHackConnection, self).__setstate__(state)
+        self.child = TelnetChild (*address(self.host))
 
     def parseOptions (self, sep, x, y, w, h):
         """ Parse an area of the screen as a list of options. Used for parsing
@@ -1,6 +1,10 @@
+import numpy
+
 from interactions import YesNoInteraction, YesNoQuitInteraction, Information
 
 from nethack import NetHackPlayer
+from mapanalysis import MapView, bestSite, YES
+from pathfinding import PathFinder
 
 W = 80
 H = 21
@@ -91,9 +95,11 @@ class Introspective (NetHackPlayer):
 
 class LevelStuff (object):
     def __init__(self):
-        self.beenThere = [[False] * W for i in range(H)]
-        self.reachable = [['Maybe'] * W for i in range(H)]
-        self.searched = [[0] * W for i in range(H)]
+        self.beenThere = numpy.zeros((H, W), dtype=numpy.bool_)
+        self.reachable = numpy.zeros((H, W), dtype=numpy.uint8) # See mapanalysis.MAYBE, YES and NO
+        self.searched = numpy.zeros((H, W), dtype=numpy.int32)
+        self.blocked = numpy.zeros((H, W), dtype=numpy.bool_) # Boulders we couldn't push
+        self.paths = PathFinder()
 
 class Explorer (NetHackPlayer):
     """ I crawl the dungeon searching for stairs, and go down them """
@@ -107,86 +113,20 @@ class Explorer (NetHackPlayer):
         self.levelStuffs = {}
         dead = False
 
-    def hasInspected (self, y, x):
-        """ True if you've been in some cell adjacent to (y,x) -- ie you've been able to see what's there
-            even if there's no light in the room (unless you're blind... we'll worry about that later)"""
-        result = False
-        for d in self.dy.keys():
-            if 0 <= y+self.dy[d] and y+self.dy[d] < H and 0 <= x+self.dx[d] and x+self.dx[d] < W:
-                if self.beenThere[y+self.dy[d]][x+self.dx[d]]:
-                    result = True
-        return result
-
-    def somethingToExploreAt (self, y, x):
-        """ True if some cell surrounding (j, i) may be reachable """
-        result = False
-        for d in self.dy.keys():
-            if 0 <= y+self.dy[d] and y+self.dy[d] < H and 0 <= x+self.dx[d] and x+self.dx[d] < W:
-                if self.reachable[y+self.dy[d]][x+self.dx[d]] == 'Maybe':
-                    result = True
-        return result
-
-    def reachableDistance (self, j, i):
-        """ Calculates a full matrix of distances with 'graph', starting from ('j', 'i'),
-            traveling only along reachable squares """
-        self.distances = [[-1] * W for row in range(H)]
-        self.distances[j][i] = 0
-        stack = [(j, i)]
-        while len(stack):
-            y, x = stack.pop()
-            for d in self.dx.keys():
-                if self.distances[y+self.dy[d]][x+self.dx[d]] == -1 and self.reachable[y+self.dy[d]][x+self.dx[d]] == 'Yes':
-                    self.distances[y+self.dy[d]][x+self.dx[d]] = self.distances[y][x] + 1
-                    stack = [(y+self.dy[d], x+self.dx[d])] + stack
-
     def normalExploratoryDecision (self):
-        for j in range(H):
-            for i in range(W):
-                if self.look(i, j).char in r'.#?\dfkx@+><%$(}][{):!"`/_': # Floor and stuff lying there
-                    self.reachable[j][i] = 'Yes'
-                elif self.beenThere[j][i]:
-                    self.reachable[j][i] = 'Yes'
-                elif self.look(i, j).char in '-|':
-                    if self.look(i, j).foreground == 9: # Walls
-                        self.reachable[j][i] = 'No'
-                    else: # Open doors
-                        self.reachable[j][i] = 'Yes'
-                elif self.look(i, j).char == ' ':
-                    if self.hasInspected (j,i):
-                        self.reachable[j][i] = 'No'
-        interesting = [[0] * W for i in range(H)]
-        for j in range(H):
-            for i in range(W):
-                if self.look(i, j).char in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ:@&;' and not self.look(i, j).inverse: # Monsters are interesting
-                    interesting[j][i] = 1
-                if self.reachable[j][i] == 'Yes' and not self.beenThere[j][i] and self.somethingToExploreAt (j, i):
-                    interesting[j][i] = 1
-                elif self.look (i, j).char == '>':
-                    interesting[j][i] = 2
-        sites = [(j, i) for j in range(H) for i in range(W) if interesting[j][i]]
-        if len(sites) == 0:
+        """ Returns the direction to walk towards the most interesting place we can reach:
+            the down stairs, a monster, or the edge of what we've explored. """
+        view = MapView (self.server.screen)
+        view.updateReachable (self.reachable, self.beenThere)
+        interesting = view.interesting (self.reachable, self.beenThere)
+        if not interesting.any():
             return None
-        self.reachableDistance (self.y(), self.x())
-        sites = [site for site in sites if self.distances[site[0]][site[1]] > 0]
-        if len(sites) == 0:
+        self.paths.update ((self.reachable == YES) & ~self.blocked & ~view.boulders, view.doorways)
+        self.distances = self.paths.distances (self.y(), self.x())
+        best = bestSite (interesting, self.distances)
+        if best is None:
             return None
-        best = sites[0]
-        for site in sites:
-            if (interesting[site[0]][site[1]] > interesting[best[0]][best[1]] or
-              (interesting[site[0]][site[1]] == interesting[best[0]][best[1]] and
-              self.distances[site[0]][site[1]] < self.distances[best[0]][best[1]])):
-                best = site
-        curY, curX = best
-        while self.distances[curY][curX] > 0:
-            for d in self.dx.keys():
-                if 0 <= curY-self.dy[d] and curY-self.dy[d] < H and 0 <= curX-self.dx[d] and curX-self.dx[d] < W:
-                    dist = self.distances[curY-self.dy[d]][curX-self.dx[d]]
-                    if dist >= 0 and dist < self.distances[curY][curX]:
-                        curY = curY-self.dy[d]
-                        curX = curX-self.dx[d]
-                        if self.distances[curY][curX] == 0:
-                            return d
-                        break
+        return self.paths.firstStep (self.distances, best[0], best[1])
 
     def searchingExploratoryDecision (self):
         pass
@@ -220,6 +160,8 @@ class Explorer (NetHackPlayer):
         self.beenThere = lStuff.beenThere
         self.reachable = lStuff.reachable
         self.searched = lStuff.searched
+        self.blocked = lStuff.blocked
+        self.paths = lStuff.paths
     
 
     def run (self):
@@ -252,13 +194,8 @@ class Explorer (NetHackPlayer):
                     # We seem to have crawled the whole dungeon level, we'll have to search
                     d = self.searchingExploratoryDecision ()
                     raise ValueError, "I'm lost :("
-                if not atNextPos is None and len(d) == 2:
-                    if atNextPos in '|-': # You can't leave doorways diagonally
-                        d = atNextPos == '|' and d[1] or d[0]
                 target = (self.y()+self.dy[d], self.x()+self.dx[d])
                 atNextPos = self.look (target[1],target[0]).char
-                if len(d) == 2 and atNextPos in '|-': # You can't enter doorways diagonally
-                    d = atNextPos == '|' and d[1] or d[0]
                 msg = self.go (d)
                 moved = True
 
@@ -266,7 +203,7 @@ class Explorer (NetHackPlayer):
                 dead = True
             elif isinstance (msg, Information) and 'You try to move the boulder' in msg.message[0]:
                 # Just don't try again
-                self.beenThere[target[0]][target[1]] = True
+                self.blocked[target[0]][target[1]] = True
             else:
                 print isinstance(msg, Information), isinstance(msg, Information) and msg.message
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# MessageHistory keeps the messages the game showed, the last few in memory
+# and, optionally, all of the older ones in a compressed log on disk.
+
+from collections import deque
+import itertools
+import gzip
+import json
+
+from interactions import Information
+
+class MessageHistory (object):
+    """ I'm the Information a connection's watch has returned, in order.
+        Only the last 'size' are kept in memory; if there's a 'spill' file
+        the ones before them are appended to it, gzipped, one JSON list of
+        lines per Information, else they're forgotten.
+        Entries are numbered from 0, the first one ever appended, and len
+        counts them all, whether they're still in memory or not.  The spill
+        file should be a new one for each history. """
+    def __init__ (self, size=500, spill=None):
+        self.entries = deque(maxlen=size)
+        self.first = 0 # The number of the oldest entry in memory
+        self.spill = spill
+        self.log = None
+
+    def append (self, info):
+        if len(self.entries) == self.entries.maxlen:
+            self.first += 1
+            if not self.spill is None:
+                self.write(self.entries[0])
+        self.entries.append(info)
+
+    def write (self, info):
+        """ Internal auxiliary method.  Adds 'info' to the spill file """
+        if self.log is None:
+            self.log = gzip.open(self.spill, 'ab')
+        # Lines are bytes off the terminal, that needn't be UTF-8
+        self.log.write(json.dumps(info.message, encoding='latin-1') + '\n')
+
+    def close (self):
+        """ Finish writing the spill file.  It's opened again if needed. """
+        if not self.log is None:
+            self.log.close()
+            self.log = None
+
+    def __len__ (self):
+        return self.first + len(self.entries)
+
+    def __getitem__ (self, index):
+        """ Returns entry number 'index', or counting from the end if it's
+            negative.  Only entries in memory can be looked up like this. """
+        if index < 0:
+            index += len(self)
+        if not self.first <= index < len(self):
+            raise IndexError, "Entry %d isn't in memory" % index
+        return self.entries[index - self.first]
+
+    def since (self, index):
+        """ Returns a list of the entries in memory from number 'index' on """
+        count = min(len(self) - index, len(self.entries))
+        if count <= 0:
+            return []
+        # Callers mostly want the last few, so take them from the right
+        result = list(itertools.islice(reversed(self.entries), count))
+        result.reverse()
+        return result
+
+    def recent (self, count):
+        """ Returns a list of the last 'count' entries """
+        return self.since(len(self) - count)
+
+    def __iter__ (self):
+        """ Every entry, starting with the ones in the spill file, which are
+            read as needed """
+        if not self.spill is None and self.first > 0:
+            self.close()
+            f = gzip.open(self.spill, 'rb')
+            try:
+                for count, line in enumerate(f):
+                    if count >= self.first:
+                        break
+                    yield Information(None, [text.encode('latin-1') for text in json.loads(line)])
+            finally:
+                f.close()
+        for info in list(self.entries):
+            yield info
+
+    def __getstate__ (self):
+        state = dict(self.__dict__)
+        state['log'] = None
+        state['entries'] = (list(self.entries), self.entries.maxlen)
+        return state
+
+    def __setstate__ (self, state):
+        entries, size = state['entries']
+        self.__dict__ = state
+        self.entries = deque(entries, size)
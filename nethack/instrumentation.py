@@ -0,0 +1,173 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Instrumentation tells where the time goes in each watch: waiting for the
+# game, parsing its output, classifying prompts, or in the bot itself,
+# between one watch and the next.  Set a connection's 'instrumentation' to
+# an Instrumentation to turn it on:
+#
+#   conn.instrumentation = Instrumentation()
+#   ...
+#   print conn.instrumentation.summary()
+#   conn.instrumentation.dump('timings.json')
+
+import json
+import time
+
+BOT = 'bot'           # From the end of a watch to the start of the next one
+WAIT = 'wait'         # Waiting for the game's output
+PARSE = 'parse'       # Screen.printstr
+CLASSIFY = 'classify' # Working out what the game is asking
+OTHER = 'other'       # The rest of watch
+PHASES = [BOT, WAIT, PARSE, CLASSIFY, OTHER]
+
+class Histogram (object):
+    """ I count durations in buckets of powers of two microseconds: bucket
+        k has the durations from 2**(k-1) up to 2**k microseconds.  Other
+        values can be counted too: values are multiplied by 'scale' to get
+        to the bucket's 'unit'. """
+    def __init__ (self, scale=1000000, unit='us'):
+        self.scale = scale
+        self.unit = unit
+        self.buckets = [0] * 40
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add (self, seconds):
+        """ Count a duration (or whatever else I count) """
+        self.buckets[min(int(seconds * self.scale).bit_length(), 39)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile (self, p):
+        """ Returns the duration 'p' percent of the durations are under, to
+            the bucket, in seconds (or whatever else I count) """
+        if self.count == 0:
+            return None
+        wanted = self.count * p / 100.0
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if seen >= wanted:
+                return min((2 ** bucket) / float(self.scale), self.max)
+        return self.max
+
+    def mean (self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def asDict (self):
+        """ Returns me as a dict, that can be written as JSON """
+        last = max([i for i, n in enumerate(self.buckets) if n] or [0])
+        return {'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+                'mean': self.mean(), 'p50': self.percentile(50), 'p99': self.percentile(99),
+                'buckets_' + self.unit: [[2 ** i, n] for i, n in enumerate(self.buckets[:last + 1])]}
+
+class Cycle (object):
+    """ The times and counts of a single watch.  Phases are timed with 'lap':
+        the time since the last lap goes to the phase that's named. """
+    __slots__ = ['instrumentation', 'mark', 'times', 'bytes', 'escapes', 'mores']
+    def __init__ (self, instrumentation, start):
+        self.instrumentation = instrumentation
+        self.mark = start
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.bytes = 0
+        self.escapes = 0
+        self.mores = 0
+
+    def lap (self, phase):
+        now = time.time()
+        self.times[phase] += now - self.mark
+        self.mark = now
+
+    def received (self, data):
+        """ Count the output that's been read """
+        self.bytes += len(data)
+        self.escapes += data.count('\x1b')
+
+    def more (self):
+        """ Count a --More-- that was skipped """
+        self.mores += 1
+
+    def end (self):
+        self.lap(OTHER)
+        self.instrumentation.finish(self)
+
+class Instrumentation (object):
+    """ I collect the times each phase of each watch took, and how much
+        output was read, in histograms and counters. """
+    def __init__ (self):
+        self.histograms = dict([(phase, Histogram()) for phase in PHASES])
+        self.histograms['watch'] = Histogram()
+        self.bytesPerWatch = Histogram(1, 'bytes')
+        self.cycles = 0
+        self.bytes = 0
+        self.escapes = 0
+        self.mores = 0
+        self.lastEnd = None
+
+    def cycle (self):
+        """ Returns a Cycle for a watch that's starting """
+        now = time.time()
+        if not self.lastEnd is None:
+            self.histograms[BOT].add(now - self.lastEnd)
+        return Cycle(self, now)
+
+    def finish (self, cycle):
+        """ Internal auxiliary method.  Adds up a Cycle that's over """
+        self.lastEnd = cycle.mark
+        total = 0.0
+        for phase, seconds in cycle.times.items():
+            if phase != BOT:
+                self.histograms[phase].add(seconds)
+                total += seconds
+        self.histograms['watch'].add(total)
+        self.bytesPerWatch.add(cycle.bytes)
+        self.cycles += 1
+        self.bytes += cycle.bytes
+        self.escapes += cycle.escapes
+        self.mores += cycle.mores
+
+    def asDict (self):
+        """ Returns everything as a dict, that can be written as JSON """
+        return {'cycles': self.cycles, 'bytes': self.bytes, 'escapes': self.escapes,
+                'mores': self.mores, 'bytes_per_watch': self.bytesPerWatch.asDict(),
+                'phases': dict([(name, h.asDict()) for name, h in self.histograms.items()])}
+
+    def dump (self, filename):
+        """ Write everything to 'filename', as JSON """
+        f = open(filename, 'w')
+        json.dump(self.asDict(), f, indent=1, sort_keys=True)
+        f.close()
+
+    def summary (self):
+        """ Returns a table of how long each phase takes, in milliseconds """
+        lines = ['%d watches, %d bytes, %d escapes, %d --More--' % (
+                 self.cycles, self.bytes, self.escapes, self.mores),
+                 '%-10s %10s %10s %10s %10s' % ('phase', 'mean', 'p50', 'p99', 'max')]
+        for phase in PHASES + ['watch']:
+            h = self.histograms[phase]
+            if h.count:
+                lines.append('%-10s %10.3f %10.3f %10.3f %10.3f' % (phase, h.mean() * 1000,
+                             h.percentile(50) * 1000, h.percentile(99) * 1000, h.max * 1000))
+        return '\n'.join(lines)
@@ -27,16 +27,21 @@ class Interaction (object):
         NetHackPlayer's methods return an Interaction when they need further input from the player
         to complete. """
     defaultAnswer = None
+    followingQuestion = None # The selectDialogQuestion to watch with, once answered
     def __init__ (self, server, question):
         checkPendingInteraction (server)
         self.server = server
         self.question = question
         server.pendingInteraction = self
-    def answer (self, ans):
+    def answer (self, *args):
+        self.reply (*args)
+        return self.server.watch(selectDialogQuestion=self.followingQuestion)
+    def reply (self, ans):
+        """ Sends the keys that answer me with 'ans', without watching what
+            the game does.  Subclasses take the same arguments to 'answer'. """
         checkPendingInteraction (self.server, self)
         self.server.pendingInteraction = None
         self.server.send (ans)
-        return self.server.watch()
     def answerDefault (self):
         checkPendingInteraction (self.server, self)
         self.server.pendingInteraction = None
@@ -56,6 +61,7 @@ class Information (object):
 
 class DirectionInteraction (Interaction):
     """ The server should choose a direction here """
+    dirs = keys.dirs # keys.numberPadDirs if the game has number_pad on
     def __init__ (self, server, question):
         super (DirectionInteraction, self).__init__ (server, question)
         match = re.match (r'(?P<question>.*) \[(?P<opts>.*)\] ', question)
@@ -63,10 +69,11 @@ class DirectionInteraction (Interaction):
             self.options = keys.dirs.keys()
         else:
             self.question = match.group ('question')
-            self.options = [opt[0] for opt in keys.dirs.items() if opt[1] in match.group ('opts')]
+            self.options = [opt[0] for opt in keys.dirs.items() if opt[1] in match.group ('opts')
+                            or keys.numberPadDirs[opt[0]] in match.group ('opts')]
 
-    def answer (self, ans):
-        return super (DirectionInteraction, self).answer (keys.dirs[ans])
+    def reply (self, ans):
+        super (DirectionInteraction, self).reply (self.dirs[ans])
 
 class YesNoInteraction (Interaction):
     """ I describe a yes/no question """
@@ -78,36 +85,83 @@ class YesNoInteraction (Interaction):
         if not match is None:
             self.question = match.group ('question')
             self.defaultAnswer = match.group ('def')
-    def answer (self, ans):
-        ans = self.__opts.get(ans)
-        if ans is None:
-            match = self.answerDefault()
-        else:
-            match = super(YesNoInteraction, self).answer(ans)
-        return match
+    def reply (self, ans):
+        # Anything else takes the default
+        super(YesNoInteraction, self).reply(self.__opts.get(ans, '\x1b'))
     options = ["y", "n"]
 
+MAP_WIDTH = 79 # The last column can't be reached by the cursor
+MAP_HEIGHT = 21
+MONSTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ:@&;'
+
+cursorSteps = {'h': (-1, 0), 'j': (0, 1), 'k': (0, -1), 'l': (1, 0),
+               'y': (-1, -1), 'u': (1, -1), 'b': (-1, 1), 'n': (1, 1)}
+for key, (dx, dy) in cursorSteps.items():
+    cursorSteps[key.upper()] = (8 * dx, 8 * dy)
+del key, dx, dy
+
+def planCursorKeys (fromX, fromY, toX, toY, jumps=None):
+    """ Returns the shortest string of keys that takes the cursor from (fromX, fromY)
+        to (toX, toY) on the map, moving one or eight cells at a time.
+        'jumps' maps other keys to the position they take the cursor to, from
+        wherever it is. """
+    if jumps is None:
+        jumps = {}
+    start = (fromX, fromY)
+    target = (toX, toY)
+    previous = {start: None}
+    frontier = [start]
+    while frontier and not previous.has_key(target):
+        nextFrontier = []
+        for pos in frontier:
+            moves = [(key, (pos[0] + dx, pos[1] + dy)) for key, (dx, dy) in cursorSteps.items()]
+            for key, dest in moves + jumps.items():
+                if (not previous.has_key(dest) and 0 <= dest[0] < MAP_WIDTH and
+                    0 <= dest[1] < MAP_HEIGHT):
+                    previous[dest] = (pos, key)
+                    nextFrontier.append(dest)
+        frontier = nextFrontier
+    if not previous.has_key(target):
+        raise ValueError, "Invalid cell position (%d,%d)" % target
+    keys = []
+    pos = target
+    while previous[pos] is not None:
+        pos, key = previous[pos]
+        keys.append(key)
+    keys.reverse()
+    return ''.join(keys)
+
 class CursorPointInteraction (Interaction):
-    """ I'm an interaction that requests the user to select a position in the maze using the cursor. """
-    def answer (self, x, y):
+    """ I'm an interaction that requests the user to select a position in the maze using the cursor.
+        If you tell me where the hero is, I can also jump to monsters. """
+    # Keys that jump the cursor to a feature on the map, and the glyphs they
+    # look for.  A key is only used when a single cell shows one of its glyphs.
+    jumpKeys = {'<': '<>', '>': '<>', '_': '_', 'm': MONSTERS}
+
+    def __init__ (self, server, question, hero=None):
+        super (CursorPointInteraction, self).__init__ (server, question)
+        self.hero = hero
+
+    def jumps (self):
+        """ Returns the positions the keys in 'jumpKeys' would take the cursor to """
+        rows = self.server.getArea (0, 1, MAP_WIDTH, MAP_HEIGHT)
+        result = {}
+        for key, glyphs in self.jumpKeys.items():
+            if key == 'm' and self.hero is None:
+                continue
+            found = [(x, y, char) for y, row in enumerate(rows) for x, char in enumerate(row)
+                     if char in glyphs and (x, y) != self.hero]
+            # '<' and '>' both reach any staircase, use the one that looks like it
+            if len(found) == 1 and (not key in '<>' or key == found[0][2]):
+                result[key] = found[0][:2]
+        return result
+
+    def reply (self, x, y):
         checkPendingInteraction (self.server, self)
         self.server.pendingInteraction = None
-        currentX = self.server.x()
-        currentY = self.server.y()
-        while x > currentX:
-            self.server.send ('l')
-            currentX += 1
-        while x < currentX:
-            self.server.send ('h')
-            currentX -= 1
-        while y < currentY:
-            self.server.send ('k')
-            currentY -= 1
-        while y > currentY:
-            self.server.send ('j')
-            currentY += 1
-        self.server.send ('.')
-        return self.server.watch()
+        keys = planCursorKeys (self.server.cursorX(), self.server.cursorY() - 1, x, y,
+                               self.jumps())
+        self.server.send (keys + '.')
 
 class YesNoQuitInteraction (Interaction):
     """ I describe a yes/no/quit question. """
@@ -120,22 +174,33 @@ class YesNoQuitInteraction (Interaction):
         if not match is None:
             self.question = match.group ('question')
             self.defaultAnswer = match.group ('def')
-    def answer (self, ans):
-        ans = self.__opts.get(ans.lower())
-        if ans is None:
-            match = self.answerDefault()
-        else:
-            match = super(YesNoQuitInteraction, self).answer(ans)
-        return match
+    def reply (self, ans):
+        # Anything else takes the default
+        super(YesNoQuitInteraction, self).reply(self.__opts.get(ans.lower(), '\x1b'))
     options = ["y", "n", "q"]
 
 class FreeEntryInteraction (Interaction):
     """ I describe a prompt to enter some free text. """
-    def answer (self, ans):
+    def reply (self, ans):
         checkPendingInteraction (self.server, self)
         self.server.pendingInteraction = None
         self.server.sendline (ans)
-        return self.server.watch()
+
+def expandKeys (opts):
+    """ Returns the item keys in a question's options, as in 'a-cf' -> 'abcf'.
+        A leading '-' (hands, fingers...) is a key of its own. """
+    keys = []
+    i = 0
+    while i < len(opts):
+        if opts[i] == ' ':
+            pass
+        elif i + 2 < len(opts) and opts[i + 1] == '-' and opts[i] != '-':
+            keys.extend(chr(c) for c in range(ord(opts[i]), ord(opts[i + 2]) + 1))
+            i += 2
+        else:
+            keys.append(opts[i])
+        i += 1
+    return keys
 
 class SelectInteraction (Interaction):
     """ I describe a question where the user should select an item, usually from the inventory """
@@ -144,21 +209,22 @@ class SelectInteraction (Interaction):
         match = re.match (r'(?P<question>.*) \[(?P<opts>.*) or \?\*\] ', question)
         if not match is None:
             self.question = match.group ('question')
-            self.options = [Item(key) for key in match.group ('opts')] + [Item('*'), Item('?')]
+            self.options = [Item(key) for key in expandKeys (match.group ('opts'))] + [Item('*'), Item('?')]
         else:
             self.options = []
-    def answer (self, item):
-        checkPendingInteraction (self.server, self)
-        self.server.pendingInteraction = None
-        self.server.send (item.key)
-        return self.server.watch(selectDialogQuestion=self.question)
+        self.followingQuestion = self.question
+    def reply (self, item):
+        super (SelectInteraction, self).reply (item.key)
 
 class SelectDialogInteraction (Interaction):
     """ I describe a list of options from which you can select one or many alternatives.
         MultiSelect and SingleSelect dialogs aren't distinguishable at sight, so you need
         to tell me if I should treat this as a MultiSelect or a SingleSelect when you go to
-        answer the question."""
-    patterns = ['\(end\) ', '\((?P<M>\d) of (?P<N>\d)\)']
+        answer the question.
+        Only the page on screen is read when I'm created.  'options' are the ones
+        read so far; iterOptions, readOptions and choose move the dialog forward
+        to read more, the first time you look past what's been read. """
+    patterns = ['\(end\) ', '\((?P<M>\d+) of (?P<N>\d+)\)']
     def __init__ (self, server, question=None):
         """ If question is None, I suppose it's on the first line of the screen. """
         Interaction.__init__(self, server, question)
@@ -168,63 +234,123 @@ class SelectDialogInteraction (Interaction):
         matched = self.server.screen.multiMatch (self.patterns)
         if matched is None:
             raise ValueError, "No selection dialog visible"
+        self.pages = {}
+        self.category = None
+        self.spellList = False
+        self.readPage (matched)
+
+    def readPage (self, matched):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        if matched.group(0) == '(end) ':
+            self.currentPage = self.totalPages = 1
+        else:
+            self.currentPage = int(matched.group('M'))
+            self.totalPages = int(matched.group('N'))
+        if self.pages.has_key(self.currentPage):
+            return
         lines = self.server.getArea (self.server.screen.cursorX - len(matched.group(0)), 0, h=self.server.screen.cursorY)
         opts = []
-        more_pages = True
-        totalPages = 0
-        spellList = False
-        while more_pages:
-            for line in lines:
-                if line.find(' - ') == -1:
-                    category = line.strip()
-                    if min([x in category for x in ['Name', 'Level', 'Category', 'Fail']]):
-                        # Oi, this isn't an item list, it's a spell list!
-                        spellList = True
-                else:
-                    key, item = line.split(' - ', 1)
-                    if spellList:
-                        it = Spell(key.strip(), description=item.strip(), headings=category)
-                    else:
-                        it = Item(key.strip(), description=item.strip(), category=category)
-                    opts.append(it)
-            if matched.group(0) != '(end) ':
-                currentPage = int(matched.group('M'))
-                totalPages = int(matched.group('N'))
-                if currentPage < totalPages:
-                    self.server.send ('>')
-                    matched = self.server.watch(self.patterns)
-                    if matched is None:
-                        raise ValueError, "No multiple selection dialog visible"
-                    lines = self.server.screen.getArea (self.server.screen.cursorX - len(matched.group(0)), 0, h=self.server.screen.cursorY)
+        for line in lines:
+            if line.find(' - ') == -1:
+                self.category = line.strip()
+                if min([x in self.category for x in ['Name', 'Level', 'Category', 'Fail']]):
+                    # Oi, this isn't an item list, it's a spell list!
+                    self.spellList = True
+            else:
+                key, item = line.split(' - ', 1)
+                if self.spellList:
+                    it = Spell(key.strip(), description=item.strip(), headings=self.category)
                 else:
-                    more_pages = False
+                    it = Item(key.strip(), description=item.strip(), category=self.category)
+                opts.append(it)
+        self.pages[self.currentPage] = opts
+
+    def iterOptions (self):
+        """ Yields the options page by page, moving the dialog forward only when
+            the pages read so far have run out. """
+        page = 1
+        while page <= self.totalPages:
+            while not self.pages.has_key(page):
+                self.nextPage ()
+            for it in self.pages[page]:
+                yield it
+            page += 1
+
+    def options (self):
+        """ The options read so far, page by page.  Looking doesn't move the dialog. """
+        pages = self.pages.keys()
+        pages.sort()
+        return [it for page in pages for it in self.pages[page]]
+    options = property(options)
+
+    def readOptions (self):
+        """ Reads the pages that haven't been read, and returns all of the options.
+            This leaves the dialog on the last page. """
+        return list(self.iterOptions())
+
+    def nextPage (self, keys=''):
+        """ Internal auxiliary method.  Sends 'keys' and moves the dialog to the
+            next page, reading it if it hasn't been read """
+        checkPendingInteraction (self.server, self)
+        self.server.send (keys + '>')
+        matched = self.server.watch(self.patterns)
+        if matched is None:
+            raise ValueError, "No multiple selection dialog visible"
+        self.readPage (matched)
+
+    def pick (self, wanted, multiple=True, enough=None):
+        """ Internal auxiliary method.  Goes forward from the page on screen,
+            reading each page as it's reached, and picking there the items
+            'wanted' returns True for, until the last page or until 'enough'
+            returns True.  Returns the keys that are left to send: the last
+            picks and what ends the dialog. """
+        keys = ''
+        while True:
+            picked = [it.key for it in self.pages[self.currentPage] if wanted(it)]
+            if picked and not multiple:
+                return keys + picked[0]
+            keys += ''.join(picked)
+            if self.currentPage >= self.totalPages or (multiple and enough and enough()):
+                if multiple:
+                    return keys + '\r'
+                return keys + '\x1b'
+            if self.pages.has_key(self.currentPage + 1):
+                keys += '>'
+                self.currentPage += 1
             else:
-                more_pages = False
-        # Return to the first page
-        for i in range(totalPages - 1):
-            self.server.send ('<')
-            self.server.watch (self.patterns)
-        self.options = opts
-
-    def answer (self, items):
+                self.nextPage (keys)
+                keys = ''
+
+    def choose (self, wanted, multiple=True):
+        """ Answers with the items 'wanted' returns True for, in a single pass
+            forward from the page on screen: each page is read as it's reached,
+            and its items are picked there.  Items on pages the dialog has
+            moved past aren't looked at.  Unless 'multiple', the dialog is a
+            SingleSelect, and the first item wanted is the answer (or nothing
+            is, if none of them are). """
+        Interaction.reply (self, self.pick (wanted, multiple))
+        return self.server.watch()
+
+    def reply (self, items):
         """ 'items': can be a single Item, or a list of Items.
             if it's a single Item then the dialog is treated as a SingleSelect dialog.
-            if you pass in a list of items, I treat the list as a MultiSelect dialog."""
-        checkPendingInteraction (self.server, self)
-        self.server.pendingInteraction = None
+            if you pass in a list of items, I treat the list as a MultiSelect dialog.
+            As with choose, each item is picked on its page in a single pass
+            forward, so items on pages the dialog has moved past can't be.
+            Raises ValueError if any of them weren't found, leaving me pending
+            on the last page. """
         if isinstance (items, list):
-            match = self.server.screen.multiMatch (self.patterns)
-            if match.group(0) == '(end) ':
-                totalPages = 1
-            else:
-                currentPage = int(match.group('M'))
-                totalPages = int(match.group('N'))
-                if currentPage != 1:
-                    raise ValueError, "I shouldn't be asked to answer an interaction when not on the first page of a dialog."
-            for page in range(totalPages):
-                for i in items:
-                    self.server.send (i.key)
-                self.server.send (' ')
+            remaining = list(items)
         else:
-            self.server.send (items.key)
-        return self.server.watch()
+            remaining = [items]
+        def wanted (it):
+            for item in remaining:
+                if it is item or (it.key == item.key and
+                                  (item.description is None or it.description == item.description)):
+                    remaining.remove(item)
+                    return True
+            return False
+        keys = self.pick (wanted, isinstance (items, list), lambda: not remaining)
+        if remaining:
+            raise ValueError, "Not in the dialog: %s" % ', '.join([it.key for it in remaining])
+        Interaction.reply (self, keys)
@@ -0,0 +1,184 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Inventory keeps track of what the hero is carrying from what the game
+# says, so that NetHackPlayer.inventory doesn't have to open the inventory
+# menu every time it's asked.
+
+import re
+from items import Item
+from interactions import Interaction, SelectInteraction, Information
+
+# Categories, as the inventory menu calls them, and how to tell them from
+# an item's description.  The first one that matches wins.
+categoryPatterns = [
+    ('Coins', r'\bgold pieces?\b'),
+    ('Armor', r'\(being worn\)|\bring mail\b'),
+    ('Weapons', r'\((weapon|wielded|alternate weapon|in quiver)\b'),
+    ('Amulets', r'\bamulets?\b'),
+    ('Potions', r'\bpotions?\b'),
+    ('Scrolls', r'\bscrolls?\b'),
+    ('Spellbooks', r'\bspellbooks?\b'),
+    ('Rings', r'\brings?\b'),
+    ('Wands', r'\bwands?\b'),
+    ('Comestibles', r'\b(corpses?|food rations?|tins?|eggs?|apples?|carrots?|'
+                    r'fortune cookies?|lembas wafers?|cram rations?)\b'),
+    ('Gems', r'\b(gems?|stones?)\b'),
+]
+categoryPatterns = [(category, re.compile(pattern)) for category, pattern in categoryPatterns]
+
+# "f - an uncursed potion of blindness." as printed when an item is picked
+# up, wielded, worn or otherwise changes in the inventory.
+itemMessage = re.compile(r'(?:^|  )(?P<key>[a-zA-Z$]) - (?P<desc>.+?)\.?(?=  |$)')
+dropMessage = re.compile(r'You (?:drop|put) (?P<desc>.+?)(?: into [^.]*)?\.')
+takeOffMessage = re.compile(r'You were wearing (?P<desc>.+?)\.')
+# Things that change the inventory in ways we don't follow
+staleMessage = re.compile(r'\b(steals?|stole|snatches|rots? away|is destroyed|are destroyed|'
+                          r'burns?|explodes?|boils?|shatters?|dilutes?|corrodes?|rusts?|'
+                          r'welded|merges?|You have a little trouble)\b')
+# The game saying no to using an item
+refusedMessage = re.compile(r"You don't have that object|Never mind|You don't have anything|"
+                            r"That is a silly thing|You cannot|You can't|You mime")
+quantity = re.compile(r'^(\d+) ')
+annotation = re.compile(r' \([^)]*\)$')
+
+def guessCategory (description):
+    """ Returns the inventory category an item with 'description' belongs to,
+        or None if it can't be told from the description alone """
+    for category, pattern in categoryPatterns:
+        if pattern.search(description):
+            return category
+    return None
+
+class Inventory (object):
+    """ I'm a model of the hero's inventory, kept up to date from the messages
+        in the connection's history and from the item letters in the questions
+        the game asks.
+        When something happens that I can't follow I become stale, and the
+        inventory should be read again from the game (see NetHackPlayer.inventory).
+        'hits' and 'misses' count how often I could answer without reading it. """
+    def __init__ (self, server):
+        self.server = server
+        self.items = {}
+        self.stale = True
+        self.seen = len(server.history)
+        self.hits = 0
+        self.misses = 0
+
+    def current (self):
+        """ Catches up with the messages the game has shown.
+            Returns True if I can be trusted. """
+        history = self.server.history
+        if self.seen < history.first:
+            # Some messages were dropped before we could read them
+            self.stale = True
+        for info in history.since(self.seen):
+            for message in info.message:
+                self.readMessage (message)
+        self.seen = len(history)
+        return not self.stale
+
+    def readMessage (self, message):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        for match in itemMessage.finditer(message):
+            self.upsert (match.group('key'), match.group('desc'))
+        for match in dropMessage.finditer(message):
+            self.remove (match.group('desc'))
+        for match in takeOffMessage.finditer(message):
+            item = self.find (match.group('desc'))
+            if item is None:
+                self.stale = True
+            else:
+                item.description = item.description.replace(' (being worn)', '')
+                item.category = guessCategory(item.description) or item.category
+        if staleMessage.search(message):
+            self.stale = True
+
+    def upsert (self, key, description):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        category = guessCategory(description)
+        if category is None and self.items.has_key(key):
+            category = self.items[key].category
+        if category is None:
+            # We'd put it in the wrong place in the menu
+            self.stale = True
+        if description.endswith('(weapon in hands)') or description.endswith('(weapon in hand)'):
+            # Whatever we were wielding isn't wielded any more
+            for item in self.items.values():
+                if 'weapon in hand' in item.description:
+                    item.description = annotation.sub('', item.description)
+        self.items[key] = Item(key, description=description, category=category)
+
+    def find (self, description):
+        """ Returns the only item that matches 'description', or None """
+        found = [item for item in self.items.values()
+                 if annotation.sub('', item.description) == description]
+        if len(found) != 1:
+            return None
+        return found[0]
+
+    def remove (self, description):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        item = self.find (description)
+        if item is None:
+            self.stale = True
+        else:
+            del self.items[item.key]
+
+    def used (self, item):
+        """ Tell me that one of 'item' was used up (quaffed, read, thrown...) """
+        current = self.items.get(item.key)
+        if current is None:
+            return
+        if quantity.match(current.description):
+            # The description changes, and we'd have to guess how
+            self.stale = True
+        else:
+            del self.items[item.key]
+
+    def usedIf (self, item, matched, question):
+        """ Tell me what the game did, 'matched' as watch returned it, when
+            'item' was the answer to 'question'.  It's only used up if the game
+            went ahead: not if it said no, or asked the same question again.
+            If it's asking something else I can't tell how it ends, and I'm stale. """
+        if isinstance(matched, SelectInteraction) and matched.question == question:
+            return
+        if isinstance(matched, Interaction):
+            self.stale = True
+        elif not (isinstance(matched, Information) and
+                  refusedMessage.search(' '.join(matched.message))):
+            self.used (item)
+
+    def checkKeys (self, keys):
+        """ Tell me about item letters the game just offered.  If I don't know
+            about some of them, I'm stale. """
+        for key in keys:
+            if key.isalpha() and not self.items.has_key(key):
+                self.stale = True
+
+    def replace (self, items):
+        """ Start over from 'items', freshly read off the inventory menu """
+        self.current()
+        self.items = dict((item.key, item) for item in items)
+        self.stale = False
+
+    def get (self, categories=None):
+        """ Returns the items I know about as a dictionary indexed by key.
+            'categories' restricts it to those categories. """
+        if isinstance (categories, basestring):
+            categories = [categories]
+        return dict((key, item) for key, item in self.items.items()
+                    if categories is None or item.category in categories)
@@ -1,6 +1,7 @@
 #
 # PyNethack is not a program.  This is just a sample of how to use it.
 # You should define your own nethack player (see examples.py on how to do that)
+# To play lots of games at once, on all of your cores, see runner.py
 #
 
 from examples import Explorer
@@ -0,0 +1,123 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Map analysis works on the whole map at once, as NumPy arrays that look
+# straight in to the Screen's planes, instead of cell by cell.
+
+import numpy
+
+from scraper import WIDTH, ROWS
+
+MAP_TOP = 1 # There's one row of heading above the maze
+W = 80
+H = 21
+
+# What we know about whether a cell can be walked on
+MAYBE = 0
+YES = 1
+NO = 2
+
+DEFAULT_FOREGROUND = 9
+FLOOR_CHARS = r'.#?\dfkx@+><%$(}][{):!"`/_' # Floor and stuff lying there
+WALL_CHARS = '-|'
+MONSTER_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ:@&;'
+DOOR_CHARS = '-|' # Open doors, when they aren't the default colour
+CLOSED_DOOR_CHARS = '+' # Closed doors, but spellbooks look the same
+DOOR_FOREGROUND = 3 # Doors are brown; so are a few spellbooks, but most aren't
+BOULDER_CHARS = '0' # With the boulder option set to 0, as most bots do
+
+# Terrain classes
+OTHER = 0
+FLOOR = 1
+WALL = 2
+BLANK = 3
+
+def lookupTable (classes, default=0, dtype=numpy.uint8):
+    """ Returns a table indexed by character code.  'classes' maps strings of
+        characters to the value their entries get. """
+    table = numpy.empty(256, dtype=dtype)
+    table.fill(default)
+    for chars, value in classes:
+        table[numpy.fromstring(chars, dtype=numpy.uint8)] = value
+    return table
+
+terrainTable = lookupTable([(FLOOR_CHARS, FLOOR), (WALL_CHARS, WALL), (' ', BLANK)])
+monsterTable = lookupTable([(MONSTER_CHARS, True)], False, numpy.bool_)
+doorTable = lookupTable([(DOOR_CHARS, True)], False, numpy.bool_)
+closedDoorTable = lookupTable([(CLOSED_DOOR_CHARS, True)], False, numpy.bool_)
+boulderTable = lookupTable([(BOULDER_CHARS, True)], False, numpy.bool_)
+
+directions = [('N', 0, -1), ('NE', 1, -1), ('E', 1, 0), ('SE', 1, 1),
+              ('S', 0, 1), ('SW', -1, 1), ('W', -1, 0), ('NW', -1, -1)]
+
+def plane (data):
+    """ Returns the map rows of one of the Screen's planes, as a (H, W) array.
+        No data is copied, the array changes as the screen does. """
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(ROWS, WIDTH)[MAP_TOP:MAP_TOP + H, :W]
+
+def neighbours (mask):
+    """ Returns a mask of the cells that have at least one of their eight
+        neighbours set in 'mask'.  Cells off the map count as unset. """
+    padded = numpy.zeros((H + 2, W + 2), dtype=numpy.bool_)
+    padded[1:-1, 1:-1] = mask
+    result = numpy.zeros((H, W), dtype=numpy.bool_)
+    for name, dx, dy in directions:
+        result |= padded[1 + dy:1 + dy + H, 1 + dx:1 + dx + W]
+    return result
+
+class MapView (object):
+    """ I show a screen's map as arrays: 'chars', 'foreground', 'inverse' and,
+        classified with the lookup tables, 'terrain', 'monsters', 'doorways'
+        and 'boulders'. """
+    def __init__ (self, screen):
+        self.chars = plane(screen.charPlane)
+        self.foreground = plane(screen.foregroundPlane)
+        self.inverse = plane(screen.inversePlane).astype(numpy.bool_)
+        self.terrain = terrainTable[self.chars]
+        self.monsters = monsterTable[self.chars] & ~self.inverse
+        self.doorways = ((doorTable[self.chars] & (self.foreground != DEFAULT_FOREGROUND)) |
+                         (closedDoorTable[self.chars] & (self.foreground == DOOR_FOREGROUND)))
+        self.boulders = boulderTable[self.chars]
+
+    def updateReachable (self, reachable, beenThere):
+        """ Update 'reachable' (MAYBE, YES or NO for each cell) with what's on
+            the map, and where we've been.  Cells we can't tell about are left alone. """
+        terrain = self.terrain
+        walls = terrain == WALL
+        plainWalls = walls & (self.foreground == DEFAULT_FOREGROUND)
+        yes = (terrain == FLOOR) | beenThere | (walls & ~plainWalls)
+        # Blank cells next to where we've been would show something if there was something
+        no = ~yes & (plainWalls | ((terrain == BLANK) & neighbours(beenThere)))
+        reachable[yes] = YES
+        reachable[no] = NO
+
+    def interesting (self, reachable, beenThere):
+        """ Returns how interesting each cell is: 2 for the down stairs, 1 for
+            monsters and for reachable cells we haven't been to that are next to
+            a cell that may be reachable, 0 for the rest. """
+        frontier = (reachable == YES) & ~beenThere & neighbours(reachable == MAYBE)
+        result = numpy.where(self.chars == ord('>'), 2, self.monsters).astype(numpy.int8)
+        result[frontier] = 1
+        return result
+
+def bestSite (interesting, dist):
+    """ Returns the (y, x) of the most interesting cell that can be reached,
+        the closest one if there's a tie, or None. """
+    candidates = (interesting > 0) & (dist > 0)
+    if not candidates.any():
+        return None
+    score = numpy.where(candidates, interesting.astype(numpy.int32) * (H * W) - dist, -1)
+    return numpy.unravel_index(score.argmax(), score.shape)
@@ -28,14 +28,26 @@ from interactions import checkPendingInteraction, YesNoInteraction, \
      Information
 
 from items import Item, Spell
+from inventory import Inventory
+from status import StatusReader
 
 class NetHackPlayer(object):
     initialRole = "Random"
     initialRace = "Random"
     initialGender = "Random"
     initialAlignment = "Random"
+    numberPad = False # Set this if the game has the number_pad option on
     def __init__(self, server):
         self.server = server
+        self.pack = Inventory(server)
+        self.statusReader = StatusReader()
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        if not state.has_key('pack'):
+            self.pack = Inventory(self.server)
+        if not state.has_key('statusReader'):
+            self.statusReader = StatusReader()
 
     def send (self, msg):
         """ Sends 'msg' down the wire. """
@@ -74,14 +86,35 @@ class NetHackPlayer(object):
             'expecting' is a regex or list of regexes that are checked before regular interactions.
             'selectDialogQuestion' is a question for selectDialogs, that often show the question before
                                    the dialog. """
-        return self.server.watch(expecting, selectDialogQuestion)
+        matched = self.server.watch(expecting, selectDialogQuestion)
+        if isinstance (matched, DirectionInteraction):
+            matched.dirs = self.dirs()
+        if isinstance (matched, SelectInteraction):
+            self.pack.checkKeys ([item.key for item in matched.options])
+        return matched
 
     def run (self):
         """ Redefine this method to give your bot a life! """
         self.child.interact()
 
-    def go (self, direction):
-        """ Walk one position in the specified direction.  Direction can be one of
+    def countPrefix (self, count):
+        """ Returns the keys that make the next command be repeated 'count' times """
+        if count is None:
+            return ''
+        if self.numberPad:
+            return 'n%d' % count
+        return str(count)
+
+    def dirs (self):
+        """ Returns the keys for each direction, which depend on number_pad """
+        if self.numberPad:
+            return keys.numberPadDirs
+        return keys.dirs
+
+    def go (self, direction, count=None):
+        """ Walk one position in the specified direction.  If 'count' is given walk that
+            many positions, in a single command, unless something interesting happens.
+            Direction can be one of
             'N', 'North'
             'S', 'South'
             'W', 'West'
@@ -94,7 +127,33 @@ class NetHackPlayer(object):
             'U', 'Up'
             '.', 'Stay' (stay where you are and do nothing for one turn)
         """
-        self.send (keys.dirs[direction])
+        self.send (self.countPrefix(count) + self.dirs()[direction])
+        return self.watch()
+
+    def goFar (self, direction):
+        """ Run in the specified direction until you hit a wall or run in to something.
+            Direction can be any of the eight compass directions in 'go'.
+            Returns what interrupted the run, if the game said anything. """
+        if not keys.dirs[direction].isalpha():
+            raise ValueError, "Can't run in direction %s" % direction
+        if self.numberPad:
+            # Shifted digits aren't directions, the game takes a meta digit instead
+            self.send (chr(ord(self.dirs()[direction]) | 0x80))
+        else:
+            self.send (keys.dirs[direction].upper())
+        return self.watch()
+
+    def rush (self, direction):
+        """ Rush in the specified direction until something interesting is seen, not
+            stopping at corridor forks (the G prefix).
+            Direction can be any of the eight compass directions in 'go'.
+            Returns what interrupted the rush, if the game said anything. """
+        if not keys.dirs[direction].isalpha():
+            raise ValueError, "Can't rush in direction %s" % direction
+        if self.numberPad:
+            self.send ('5' + self.dirs()[direction])
+        else:
+            self.send ('G' + keys.dirs[direction])
         return self.watch()
 
     def open (self, direction):
@@ -124,7 +183,7 @@ class NetHackPlayer(object):
     def fight (self, direction):
         """ Fight (even if you don't sense a monster) in the specified direction. """
         self.send ('F')
-        self.send (keys.dirs[direction])
+        self.send (self.dirs()[direction])
         return self.watch()
 
     def quaff (self, potion=None):
@@ -136,7 +195,9 @@ class NetHackPlayer(object):
         self.send ('q')
         matched = self.watch()
         if isinstance (matched, SelectInteraction):
+            question = matched.question
             matched = matched.answer (potion)
+            self.pack.usedIf (potion, matched, question)
         return matched
 
     def eat (self, food=None):
@@ -150,7 +211,9 @@ class NetHackPlayer(object):
         self.send ('e')
         matched = self.watch()
         if isinstance (matched, SelectInteraction):
+            question = matched.question
             matched = matched.answer (food)
+            self.pack.usedIf (food, matched, question)
         return matched
 
     def offer (self, corpse=Item('*')):
@@ -174,9 +237,10 @@ class NetHackPlayer(object):
         self.sendline ("#sit")
         return self.watch()
 
-    def rest (self):
-        """ Wait a moment """
-        self.send (".")
+    def rest (self, count=None):
+        """ Wait a moment.  If 'count' is given wait that many turns, in a single command,
+            unless something interrupts you. """
+        self.send (self.countPrefix(count) + ".")
         return self.watch()
 
     def exchange (self):
@@ -193,9 +257,10 @@ class NetHackPlayer(object):
             matched = self.watch()
         return matched
 
-    def search (self):
-        """ Search around for hidden stuff"""
-        self.send ('s')
+    def search (self, count=None):
+        """ Search around for hidden stuff.  If 'count' is given search that many turns,
+            in a single command, unless something interrupts you. """
+        self.send (self.countPrefix(count) + 's')
         return self.watch()
 
     def fire (self, direction):
@@ -297,7 +362,11 @@ class NetHackPlayer(object):
         self.send ('r')
         matched = self.watch()
         if isinstance (matched, SelectInteraction) and 'read' in matched.question:
+            question = matched.question
+            scroll = self.pack.get('Scrolls').has_key(item.key)
             matched = matched.answer (item)
+            if scroll:
+                self.pack.usedIf (item, matched, question)
         return matched
 
     def throw(self, item=Item('*'), direction=None):
@@ -306,8 +375,13 @@ class NetHackPlayer(object):
         self.send ('t')
         matched = self.watch()
         if isinstance (matched, SelectInteraction) and 'throw' in matched.question:
+            question = matched.question
             matched = matched.answer (item)
-        if isinstance (matched, DirectionInteraction) and not direction is None:
+            if isinstance (matched, DirectionInteraction) and not direction is None:
+                matched = matched.answer (direction)
+            # Without a direction it's thrown once the caller answers, if at all
+            self.pack.usedIf (item, matched, question)
+        elif isinstance (matched, DirectionInteraction) and not direction is None:
             matched = matched.answer (direction)
         return matched
 
@@ -327,10 +401,11 @@ class NetHackPlayer(object):
 
     def call (self, x, y, name=None):
         """ Name an individual monster (ex. baptize your dog) """
+        hero = (self.x(), self.y())
         self.send ('C')
         matched = self.watch ()
         if isinstance (matched, Information) and matched.message == ['(For instructions type a ?)']:
-            matched = CursorPointInteraction (self, matched.message)
+            matched = CursorPointInteraction (self.server, matched.message, hero)
             matched = matched.answer (x, y)
         if isinstance (matched, FreeEntryInteraction) and 'What do you want to call' in matched.question:
             if name is not None:
@@ -386,7 +461,7 @@ class NetHackPlayer(object):
                 answer = 'Take something out'
             else:
                 answer = 'Put something in'
-            for ans in matched.options:
+            for ans in matched.iterOptions():
                 if answer in ans.description:
                     matched = matched.answer(ans)
                     break
@@ -416,19 +491,21 @@ class NetHackPlayer(object):
 
     def describe (self, x, y):
         """ Look at what is at a certain coordinate in the dungeon """
+        hero = (self.x(), self.y())
         self.send (";")
         matched = self.watch ()
         if isinstance (matched, Information) and matched.message == ['Pick an object.']:
-            matched = CursorPointInteraction (self.server, matched.message)
+            matched = CursorPointInteraction (self.server, matched.message, hero)
             matched = matched.answer (x, y)
         return matched
 
     def travel (self, x, y):
         """ Move via a shortest-path algorithm to a point on the map """
+        hero = (self.x(), self.y())
         self.send ("_")
         matched = self.watch ()
         if isinstance (matched, Information) and '(For instructions type a ?)' in matched.message[0]:
-            matched = CursorPointInteraction (self.server, matched.message)
+            matched = CursorPointInteraction (self.server, matched.message, hero)
             matched = matched.answer (x, y)
         return matched
 
@@ -455,14 +532,26 @@ class NetHackPlayer(object):
             matched = matched.answer ('y')
         return matched
 
-    def inventory (self, categories=None):
+    def inventory (self, categories=None, rescan=False):
         """ Retrieve your inventory.  'categories' can be a list of strings describing the categories
-            you want to restrict to, as "Weapons", "Potions", etc. """
+            you want to restrict to, as "Weapons", "Potions", etc.
+            The inventory is only read from the game when what the game said since the last time
+            isn't enough to know what you're carrying (see Inventory), or if 'rescan' is set. """
+        if rescan or not self.pack.current():
+            self.pack.misses += 1
+            self.pack.replace (self.readInventory())
+        else:
+            self.pack.hits += 1
+        return self.pack.get (categories)
+
+    def readInventory (self):
+        """ Read the inventory menu, every page of it, and return the list of items """
         self.send ('i')
         more_pages = True
         inventory = []
+        category = None
         while more_pages:
-            matched = self.watch([r'\(end\) ', r'\(\d of \d\)'])
+            matched = self.watch([r'\(end\) ', r'\((?P<M>\d+) of (?P<N>\d+)\)'])
             lines = self.server.getArea (self.server.cursorX() - len(matched.group(0)), 0, h=self.server.cursorY())
             for line in lines:
                 if line.find(' - ') == -1:
@@ -472,181 +561,122 @@ class NetHackPlayer(object):
                     it = Item (key.strip(), description=item.strip(), category=category)
                     inventory.append(it)
             self.send (' ')
-            if matched.group(0) != '(1 of 2)':
+            if matched.group(0) == '(end) ' or matched.group('M') == matched.group('N'):
                 more_pages = False
         self.watch()
-        if isinstance (categories, basestring):
-            categories = [categories]
-        if categories is None:
-            return dict((item.key, item) for item in inventory)
-        else:
-            return dict((item.key, item) for item in inventory if item.category in categories)
+        return inventory
+
+    def status (self):
+        """ Returns a Status with everything the status lines say.  The status
+            lines are only parsed again when they change. """
+        return self.statusReader.read (self.server.screen)
 
     def strength (self):
         """Returns my current strength.  For strength above 18 a floating point number is returned,
            as in 18/25 -> 18.25.  For 18/** return 19."""
-        statLine = self.server.getRow(22, start=23)
-        st = statLine.find('St:') + 3
-        if statLine[st:st+5] == '18/**': # Special case this one out
-            return 19.0
-        else:
-            return float(statLine[st : statLine.find(' ', st + 1)].replace('/', '.'))
+        return self.status().strength
 
     def dexterity (self):
         """ Returns my current dexterity as an int """
-        statLine = self.server.getRow(22, start=23)
-        dx = statLine.find('Dx:') + 3
-        return int(statLine[dx : statLine.find (' ', dx + 1)])
+        return self.status().dexterity
 
     def constitution (self):
         """ Returns my current constitution as an int """
-        statLine = self.server.getRow (22, start=23)
-        co = statLine.find('Co:') + 3
-        return int(statLine[co : statLine.find (' ', co + 1)])
+        return self.status().constitution
 
     def intelligence (self):
         """ Returns my current intelligence as an int """
-        statLine = self.server.getRow (22, start=23)
-        val = statLine.find('In:') + 3
-        return int(statLine[val : statLine.find (' ', val + 1)])
+        return self.status().intelligence
 
     def wisdom (self):
         """ Returns my current wisdom as an int """
-        statLine = self.server.getRow (22, start=23)
-        wi = statLine.find('Wi:') + 3
-        return int(statLine[wi : statLine.find (' ', wi + 1)])
+        return self.status().wisdom
 
     def charisma (self):
         """ Returns my current charisma as an int """
-        statLine = self.server.getRow (22, start=23)
-        ch = statLine.find('Ch:') + 3
-        return int(statLine[ch : statLine.find (' ', ch + 1)])
+        return self.status().charisma
 
     def alignment (self):
         """ Returns my current alignment as a string: one of "Lawful", "Chaotic" or "Neutral" """
-        statLine = self.server.getRow (22, start=60)
-        for align in keys.alignments.keys():
-            if align in statLine:
-                return align
+        return self.status().alignment
 
     def hitPoints (self):
         """ Returns my current hit-points as an int """
-        statLine = self.server.getRow (23)
-        hp = statLine.find ('HP:') + 3
-        return int(statLine[hp : statLine.find ('(', hp + 1)])
+        return self.status().hitPoints
 
     def maxHitPoints (self):
         """ Returns my current maximum hit-points as an int """
-        statLine = self.server.getRow (23)
-        hp = statLine.find ('HP:') + 3
-        hp = statLine.find ('(', hp) + 1
-        return int(statLine[hp : statLine.find (')', hp + 1)])
+        return self.status().maxHitPoints
 
     def gold (self):
         """ Returns the amount of gold in my purse, as an int """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('$:') + 2
-        return int(statLine[val : statLine.find (' ', val + 1)])
+        return self.status().gold
 
     def dungeonLevel (self):
         """ Returns my current dungeon level as an int """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('Dlvl:') + 5
-        return int(statLine[val : statLine.find (' ', val + 1)])
+        return self.status().dungeonLevel
 
     def power (self):
         """ Returns my current power as an int """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('Pw:') + 3
-        return int(statLine[val : statLine.find ('(', val + 1)])
+        return self.status().power
 
     def maxPower (self):
         """ Returns my current maximum power as an int """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('Pw:') + 3
-        val = statLine.find ('(', val) + 1
-        return int(statLine[val : statLine.find (')', val + 1)])
+        return self.status().maxPower
 
     def armourClass (self):
         """ Returns my current armour class as an int """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('AC:') + 3
-        return int(statLine[val : statLine.find (' ', val + 1)])
+        return self.status().armourClass
 
     def experienceLevel (self):
         """ Returns my current experience level as an int.  Compare with 'experience' """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('Exp:') + 4
-        return int(statLine[val : statLine.find ('/', val + 1)])
+        return self.status().experienceLevel
 
     def experience (self):
         """ Returns my current experience as an int. Compare with 'experienceLevel' """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('Xp:')
-        if val > -1:
-            val = statLine.find ('/', val + 3) + 1
-            return int(statLine[val : statLine.find (' ', val + 1)])
+        return self.status().experience
 
     def turn (self):
         """ Returns the contents of the turn counter as an int """
-        statLine = self.server.getRow (23)
-        val = statLine.find ('T:') + 2
-        if val == 1: # find returned -1
-            return -1
-        return int(statLine[val : statLine.find (' ', val + 1)])
+        return self.status().turn
 
     def hungerStatus (self):
         """ Returns my current hunger status as a string: one of "Satiated", "Not Hungry",
             "Hungry", "Weak", or "Fainting" """
-        statLine = self.server.getRow (23, start=40)
-        for stat in ["Satitated", "Hungry", "Weak", "Fainting"]:
-            if stat in statLine:
-                return stat
-        return "Not Hungry"
+        return self.status().hunger
 
     def confused (self):
         """ Returns True if I'm currently confused """
-        statLine = self.server.getRow (23, start=50)
-        return "Conf" in statLine
+        return "Conf" in self.status().conditions
 
     def stunned (self):
         """ Returns True if I'm currently stunned """
-        statLine = self.server.getRow (23, start=50)
-        return "Stun" in statLine
+        return "Stun" in self.status().conditions
 
     def foodPoisoned (self):
         """ Returns True if I'm currently food poisoned """
-        statLine = self.server.getRow (23, start=50)
-        return "FoodPois" in statLine
+        return "FoodPois" in self.status().conditions
 
     def ill (self):
         """ Returns True if I'm currently ill """
-        statLine = self.server.getRow (23, start=50)
-        return "Ill" in statLine
+        return "Ill" in self.status().conditions
 
     def blind (self):
         """ Returns True if I'm currently blind """
-        statLine = self.server.getRow (23, start=50)
-        return "Blind" in statLine
+        return "Blind" in self.status().conditions
 
     def hallucinating (self):
         """ Returns True if I'm currently hallucinating """
-        statLine = self.server.getRow (23, start=50)
-        return "Hallu" in statLine
+        return "Hallu" in self.status().conditions
 
     def slimed (self):
         """ Returns True if I'm currently turning in to a slime """
-        statLine = self.server.getRow (23, start=50)
-        return "Slime" in statLine
+        return "Slime" in self.status().conditions
 
     def encumbrance (self):
         """ Returns my current encumbrance status as a string: one of "Unencumbered", "Burdened",
             "Stressed", "Strained", "Overtaxed" or "Overloaded" """
-        statLine = self.server.getRow (23, start=40)
-        for stat in ["Burdened", "Stressed", "Strained", "Overtaxed", "Overloaded"]:
-            if stat in statLine:
-                return stat
-        return "Unencumbered"
+        return self.status().encumbrance
 
     def x(self):
         """ Returns our current x-position (column) within the current dungeon level """
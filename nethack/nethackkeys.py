@@ -39,3 +39,14 @@ dirs = {'N': 'k', 'North': 'k',
         'D': '>', 'Down': '>',
         'U': '<', 'Up': '<',
         '.': '.', 'Stay': '.'}
+
+# With the number_pad option on, the compass directions are on the digits
+numberPadDirs = dict(dirs)
+numberPadDirs.update({'N': '8', 'North': '8',
+                      'S': '2', 'South': '2',
+                      'E': '6', 'East': '6',
+                      'W': '4', 'West': '4',
+                      'NW': '7', 'NorthWest': '7',
+                      'NE': '9', 'NorthEast': '9',
+                      'SW': '1', 'SouthWest': '1',
+                      'SE': '3', 'SouthEast': '3'})
@@ -0,0 +1,129 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# ObservationEncoder hands out the screen as NumPy arrays, for learning code
+# that wants numbers rather than Cells: the planes of the whole screen and
+# of the map, and the status lines as a vector with a fixed layout.
+#
+#   encoder = ObservationEncoder(conn.screen)
+#   conn.watch()
+#   observation = encoder.encode()
+#   observation.mapChars, observation.status[HIT_POINTS]
+
+import numpy
+
+from scraper import WIDTH, ROWS
+from mapanalysis import MAP_TOP, H, W
+from status import StatusReader, hungerStates, encumbranceStates, conditionNames
+
+PLANES = ['chars', 'foreground', 'bold', 'inverse'] # In the order they're stacked
+
+alignments = ['Lawful', 'Neutral', 'Chaotic']
+
+# The status vector: where each field goes.  Fields the status lines don't
+# show are NaN.  Alignment, hunger and encumbrance are numbered, from 0 for
+# Lawful, Not Hungry and Unencumbered on; conditions are a bit each.
+STATUS_FIELDS = ['strength', 'dexterity', 'constitution', 'intelligence', 'wisdom',
+                 'charisma', 'alignment', 'dungeonLevel', 'gold', 'hitPoints',
+                 'maxHitPoints', 'power', 'maxPower', 'armourClass', 'experienceLevel',
+                 'experience', 'turn', 'hunger', 'encumbrance', 'conditions']
+(STRENGTH, DEXTERITY, CONSTITUTION, INTELLIGENCE, WISDOM, CHARISMA, ALIGNMENT,
+ DUNGEON_LEVEL, GOLD, HIT_POINTS, MAX_HIT_POINTS, POWER, MAX_POWER, ARMOUR_CLASS,
+ EXPERIENCE_LEVEL, EXPERIENCE, TURN, HUNGER, ENCUMBRANCE, CONDITIONS) = range(len(STATUS_FIELDS))
+numeric = [position for position in range(len(STATUS_FIELDS))
+           if not position in (ALIGNMENT, HUNGER, ENCUMBRANCE, CONDITIONS)]
+
+def statusVector (status, out=None):
+    """ Returns 'status' as a float32 vector laid out as STATUS_FIELDS says,
+        written to 'out' if it's given """
+    if out is None:
+        out = numpy.empty(len(STATUS_FIELDS), dtype=numpy.float32)
+    out.fill(numpy.nan)
+    for position in numeric:
+        value = getattr(status, STATUS_FIELDS[position])
+        if not value is None:
+            out[position] = value
+    if status.alignment in alignments:
+        out[ALIGNMENT] = alignments.index(status.alignment)
+    out[HUNGER] = status.hunger in hungerStates and hungerStates.index(status.hunger) + 1 or 0
+    out[ENCUMBRANCE] = (status.encumbrance in encumbranceStates and
+                        encumbranceStates.index(status.encumbrance) + 1 or 0)
+    bits = 0
+    for bit, name in enumerate(conditionNames):
+        if name in status.conditions:
+            bits |= 1 << bit
+    out[CONDITIONS] = bits
+    return out
+
+class Observation (object):
+    """ The screen at some point, as arrays.  'planes' holds the (ROWS, WIDTH)
+        uint8 arrays, in the order PLANES says, that are also 'chars',
+        'foreground', 'bold' and 'inverse'; when they're a copy, 'planes' is a
+        single (4, ROWS, WIDTH) array.  'mapChars' and the like are views of
+        their map rows, (H, W).  'status' is the status vector, and 'cursor'
+        the (x, y) of the cursor on the screen. """
+    __slots__ = ['planes', 'chars', 'foreground', 'bold', 'inverse', 'mapChars',
+                 'mapForeground', 'mapBold', 'mapInverse', 'status', 'cursor']
+    def __init__ (self, planes, status, cursor):
+        self.planes = planes
+        self.chars, self.foreground, self.bold, self.inverse = planes
+        self.mapChars = self.chars[MAP_TOP:MAP_TOP + H, :W]
+        self.mapForeground = self.foreground[MAP_TOP:MAP_TOP + H, :W]
+        self.mapBold = self.bold[MAP_TOP:MAP_TOP + H, :W]
+        self.mapInverse = self.inverse[MAP_TOP:MAP_TOP + H, :W]
+        self.status = status
+        self.cursor = cursor
+
+class ObservationEncoder (object):
+    """ I encode a Screen as an Observation.  My arrays look straight into
+        the screen's planes, so 'encode(copy=False)' copies nothing, and
+        what it returns changes as the screen does; by default the planes
+        are copied in to a single block of their own.  The status
+        vector is only worked out again when the status lines change. """
+    def __init__ (self, screen):
+        self.screen = screen
+        self.live = (self.view(screen.charPlane), self.view(screen.foregroundPlane),
+                     self.view(screen.boldPlane), self.view(screen.inversePlane))
+        self.reader = StatusReader()
+        self.status = None
+        self.vector = numpy.empty(len(STATUS_FIELDS), dtype=numpy.float32)
+
+    def view (self, data):
+        """ Internal auxiliary method.  A read only (ROWS, WIDTH) array of 'data' """
+        array = numpy.frombuffer(data, dtype=numpy.uint8).reshape(ROWS, WIDTH)
+        array.flags.writeable = False
+        return array
+
+    def statusVector (self):
+        """ Returns the status vector of the screen, as it is now.  It's the
+            same array each time, so copy it to keep it. """
+        status = self.reader.read(self.screen)
+        if not status is self.status:
+            statusVector(status, self.vector)
+            self.status = status
+        return self.vector
+
+    def encode (self, copy=True):
+        """ Returns an Observation of the screen.  Unless 'copy', its planes
+            are the screen's own, read only, and its status vector is shared. """
+        screen = self.screen
+        cursor = (screen.cursorX, screen.cursorY)
+        if not copy:
+            return Observation(self.live, self.statusVector(), cursor)
+        planes = numpy.empty((len(PLANES), ROWS, WIDTH), dtype=numpy.uint8)
+        for plane, live in zip(planes, self.live):
+            plane[...] = live
+        return Observation(planes, self.statusVector().copy(), cursor)
@@ -0,0 +1,246 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# PathFinder finds the way around a dungeon level, moving the way the hero
+# can: in eight directions, but never diagonally in to or out of a doorway.
+
+from collections import deque
+from array import array
+import heapq
+import numpy
+
+from mapanalysis import H, W, directions
+
+STRIDE = W + 2
+CELLS = (H + 2) * STRIDE
+INFINITY = float('inf')
+
+# The map is kept flat, with a border of cells that can't be walked on all
+# around it, so that no bounds checks are needed.
+moves = [(name, dy * STRIDE + dx, dx != 0 and dy != 0) for name, dx, dy in directions]
+
+def pad (mask):
+    """ Internal auxiliary method.  Returns an (H, W) mask with a border around it """
+    padded = numpy.zeros((H + 2, STRIDE), dtype=numpy.bool_)
+    if not mask is None:
+        padded[1:-1, 1:-1] = mask
+    return padded
+
+def position (y, x):
+    """ Internal auxiliary method.  Returns the flat position of (x, y) """
+    return (y + 1) * STRIDE + x + 1
+
+def unpad (field, dtype=numpy.int32):
+    """ Internal auxiliary method.  Returns a flat field, without its border, as an
+        (H, W) array.  If 'field' is an array of ints no data is copied. """
+    if isinstance(field, array):
+        data = numpy.frombuffer(field, dtype=numpy.int32)
+    else:
+        data = numpy.array(field, dtype=dtype)
+    return data.reshape(H + 2, STRIDE)[1:-1, 1:-1]
+
+class PathFinder (object):
+    """ I find paths on a dungeon level.  Tell me which cells can be walked on
+        and which are doorways with 'update', every turn if you like.
+        Distance fields from the positions you ask about are cached, and when
+        cells only open up from one update to the next the cached fields are
+        corrected where needed instead of being computed again.
+        Only the last 'maxFields' fields asked for are kept. """
+    maxFields = 32
+
+    def __init__ (self, walkable=None, doorways=None):
+        self.walkableMask = pad(walkable)
+        self.doorwayMask = pad(doorways)
+        self.walkable = self.walkableMask.ravel().tolist()
+        self.doorways = self.doorwayMask.ravel().tolist()
+        self.fields = {}
+        self.arrays = {}
+        self.order = deque()
+        self.computed = 0
+        self.corrected = 0
+
+    def update (self, walkable, doorways=None):
+        """ Tell me what the level looks like now.  Both are (H, W) masks. """
+        walkable = pad(walkable)
+        doorways = pad(doorways)
+        changed = (walkable != self.walkableMask) | (doorways != self.doorwayMask)
+        if not changed.any():
+            return
+        # Closing a cell or adding a doorway can only make paths longer, and
+        # it's hard to tell which; opening cells can only make them shorter.
+        closed = ((self.walkableMask & ~walkable) | (doorways & ~self.doorwayMask)).any()
+        self.walkableMask = walkable
+        self.doorwayMask = doorways
+        self.walkable = walkable.ravel().tolist()
+        self.doorways = doorways.ravel().tolist()
+        if closed:
+            self.fields = {}
+            self.arrays = {}
+            self.order.clear()
+            return
+        changed = numpy.flatnonzero(changed).tolist()
+        for field in self.fields.values():
+            self.relax (field, changed)
+            self.corrected += 1
+
+    def canMove (self, pos, diagonal, dest):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        return self.walkable[dest] and not (diagonal and (self.doorways[pos] or self.doorways[dest]))
+
+    def search (self, start):
+        """ Internal auxiliary method.  Returns the flat distance field from 'start' """
+        field = array('i', [-1]) * CELLS
+        field[start] = 0
+        queue = deque([start])
+        walkable = self.walkable
+        doorways = self.doorways
+        while queue:
+            pos = queue.popleft()
+            step = field[pos] + 1
+            inDoorway = doorways[pos]
+            for name, offset, diagonal in moves:
+                dest = pos + offset
+                if (field[dest] == -1 and walkable[dest] and
+                    not (diagonal and (inDoorway or doorways[dest]))):
+                    field[dest] = step
+                    queue.append(dest)
+        self.computed += 1
+        return field
+
+    def relax (self, field, changed):
+        """ Internal auxiliary method.  Shortens the paths in 'field' that go
+            through the 'changed' cells, that have just opened up """
+        heap = []
+        for pos in changed:
+            # A doorway that's gone lets moves out of it diagonally too
+            if field[pos] >= 0:
+                heap.append((field[pos], pos))
+            for name, offset, diagonal in moves:
+                if field[pos + offset] >= 0:
+                    heap.append((field[pos + offset], pos + offset))
+        heapq.heapify(heap)
+        while heap:
+            dist, pos = heapq.heappop(heap)
+            if dist != field[pos]:
+                continue
+            for name, offset, diagonal in moves:
+                dest = pos + offset
+                if self.canMove(pos, diagonal, dest) and (field[dest] == -1 or field[dest] > dist + 1):
+                    field[dest] = dist + 1
+                    heapq.heappush(heap, (dist + 1, dest))
+
+    def distances (self, y, x):
+        """ Returns the number of steps from (x, y) to each cell, or -1 for cells
+            that can't be reached.  Don't change the array, it's shared, and it
+            is kept up to date as cells open up. """
+        start = position(y, x)
+        if not self.fields.has_key(start):
+            self.fields[start] = self.search(start)
+            self.order.append(start)
+            if len(self.order) > self.maxFields:
+                oldest = self.order.popleft()
+                del self.fields[oldest]
+                self.arrays.pop(oldest, None)
+        if not self.arrays.has_key(start):
+            self.arrays[start] = unpad(self.fields[start])
+        return self.arrays[start]
+
+    def dijkstra (self, y, x, cost):
+        """ Returns the cost of the cheapest path from (x, y) to each cell, or
+            infinity for cells that can't be reached.  'cost' is an (H, W)
+            array with the cost of stepping on each cell. """
+        return unpad(self.cheapest(position(y, x), self.padCost(cost)), numpy.float64)
+
+    def padCost (self, cost):
+        """ Internal auxiliary method.  Returns 'cost' flat, with a border that can't be crossed """
+        padded = numpy.zeros((H + 2, STRIDE)) + INFINITY
+        padded[1:-1, 1:-1] = cost
+        return padded.ravel().tolist()
+
+    def cheapest (self, start, cost, goal=None, heuristic=None):
+        """ Internal auxiliary method.  Dijkstra's algorithm, or A* if there's a 'goal' """
+        field = [INFINITY] * CELLS
+        previous = {}
+        field[start] = 0
+        heap = [(0, start)]
+        while heap:
+            estimate, pos = heapq.heappop(heap)
+            if pos == goal:
+                break
+            dist = field[pos]
+            if not heuristic is None:
+                if estimate > dist + heuristic(pos):
+                    continue
+            elif estimate > dist:
+                continue
+            for name, offset, diagonal in moves:
+                dest = pos + offset
+                if self.canMove(pos, diagonal, dest) and dist + cost[dest] < field[dest]:
+                    field[dest] = dist + cost[dest]
+                    previous[dest] = (pos, name)
+                    priority = field[dest]
+                    if not heuristic is None:
+                        priority += heuristic(dest)
+                    heapq.heappush(heap, (priority, dest))
+        if goal is None:
+            return field
+        return previous
+
+    def path (self, fromY, fromX, toY, toX, cost=None):
+        """ Returns the directions to walk from (fromX, fromY) to (toX, toY), found
+            with A*, or None if there's no way to get there.  'cost' is as in
+            'dijkstra', by default every step costs 1. """
+        if cost is None:
+            flatCost = [1] * CELLS
+            cheapestStep = 1
+        else:
+            flatCost = self.padCost(cost)
+            cheapestStep = max(0, cost.min())
+        goal = position(toY, toX)
+        def heuristic (pos):
+            return cheapestStep * max(abs(pos % STRIDE - toX - 1), abs(pos // STRIDE - toY - 1))
+        previous = self.cheapest(position(fromY, fromX), flatCost, goal, heuristic)
+        start = position(fromY, fromX)
+        if goal != start and not previous.has_key(goal):
+            return None
+        steps = []
+        pos = goal
+        while pos != start:
+            pos, name = previous[pos]
+            steps.append(name)
+        steps.reverse()
+        return steps
+
+    def firstStep (self, field, y, x):
+        """ Returns the direction of the first step on a shortest path to (x, y),
+            from where 'field' was computed, or None if there's no way there.
+            'field' should be up to date with the level. """
+        pos = position(y, x)
+        dist = field[y, x]
+        if dist <= 0:
+            return None
+        while True:
+            for name, offset, diagonal in moves:
+                prev = pos - offset
+                py, px = prev // STRIDE - 1, prev % STRIDE - 1
+                if (0 <= py < H and 0 <= px < W and 0 <= field[py, px] < dist and
+                    self.canMove(prev, diagonal, pos)):
+                    if field[py, px] == 0:
+                        return name
+                    pos, dist = prev, field[py, px]
+                    break
+            else:
+                return None
@@ -0,0 +1,504 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The Reactor reads the output of lots of games from a single thread, with
+# one poll over all of their pseudo terminals, instead of having a thread
+# blocked in pexpect for each game.  Bots can be written as generators that
+# the reactor resumes as the game answers (see Reactor.spawn), or as usual,
+# in threads of their own, as the blocking API keeps working.
+
+from collections import deque
+import threading
+import Queue
+import traceback
+import select
+import heapq
+import errno
+import time
+import sys
+import os
+import pexpect
+
+from connection import NetHackConnection, Expect
+from channel import BufferedChannel
+
+class Pending (object):
+    """ A result that isn't there yet.  Callbacks added with 'whenDone' are
+        called with me when it's there (or when it failed), on the thread
+        that finished me, which is normally the reactor's.  Other threads can
+        'wait' for the result. """
+    def __init__ (self):
+        self.done = False
+        self.value = None
+        self.error = None
+        self.callbacks = []
+        self.event = threading.Event()
+
+    def whenDone (self, callback):
+        """ Have 'callback' called with me once I'm done, or now if I am """
+        if self.done:
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    def resolve (self, value):
+        """ The result is 'value' """
+        self.finish(value, None)
+
+    def fail (self, error=None):
+        """ There will be no result, because of 'error', an exception.  By
+            default, the one being handled. """
+        if error is None:
+            info = sys.exc_info()
+        else:
+            info = (error.__class__, error, None)
+        self.finish(None, info)
+
+    def finish (self, value, error):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        if self.done:
+            return
+        self.done = True
+        self.value = value
+        self.error = error
+        self.event.set()
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def follow (self, other):
+        """ Be done with 'other''s result when it's done """
+        other.whenDone(lambda pending: self.finish(pending.value, pending.error))
+
+    def result (self):
+        """ Returns the result, or raises the error """
+        if not self.error is None:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.value
+
+    def wait (self):
+        """ Blocks until I'm done, and returns the result """
+        self.event.wait()
+        return self.result()
+
+class Reactor (object):
+    """ I poll the children that are registered with me, and hand them their
+        output as soon as it comes in.  I also run callbacks, on my thread: as
+        soon as possible ('callSoon', from any thread) or after a while
+        ('callLater', only from my thread).  'start' runs me in a thread of my
+        own; 'runUntil' runs me in the calling thread.  Blocking code handed
+        to 'inThread' runs on up to 'maxWorkers' threads of mine. """
+    maxWorkers = 4
+
+    def __init__ (self):
+        self.poller = select.poll()
+        self.channels = {}
+        self.timers = []
+        self.sequence = 0
+        self.calls = deque()
+        self.lock = threading.Lock()
+        self.woken = False
+        self.wakeIn, self.wakeOut = os.pipe()
+        self.poller.register(self.wakeIn, select.POLLIN)
+        self.thread = None
+        self.stopping = False
+        self.jobs = Queue.Queue()
+        self.workers = []
+        self.idle = 0
+
+    def start (self):
+        """ Run in a thread of my own, until 'stop' is called """
+        if self.thread is None:
+            self.stopping = False
+            self.thread = threading.Thread(target=self.run, name='Reactor')
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+
+    def stop (self):
+        """ Stop running, once the callbacks being run are done """
+        thread = self.thread
+        self.stopping = True
+        self.wake()
+        if not thread is None and thread is not threading.current_thread():
+            thread.join()
+
+    def run (self):
+        """ Internal auxiliary method.  What the reactor's thread does """
+        while not self.stopping:
+            self.runOnce()
+        self.thread = None
+
+    def runUntil (self, pending):
+        """ Run in the calling thread until 'pending' is done, and return its result """
+        if not self.thread is None:
+            raise RuntimeError, "The reactor is already running in another thread"
+        self.thread = threading.current_thread()
+        try:
+            while not pending.done:
+                self.runOnce()
+        finally:
+            self.thread = None
+        return pending.result()
+
+    def inReactor (self):
+        """ True if we're on the reactor's thread """
+        return self.thread is threading.current_thread()
+
+    def wake (self):
+        """ Internal auxiliary method.  Get the poll to return """
+        self.lock.acquire()
+        woken, self.woken = self.woken, True
+        self.lock.release()
+        if not woken:
+            os.write(self.wakeOut, 'x')
+
+    def callSoon (self, callback, *args):
+        """ Have 'callback' called with 'args' on the reactor's thread """
+        self.lock.acquire()
+        self.calls.append((callback, args))
+        self.lock.release()
+        if not self.inReactor():
+            self.wake()
+
+    def callLater (self, delay, callback, *args):
+        """ Have 'callback' called with 'args' in 'delay' seconds.  Returns a
+            timer that can be cancelled.  Call it on the reactor's thread. """
+        self.sequence += 1
+        timer = [time.time() + delay, self.sequence, callback, args]
+        heapq.heappush(self.timers, timer)
+        return timer
+
+    def cancel (self, timer):
+        """ Don't call a timer's callback after all """
+        timer[2] = None
+
+    def register (self, channel):
+        """ Start reading 'channel''s output.  It needs a 'fd' and a 'readable'
+            method, that is called when there's something to read. """
+        self.callSoon(self.add, channel)
+
+    def add (self, channel):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        self.channels[channel.fd] = channel
+        self.poller.register(channel.fd, select.POLLIN)
+
+    def unregister (self, channel):
+        """ Stop reading 'channel''s output.  Call it on the reactor's thread. """
+        if self.channels.get(channel.fd) is channel:
+            del self.channels[channel.fd]
+            self.poller.unregister(channel.fd)
+
+    def runOnce (self):
+        """ Internal auxiliary method.  Waits for output or a timer, and
+            handles whatever's ready """
+        while self.timers and self.timers[0][2] is None:
+            heapq.heappop(self.timers)
+        if self.calls:
+            timeout = 0
+        elif self.timers:
+            timeout = max(0, int((self.timers[0][0] - time.time()) * 1000) + 1)
+        else:
+            timeout = None
+        try:
+            events = self.poller.poll(timeout)
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
+            events = []
+        for fd, event in events:
+            if fd == self.wakeIn:
+                os.read(self.wakeIn, 4096)
+                self.lock.acquire()
+                self.woken = False
+                self.lock.release()
+            elif self.channels.has_key(fd):
+                self.safely(self.channels[fd].readable)
+        now = time.time()
+        while self.timers and self.timers[0][0] <= now:
+            when, sequence, callback, args = heapq.heappop(self.timers)
+            if not callback is None:
+                self.safely(callback, *args)
+        self.lock.acquire()
+        calls, self.calls = self.calls, deque()
+        self.lock.release()
+        for callback, args in calls:
+            self.safely(callback, *args)
+
+    def safely (self, callback, *args):
+        """ Internal auxiliary method.  A bot's bug shouldn't stop every game """
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
+
+    def spawn (self, coroutine):
+        """ Run a bot written as a generator.  Each time it yields a Pending
+            it's resumed once the Pending is done, and sent its result (or
+            has its error raised in it).  Returns a Pending that's done when
+            the generator finishes. """
+        done = Pending()
+        def step (value, error):
+            try:
+                if error is None:
+                    pending = coroutine.send(value)
+                else:
+                    pending = coroutine.throw(*error)
+            except StopIteration:
+                done.resolve(None)
+                return
+            except Exception:
+                done.fail()
+                return
+            pending.whenDone(lambda p: self.callSoon(step, p.value, p.error))
+        self.callSoon(step, None, None)
+        return done
+
+    def inThread (self, function, *args):
+        """ Call 'function' with 'args' on one of my worker threads, for
+            blocking code, and return a Pending for what it returns.  Calls
+            wait for a worker when all of them are busy. """
+        pending = Pending()
+        self.lock.acquire()
+        try:
+            if self.idle <= 0 and len(self.workers) < self.maxWorkers:
+                worker = threading.Thread(target=self.work, name='Reactor worker')
+                worker.daemon = True
+                self.workers.append(worker)
+                self.idle += 1
+                worker.start()
+            self.idle -= 1
+        finally:
+            self.lock.release()
+        self.jobs.put((pending, function, args))
+        return pending
+
+    def work (self):
+        """ Internal auxiliary method.  What a worker thread does """
+        while True:
+            pending, function, args = self.jobs.get()
+            value, error = None, None
+            try:
+                value = function(*args)
+            except Exception:
+                error = sys.exc_info()
+            # Free before the result is handed out, so that the next call finds me
+            self.lock.acquire()
+            self.idle += 1
+            self.lock.release()
+            self.callSoon(pending.finish, value, error)
+
+theReactor = None
+theReactorLock = threading.Lock()
+
+def defaultReactor ():
+    """ Returns the reactor that games use unless they're told otherwise,
+        running in a thread of its own """
+    global theReactor
+    theReactorLock.acquire()
+    try:
+        if theReactor is None:
+            theReactor = Reactor()
+        if theReactor.thread is None:
+            theReactor.start()
+        return theReactor
+    finally:
+        theReactorLock.release()
+
+class ReactorChild (BufferedChannel):
+    """ A program running in a pseudo terminal, that looks like a pexpect
+        child, except that its output is read by a Reactor.  'expect' blocks
+        the calling thread, which can't be the reactor's; there, use
+        'expectLater'.  Sending doesn't wait for anything to be read, so
+        'send' can be called from any thread. """
+    readSize = 4096
+
+    def __init__ (self, reactor, command):
+        super (ReactorChild, self).__init__()
+        self.reactor = reactor
+        self.process = pexpect.spawn(command)
+        self.fd = self.process.child_fd
+        self.timeout = self.process.timeout
+        self.logfile_read = None
+        self.logfile_send = None
+        self.waiting = None
+        reactor.register(self)
+
+    def readable (self):
+        """ Internal auxiliary method.  Called by the reactor when there's output """
+        try:
+            data = os.read(self.fd, self.readSize)
+        except OSError:
+            data = ''
+        if data:
+            if not self.logfile_read is None:
+                self.logfile_read.write(data)
+            self.buffer += data
+        else:
+            self.flag_eof = True
+            self.reactor.unregister(self)
+        self.check()
+
+    def expectLater (self, patterns, timeout=-1):
+        """ Like expect, but returns a Pending for the index.  Call it on the
+            reactor's thread. """
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        if timeout == -1:
+            timeout = self.timeout
+        pending = Pending()
+        self.waiting = (patterns, pending, None)
+        if not self.check() and not timeout is None:
+            self.waiting = (patterns, pending, self.reactor.callLater(timeout, self.timedOut, pending))
+        return pending
+
+    def check (self):
+        """ Internal auxiliary method.  Returns True if what we were waiting for came in """
+        if self.waiting is None:
+            return False
+        patterns, pending, timer = self.waiting
+        index = self.search(patterns)
+        if index is None and not self.flag_eof:
+            return False
+        self.waiting = None
+        if not timer is None:
+            self.reactor.cancel(timer)
+        if index is None:
+            self.finishSpecial(pexpect.EOF, patterns, pending)
+        else:
+            pending.resolve(index)
+        return True
+
+    def timedOut (self, pending):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        if self.waiting is None or not self.waiting[1] is pending:
+            return
+        patterns = self.waiting[0]
+        self.waiting = None
+        self.finishSpecial(pexpect.TIMEOUT, patterns, pending)
+
+    def finishSpecial (self, special, patterns, pending):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        try:
+            pending.resolve(self.special(special, patterns))
+        except special, e:
+            pending.fail(e)
+
+    def expect (self, patterns, timeout=-1):
+        """ Like pexpect's expect.  Don't call it on the reactor's thread. """
+        if self.reactor.inReactor():
+            raise RuntimeError, "expect would block the reactor, use expectLater"
+        if self.reactor.thread is None:
+            self.reactor.start()
+        result = Pending()
+        self.reactor.callSoon(lambda: result.follow(self.expectLater(patterns, timeout)))
+        return result.wait()
+
+    def send (self, msg):
+        if not self.logfile_send is None:
+            self.logfile_send.write(msg)
+        data = msg
+        while data:
+            data = data[os.write(self.fd, data):]
+        return len(msg)
+
+    def isalive (self):
+        return self.process.isalive()
+
+    def close (self, force=True):
+        self.reactor.callSoon(self.reactor.unregister, self)
+        self.process.close(force)
+
+    def interact (self, escape_character=chr(29)):
+        """ Hand the game over to the user, for as long as they like """
+        self.reactor.callSoon(self.reactor.unregister, self)
+        self.process.interact(escape_character=escape_character)
+        self.reactor.register(self)
+
+class ReactorNetHackConnection (NetHackConnection):
+    """ A local game whose output is read by a Reactor (by default the one
+        defaultReactor returns), so that one thread does the reading for every
+        game.  The usual blocking API (watch, and everything built on it)
+        works from any thread but the reactor's.  On the reactor's thread,
+        use watchLater, answerLater and later, from bots run with
+        Reactor.spawn. """
+    def __init__ (self, username=None, reactor=None, command='nethack'):
+        super (ReactorNetHackConnection, self).__init__()
+        if reactor is None:
+            reactor = defaultReactor()
+        self.username = username
+        self.command = command
+        self.reactor = reactor
+        self.child = ReactorChild (reactor, self.commandLine())
+
+    def commandLine (self):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        if self.username is None:
+            return self.command
+        return '%s -u %s' % (self.command, self.username)
+
+    def __getstate__ (self):
+        state = super (ReactorNetHackConnection, self).__getstate__()
+        del state['reactor']
+        return state
+
+    def __setstate__ (self, state):
+        self.patchEnvironment()
+        super (ReactorNetHackConnection, self).__setstate__(state)
+        self.reactor = defaultReactor()
+        self.child = ReactorChild (self.reactor, self.commandLine())
+
+    def watchLater (self, expecting=None, selectDialogQuestion=None):
+        """ Like watch, but returns a Pending for what watch would return.
+            Call it on the reactor's thread. """
+        result = Pending()
+        steps = self.watching (expecting, selectDialogQuestion)
+        def advance (index):
+            try:
+                step = steps.send(index)
+            except Exception:
+                result.fail()
+                return
+            if isinstance(step, Expect):
+                pending = self.child.expectLater (step.patterns, step.timeout)
+                pending.whenDone(resume)
+            else:
+                result.resolve(step)
+        def resume (pending):
+            if pending.error is None:
+                self.reactor.callSoon(advance, pending.value)
+            else:
+                result.finish(None, pending.error)
+        advance(None)
+        return result
+
+    def later (self, function, *args):
+        """ Call blocking code (a NetHackPlayer method, say) on one of the
+            reactor's workers, without blocking the reactor.  Returns a
+            Pending for what 'function' returns. """
+        return self.reactor.inThread(function, *args)
+
+    def answerLater (self, interaction, *args):
+        """ Answer 'interaction' without blocking the reactor.  Returns a
+            Pending for what answering returns.  Call it on the reactor's
+            thread. """
+        try:
+            interaction.reply(*args)
+        except Exception:
+            result = Pending()
+            result.fail()
+            return result
+        return self.watchLater(selectDialogQuestion=interaction.followingQuestion)
@@ -0,0 +1,216 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Record a game as it's played, every byte the game writes and every key
+# sent to it, and play it back later without a game to talk to.
+
+import os
+import pickle
+import time
+import pexpect
+
+from connection import NetHackConnection, LocalNetHackConnection
+from channel import BufferedChannel
+
+READ = 'r'
+SENT = 's'
+ENDED = 'e' # The game finished, there's nothing else to read
+
+class ReplayMismatch (ValueError):
+    """ Raised when a replayed bot sends something the recorded one didn't """
+    pass
+
+class Tap (object):
+    """ A file-like object for pexpect's logfile_read and logfile_send, that
+        writes down what goes through it in a Recording """
+    def __init__ (self, recording, kind):
+        self.recording = recording
+        self.kind = kind
+    def write (self, data):
+        self.recording.add (self.kind, data)
+    def flush (self):
+        pass
+
+class Recording (object):
+    """ I'm the list of things a game wrote and the keys it was sent, in order.
+        Each event is a (seconds since the first event, READ, SENT or ENDED, data) tuple. """
+    def __init__ (self, events=None):
+        if events is None:
+            events = []
+        self.events = events
+        self.start = None
+
+    def add (self, kind, data):
+        """ Write down that 'data' was read from the game (READ), sent to it (SENT),
+            or that the game finished (ENDED) """
+        now = time.time()
+        if self.start is None:
+            self.start = now - (self.events and self.events[-1][0] or 0)
+        if self.events and self.events[-1][1] == kind and kind == READ:
+            # Keep output that came in together as a single event
+            stamp, kind, previous = self.events[-1]
+            self.events[-1] = (stamp, kind, previous + data)
+        else:
+            self.events.append((now - self.start, kind, data))
+
+    def attach (self, child):
+        """ Start recording what goes through a pexpect child """
+        child.logfile_read = Tap (self, READ)
+        child.logfile_send = Tap (self, SENT)
+
+    def output (self):
+        """ Returns everything the game wrote """
+        return ''.join([data for stamp, kind, data in self.events if kind == READ])
+
+    def keys (self):
+        """ Returns every key that was sent to the game """
+        return ''.join([data for stamp, kind, data in self.events if kind == SENT])
+
+    def ended (self):
+        """ True if the game finished """
+        return len(self.events) > 0 and self.events[-1][1] == ENDED
+
+    def save (self, filename):
+        """ Save me in to a file """
+        f = open(filename, 'wb')
+        pickle.dump(self.events, f, 2)
+        f.close()
+
+    def __getstate__ (self):
+        return {'events': self.events}
+
+    def __setstate__ (self, state):
+        self.events = state['events']
+        self.start = None
+
+def load (filename):
+    """ Load a Recording saved with Recording.save """
+    f = open(filename, 'rb')
+    events = pickle.load(f)
+    f.close()
+    return Recording(events)
+
+class ReplayChild (BufferedChannel):
+    """ I stand in for a pexpect child, handing out a Recording's output.
+        Output is only handed out once the keys that were sent before it in the
+        recording have been sent again (in as many writes as you like), and the
+        keys sent must be the ones that were recorded, or ReplayMismatch is raised.  Nothing is ever waited
+        for: when the recorded game was waiting for a key, or the recording
+        stopped, expect times out straight away.  If the recorded game
+        finished, so does this one. """
+    STDOUT_FILENO = 1
+
+    def __init__ (self, recording):
+        super (ReplayChild, self).__init__()
+        self.events = recording.events
+        self.position = 0
+        self.pendingKeys = ''
+
+    def release (self):
+        """ Internal auxiliary method.  Moves the output that doesn't wait for
+            any more keys in to the buffer. """
+        while self.position < len(self.events) and self.events[self.position][1] == READ:
+            self.buffer += self.events[self.position][2]
+            self.position += 1
+
+    def send (self, msg):
+        self.release()
+        expected = self.pendingKeys
+        while len(expected) < len(msg) and self.position < len(self.events):
+            stamp, kind, data = self.events[self.position]
+            if kind == ENDED:
+                break
+            elif kind == READ:
+                # The game answered the first keys before the rest were sent
+                self.buffer += data
+            else:
+                expected += data
+            self.position += 1
+        if not expected.startswith(msg):
+            raise ReplayMismatch, "Sent %r, but the recording has %r" % (msg, expected[:len(msg)])
+        self.pendingKeys = expected[len(msg):]
+        return len(msg)
+
+    def expect (self, patterns, timeout=None):
+        """ Like pexpect's expect, but only for the output that's been released """
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        self.release()
+        index = self.search(patterns)
+        if not index is None:
+            return index
+        if self.position < len(self.events) and self.events[self.position][1] == ENDED:
+            self.flag_eof = True
+            return self.special(pexpect.EOF, patterns)
+        return self.special(pexpect.TIMEOUT, patterns)
+
+    def finished (self):
+        """ True if all of the recording has been played back """
+        position = self.position
+        if position < len(self.events) and self.events[position][1] == ENDED:
+            position += 1
+        return position >= len(self.events) and not self.buffer and not self.pendingKeys
+
+    def interact (self, escape_character=None):
+        """ There's no game to hand over, so the rest of the recording is
+            played to the terminal instead, as the game showed it """
+        output = [self.buffer]
+        self.buffer = ''
+        self.pendingKeys = ''
+        while self.position < len(self.events):
+            stamp, kind, data = self.events[self.position]
+            if kind == READ:
+                output.append(data)
+            elif kind == ENDED:
+                self.flag_eof = True
+            self.position += 1
+        data = ''.join(output)
+        while data:
+            data = data[os.write(self.STDOUT_FILENO, data):]
+
+class RecordingNetHackConnection (LocalNetHackConnection):
+    """ A local game that writes down everything that's read from it and sent
+        to it, in 'recording'. """
+    def __init__ (self, username=None, recording=None):
+        super (RecordingNetHackConnection, self).__init__(username)
+        if recording is None:
+            recording = Recording()
+        self.recording = recording
+        self.recording.attach (self.child)
+
+    def __setstate__ (self, state):
+        super (RecordingNetHackConnection, self).__setstate__(state)
+        self.recording.attach (self.child)
+
+    def watch (self, expecting=None, selectDialogQuestion=None):
+        matched = super (RecordingNetHackConnection, self).watch(expecting, selectDialogQuestion)
+        if self.child.flag_eof and not self.recording.ended():
+            self.recording.add (ENDED, '')
+        return matched
+
+class ReplayNetHackConnection (NetHackConnection):
+    """ Plays a Recording back, as fast as the bot goes, with no game involved.
+        The bot must send the same keys the recorded one did. """
+    def __init__ (self, recording):
+        super (ReplayNetHackConnection, self).__init__()
+        if isinstance (recording, basestring):
+            recording = load (recording)
+        self.recording = recording
+        self.child = ReplayChild (recording)
+
+    def __setstate__ (self, state):
+        super (ReplayNetHackConnection, self).__setstate__(state)
+        self.child = ReplayChild (self.recording)
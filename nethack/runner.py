@@ -0,0 +1,218 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Runner plays lots of games at once: a worker process per core, each with
+# a few game slots, every slot a thread playing one game after another.
+
+import multiprocessing
+import threading
+import traceback
+import time
+import sys
+import Queue
+import pexpect
+
+from connection import LocalNetHackConnection
+
+FINISHED = 'finished'
+EOF = 'eof'
+CRASHED = 'crashed'
+
+class GameResult (object):
+    """ What happened in one game.  'outcome' is FINISHED if the bot's run
+        method returned, EOF if the game went away under it, or CRASHED if the
+        bot raised an exception, in which case 'error' has the traceback. """
+    def __init__ (self, worker, slot, username, outcome, seconds, turns=None, error=None):
+        self.worker = worker
+        self.slot = slot
+        self.username = username
+        self.outcome = outcome
+        self.seconds = seconds
+        self.turns = turns
+        self.error = error
+
+    def __str__ (self):
+        return '<GameResult %s %s after %.1fs, %s turns>' % (self.username, self.outcome,
+                                                             self.seconds, self.turns)
+
+class Runner (object):
+    """ I play 'games' games of 'playerClass' (or keep playing until stopped,
+        if 'games' is None) with 'botsPerCore' games at a time on each of
+        'cores' worker processes.  By default all of the cores are used.
+        'connectionFactory' is called with a username, unique to each slot,
+        and returns a connection; by default a LocalNetHackConnection.
+        Iterate over 'results' to start the games and get a GameResult for each
+        as soon as it finishes.  Workers that die are started again, and the
+        games they were playing are played again. """
+    pollInterval = 0.5
+
+    def __init__ (self, playerClass, games=None, cores=None, botsPerCore=4,
+                  connectionFactory=LocalNetHackConnection, usernamePrefix='bot'):
+        if cores is None:
+            cores = multiprocessing.cpu_count()
+        self.playerClass = playerClass
+        self.games = games
+        self.cores = cores
+        self.botsPerCore = botsPerCore
+        self.connectionFactory = connectionFactory
+        self.usernamePrefix = usernamePrefix
+        self.queue = multiprocessing.Queue()
+        self.stopping = multiprocessing.Event()
+        # Games left to start (-1 for no limit), and games each worker is playing
+        self.remaining = multiprocessing.Value('i', games is None and -1 or games)
+        self.playing = multiprocessing.Array('i', cores)
+        self.workers = [None] * cores
+        self.started = None
+        self.outcomes = {FINISHED: 0, EOF: 0, CRASHED: 0}
+        self.restarts = 0
+
+    def claim (self, worker):
+        """ Internal auxiliary method.  Take one of the games left, if there are any """
+        self.remaining.get_lock().acquire()
+        try:
+            if self.stopping.is_set() or self.remaining.value == 0:
+                return False
+            if self.remaining.value > 0:
+                self.remaining.value -= 1
+            self.playing[worker] += 1
+            return True
+        finally:
+            self.remaining.get_lock().release()
+
+    def release (self, worker):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        self.remaining.get_lock().acquire()
+        self.playing[worker] -= 1
+        self.remaining.get_lock().release()
+
+    def playSlot (self, worker, slot):
+        """ Internal auxiliary method.  Plays games one after the other in a slot """
+        username = '%s%dx%d' % (self.usernamePrefix, worker, slot)
+        while self.claim(worker):
+            start = time.time()
+            conn = None
+            player = None
+            outcome = FINISHED
+            error = None
+            turns = None
+            try:
+                conn = self.connectionFactory(username)
+                player = self.playerClass(conn)
+                player.play()
+                player.run()
+            except pexpect.EOF:
+                outcome = EOF
+            except Exception:
+                outcome = CRASHED
+                error = traceback.format_exc()
+            try:
+                if not player is None:
+                    turns = player.turn()
+            except Exception:
+                pass
+            if not conn is None and hasattr(conn.child, 'close'):
+                try:
+                    conn.child.close(force=True)
+                except Exception:
+                    pass
+            self.queue.put(GameResult(worker, slot, username, outcome, time.time() - start,
+                                      turns, error))
+            self.release(worker)
+
+    def work (self, worker):
+        """ Internal auxiliary method.  What each worker process does """
+        slots = [threading.Thread(target=self.playSlot, args=(worker, slot))
+                 for slot in range(self.botsPerCore)]
+        for slot in slots:
+            slot.start()
+        for slot in slots:
+            slot.join()
+
+    def startWorker (self, worker):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        process = multiprocessing.Process(target=self.work, args=(worker,))
+        process.daemon = True
+        process.start()
+        self.workers[worker] = process
+
+    def checkWorkers (self):
+        """ Internal auxiliary method.  Starts again the workers that died.
+            Returns True while any worker is alive. """
+        alive = False
+        for worker, process in enumerate(self.workers):
+            if process.is_alive():
+                alive = True
+            elif process.exitcode != 0 and not self.stopping.is_set():
+                # The games it was playing are lost, give them back
+                self.remaining.get_lock().acquire()
+                if self.remaining.value >= 0:
+                    self.remaining.value += self.playing[worker]
+                self.playing[worker] = 0
+                self.remaining.get_lock().release()
+                self.restarts += 1
+                self.startWorker(worker)
+                alive = True
+        return alive
+
+    def results (self):
+        """ Start the games, and yield a GameResult for each as soon as it's over """
+        self.started = time.time()
+        for worker in range(self.cores):
+            self.startWorker(worker)
+        while True:
+            try:
+                result = self.queue.get(timeout=self.pollInterval)
+            except Queue.Empty:
+                if not self.checkWorkers():
+                    break
+                continue
+            self.outcomes[result.outcome] += 1
+            yield result
+        for process in self.workers:
+            process.join()
+
+    def stop (self):
+        """ Don't start any more games.  The ones being played go on until they end. """
+        self.stopping.set()
+
+    def played (self):
+        """ Returns the number of games that have finished, however they did """
+        return sum(self.outcomes.values())
+
+    def gamesPerHour (self):
+        """ Returns how many games are being finished per hour, all workers together """
+        if self.started is None or self.played() == 0:
+            return 0.0
+        return self.played() * 3600.0 / (time.time() - self.started)
+
+    def report (self):
+        """ Returns a line summing up what's been played so far """
+        return '%d games (%d finished, %d EOF, %d crashed, %d worker restarts): %.0f games/hour' % (
+            self.played(), self.outcomes[FINISHED], self.outcomes[EOF],
+            self.outcomes[CRASHED], self.restarts, self.gamesPerHour())
+
+if __name__ == '__main__':
+    from examples import Explorer
+    games = len(sys.argv) > 1 and int(sys.argv[1]) or None
+    runner = Runner(Explorer, games=games)
+    try:
+        for result in runner.results():
+            print result
+            if result.error:
+                print result.error
+    except KeyboardInterrupt:
+        runner.stop()
+    print runner.report()
@@ -1,7 +1,85 @@
 import re
+from array import array
 
 WIDTH=80
 HEIGHT=24
+ROWS=HEIGHT + 1 # There's an extra row below the terminal, as in the original grid
+SIZE=WIDTH * ROWS
+
+BLANK_CHARS = ' ' * SIZE
+BLANK_FLAGS = '\0' * SIZE
+BLANK_FOREGROUND = '\x09' * SIZE
+
+def versions (version, count):
+    """ Returns 'count' copies of 'version', as the screen keeps them: 32 bit
+        unsigned, half the size of a long, which adds up in every pickle """
+    return array('I', [version]) * count
+
+# An escape sequence cut short by the end of a chunk of output
+incompleteEscape = re.compile(r'\x1b(\[[\d;?]*|[()])?$')
+
+_tokenizers = {}
+_anchored = {}
+
+def compileAnchored(pattern):
+    """ Compiles 'pattern' so that it matches at the end of a string.
+        Compiled patterns are cached. """
+    compiled = _anchored.get(pattern)
+    if compiled is None:
+        if pattern.endswith('$'):
+            compiled = re.compile(pattern)
+        else:
+            compiled = re.compile(pattern + '$')
+        _anchored[pattern] = compiled
+    return compiled
+
+def compileTokenizer(patterns):
+    """ Compile a list of escape sequence patterns in to a single regular
+        expression.  Group 1 matches a run of printable characters, and each
+        escape sequence is matched by a group of its own.
+        Returns the compiled expression and a dictionary that maps the group
+        of each escape sequence to its position in 'patterns'. """
+    key = tuple(patterns)
+    if not _tokenizers.has_key(key):
+        alternatives = []
+        groups = {}
+        group = 2
+        for position, pattern in enumerate(patterns):
+            alternatives.append('(%s)' % pattern)
+            groups[group] = position
+            group += 1 + re.compile(pattern).groups
+        tokenizer = re.compile(r'([ -~]+)|\x1b(?:%s)' % '|'.join(alternatives))
+        _tokenizers[key] = (tokenizer, groups)
+    return _tokenizers[key]
+
+class EscapeMatch(object):
+    """ The part of a tokenizer match that corresponds to a single escape
+        sequence.  Group numbers are relative to the sequence's own pattern,
+        so escape handlers can use it as they would use a match object. """
+    __slots__ = ('match', 'offset')
+    def __init__(self, match, offset):
+        self.match = match
+        self.offset = offset
+    def group(self, index=0):
+        return self.match.group(self.offset + index)
+
+def formatCell(char, bold, inverse, foreground):
+    """ Returns 'char' preceded by the escape sequences that set its attributes """
+    result = ''
+    someEscape = False
+    if bold:
+        result += '\x1b[1m'
+        someEscape = True
+    if inverse:
+        result += '\x1b[7m'
+        someEscape = True
+    if foreground < 9:
+        result += '\x1b[3%dm' % foreground
+        someEscape = True
+    result += char
+    if someEscape:
+        result += '\x1b[m'
+    return result
 
 class Cell(object):
     def __init__(self, char=' '):
@@ -10,38 +88,97 @@ class Cell(object):
         self.inverse = False
         self.foreground = 9
     def __str__ (self):
-        result = ''
-        someEscape = False
-        if self.bold:
-            result += '\x1b[1m'
-            someEscape = True
-        if self.inverse:
-            result += '\x1b[7m'
-            someEscape = True
-        if self.foreground < 9:
-            result += '\x1b[3%dm' % self.foreground
-            someEscape = True
-        result += self.char
-        if someEscape:
-            result += '\x1b[m'
-        return result
+        return formatCell(self.char, self.bold, self.inverse, self.foreground)
     def set(self, char, bold, inverse, foreground):
         self.char = char
         self.bold = bold
         self.inverse = inverse
         self.foreground = foreground
 
+class CellView(object):
+    """ I look like a Cell, but I read and write one position of a Screen's
+        planes instead of holding the attributes myself. """
+    __slots__ = ('screen', 'offset')
+    def __init__(self, screen, offset):
+        self.screen = screen
+        self.offset = offset
+    def __str__ (self):
+        return formatCell(self.char, self.bold, self.inverse, self.foreground)
+    def _getChar(self):
+        return chr(self.screen.charPlane[self.offset])
+    def _setChar(self, char):
+        self.screen.charPlane[self.offset] = char
+        self.screen.changed(self.offset)
+    char = property(_getChar, _setChar)
+    def _getBold(self):
+        return bool(self.screen.boldPlane[self.offset])
+    def _setBold(self, bold):
+        self.screen.boldPlane[self.offset] = bool(bold)
+        self.screen.changed(self.offset)
+    bold = property(_getBold, _setBold)
+    def _getInverse(self):
+        return bool(self.screen.inversePlane[self.offset])
+    def _setInverse(self, inverse):
+        self.screen.inversePlane[self.offset] = bool(inverse)
+        self.screen.changed(self.offset)
+    inverse = property(_getInverse, _setInverse)
+    def _getForeground(self):
+        return self.screen.foregroundPlane[self.offset]
+    def _setForeground(self, foreground):
+        self.screen.foregroundPlane[self.offset] = foreground
+        self.screen.changed(self.offset)
+    foreground = property(_getForeground, _setForeground)
+    def set(self, char, bold, inverse, foreground):
+        self.screen.version += 1
+        self.screen.setCell(self.offset, char, bold, inverse, foreground)
+
+class RowView(object):
+    """ A list-like view of a row of a Screen, made of CellViews.
+        Assigning a Cell to a position copies its attributes in to the Screen. """
+    __slots__ = ('screen', 'start')
+    def __init__(self, screen, row):
+        self.screen = screen
+        self.start = row * WIDTH
+    def __len__(self):
+        return WIDTH
+    def _offset(self, x):
+        if x < 0:
+            x += WIDTH
+        if x < 0 or x >= WIDTH:
+            raise IndexError, "column out of range"
+        return self.start + x
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return [CellView(self.screen, self.start + i) for i in range(*x.indices(WIDTH))]
+        return CellView(self.screen, self._offset(x))
+    def __setitem__(self, x, cell):
+        self.screen.version += 1
+        self.screen.setCell(self._offset(x), cell.char, cell.bold, cell.inverse,
+                            cell.foreground)
+    def __iter__(self):
+        for offset in range(self.start, self.start + WIDTH):
+            yield CellView(self.screen, offset)
+
 class Screen(object):
-    """ A Screen holds a bi-dimensional array of Cell that represents the state
-        of each character on a 80x24 terminal.
+    """ A Screen holds the state of each character on a 80x24 terminal.
+        Characters, bold and inverse flags and foreground colours are kept
+        in flat planes of WIDTH bytes per row.  cellAt() and the 'screen'
+        attribute provide Cell-like views of them.
         
         New output should be added via the printstr() method, passing in any
         output that has occurred, straight from the terminal.
         
         The state of the screen can be queried with the getArea(), getRow() and
-        matches() methods"""
+        matches() methods.
+
+        'version' goes up with each chunk of output, and each row and cell
+        remembers the version it was last written in, so changedSince() and
+        cellsChangedSince() can tell what was written after a given version."""
     def __init__(self):
-        self.screen = [[Cell() for cell in range(WIDTH)] for x in range(HEIGHT + 1)]
+        self.charPlane = bytearray(BLANK_CHARS)
+        self.boldPlane = bytearray(SIZE)
+        self.inversePlane = bytearray(SIZE)
+        self.foregroundPlane = bytearray(BLANK_FOREGROUND)
         self.cursorX = 0
         self.cursorY = 0
         self.savedCursorX = 0
@@ -52,16 +189,55 @@ class Screen(object):
         self.charAttBold = False
         self.charAttInverse = False
         self.charAttForeground = 9
-        self.escape_sequences = self.escapeSequenceDict()
+        self.pendingOutput = ''
+        self.version = 0
+        self.rowVersions = versions(0, ROWS)
+        self.cellVersions = versions(0, SIZE)
+        self.stamp = versions(0, WIDTH)
+        self.setupParser()
 
     def __getstate__(self):
         state = dict(self.__dict__)
         del state['escape_sequences']
+        del state['tokenizer']
+        del state['escapeHandlers']
+        del state['stamp'] # A cache, that's made again
+        state.pop('_last_match', None)
         return state
 
     def __setstate__(self, state):
+        cells = state.pop('screen', None)
         self.__dict__ = state
+        self.__dict__.setdefault('pendingOutput', '')
+        if not state.has_key('version'):
+            self.version = 0
+            self.rowVersions = versions(0, ROWS)
+            self.cellVersions = versions(0, SIZE)
+        elif self.cellVersions.typecode != 'I':
+            # Pickled when versions were longs
+            self.rowVersions = array('I', self.rowVersions)
+            self.cellVersions = array('I', self.cellVersions)
+        self.stamp = versions(0, WIDTH)
+        if cells is not None:
+            # Pickled before the screen was kept in planes: copy the Cell grid
+            self.charPlane = bytearray(BLANK_CHARS)
+            self.boldPlane = bytearray(SIZE)
+            self.inversePlane = bytearray(SIZE)
+            self.foregroundPlane = bytearray(BLANK_FOREGROUND)
+            for y, row in enumerate(cells[:ROWS]):
+                for x, cell in enumerate(row):
+                    self.setCell(y * WIDTH + x, cell.char, cell.bold, cell.inverse,
+                                 cell.foreground)
+        self.setupParser()
+
+    def setupParser(self):
+        """ Build the tokenizer that printstr uses out of escapeSequenceDict() """
         self.escape_sequences = self.escapeSequenceDict()
+        patterns = sorted(self.escape_sequences.keys())
+        self.tokenizer, groups = compileTokenizer(patterns)
+        self.escapeHandlers = [None] * (self.tokenizer.groups + 1)
+        for group, position in groups.items():
+            self.escapeHandlers[group] = self.escape_sequences[patterns[position]]
 
     def escapeSequenceDict(self):
         """ Generate XTerm's escape secuences.
@@ -89,6 +265,65 @@ class Screen(object):
                 r"8": self.restoreCursor # Restore cursor position and attributes
                }
 
+    def _getScreen(self):
+        return [RowView(self, row) for row in range(ROWS)]
+    screen = property(_getScreen, doc=""" The screen as a list of rows of Cells """)
+
+    def cellAt (self, x, y):
+        """ Returns a view of the Cell at position (x, y) """
+        if x < 0 or x >= WIDTH or y < 0 or y >= ROWS:
+            raise IndexError, "Cell position out of range (%d,%d)" % (x, y)
+        return CellView(self, y * WIDTH + x)
+
+    def setCell (self, offset, char, bold, inverse, foreground):
+        """ Internal auxiliary method.  You shouldn't need to invoke this """
+        self.charPlane[offset] = char
+        self.boldPlane[offset] = bool(bold)
+        self.inversePlane[offset] = bool(inverse)
+        self.foregroundPlane[offset] = foreground
+        self.cellVersions[offset] = self.version
+        self.rowVersions[offset // WIDTH] = self.version
+
+    def touch (self, start, end):
+        """ Internal auxiliary method.  Marks the cells between offsets 'start'
+            and 'end' as written in the current version """
+        version = self.version
+        first = start // WIDTH
+        last = (end - 1) // WIDTH
+        if first == last:
+            # Most writes are within a row: copy from a row of stamps, made once per version
+            stamp = self.stamp
+            if stamp[0] != version:
+                stamp = self.stamp = versions(version, WIDTH)
+            self.cellVersions[start:end] = stamp[:end - start]
+            self.rowVersions[first] = version
+        else:
+            self.cellVersions[start:end] = versions(version, end - start)
+            for row in range(first, last + 1):
+                self.rowVersions[row] = version
+
+    def changed (self, start, end=None):
+        """ Starts a new version where the cells between offsets 'start' and
+            'end' were written.  For changes made to the planes by hand. """
+        if end is None:
+            end = start + 1
+        self.version += 1
+        self.touch(start, end)
+
+    def changedSince (self, version):
+        """ Returns the rows that have been written to after 'version' """
+        rowVersions = self.rowVersions
+        return [row for row in range(ROWS) if rowVersions[row] > version]
+
+    def cellsChangedSince (self, version):
+        """ Returns the (x, y) of the cells that have been written to after 'version' """
+        cellVersions = self.cellVersions
+        result = []
+        for row in self.changedSince(version):
+            start = row * WIDTH
+            result.extend([(x, row) for x in range(WIDTH) if cellVersions[start + x] > version])
+        return result
+
     def dump(self):
         """ Debugging method.
             Prints the whole screen (with formatting attributes and all).
@@ -98,40 +333,76 @@ class Screen(object):
 
     def printstr (self, cmd):
         """ Updates the state of the screen with a new chunk of output. """
+        if self.pendingOutput:
+            cmd = self.pendingOutput + cmd
+            self.pendingOutput = ''
+        if cmd:
+            self.version += 1
         index = 0
-        while index < len(cmd):
-            if cmd[index] == '\x1b':
-                index += 1
-                found = False
-                for seq in self.escape_sequences.keys():
-                    match = re.match(seq, cmd[index:])
-                    if not match is None:
-                        self.escape_sequences[seq](match)
-                        index += len(match.group(0))
-                        found = True
-                        break
-                if not found:
-                    print
-                    print "Unhandled escape sequence."
-                    raise ValueError, list(cmd[index-1:index+30])
-            else:
-                #print [cmd[index]], "=> printch",
-                try:
+        length = len(cmd)
+        tokenizer = self.tokenizer
+        handlers = self.escapeHandlers
+        try:
+            while index < length:
+                match = tokenizer.match(cmd, index)
+                if match is None:
+                    if cmd[index] == '\x1b':
+                        if incompleteEscape.match(cmd, index):
+                            # The rest of this sequence will come with the next chunk
+                            self.pendingOutput = cmd[index:]
+                            return
+                        print
+                        print "Unhandled escape sequence."
+                        raise ValueError, list(cmd[index:index+31])
                     self.printch(cmd[index])
-                except IndexError:
-                    print 'Attempted to print outside the screen!'
-                    print 'Cursor X:', self.cursorX
-                    print 'Cursor Y:', self.cursorY
-                    print 'Current screen:'
-                    for row in self.getArea():
-                        print row
-                    print 'Input string:'
-                    print [cmd]
-                    print 'Context:'
-                    print [cmd[index-10:index]], "We're here!", [cmd[index:index+10]]
-                    import pdb; pdb.set_trace()
-                    raise
-                index += 1
+                    index += 1
+                else:
+                    group = match.lastindex
+                    if group == 1:
+                        self.printText(cmd, index, match.end())
+                    else:
+                        handlers[group](EscapeMatch(match, group))
+                    index = match.end()
+        except IndexError:
+            print 'Attempted to print outside the screen!'
+            print 'Cursor X:', self.cursorX
+            print 'Cursor Y:', self.cursorY
+            print 'Current screen:'
+            for row in self.getArea():
+                print row
+            print 'Input string:'
+            print [cmd]
+            print 'Context:'
+            print [cmd[index-10:index]], "We're here!", [cmd[index:index+10]]
+            raise
+
+    def printText (self, text, start=0, end=None):
+        """ Internal auxiliary method.  You shouldn't need to invoke this.
+            Prints text[start:end], that should only hold printable characters,
+            a row at a time. """
+        if end is None:
+            end = len(text)
+        while start < end:
+            if self.cursorX >= WIDTH or self.cursorX < 0 or self.cursorY >= HEIGHT or self.cursorY < 0:
+                raise IndexError
+            count = min(end - start, WIDTH - self.cursorX)
+            offset = self.cursorY * WIDTH + self.cursorX
+            self.charPlane[offset:offset + count] = text[start:start + count]
+            self.boldPlane[offset:offset + count] = chr(self.charAttBold) * count
+            self.inversePlane[offset:offset + count] = chr(self.charAttInverse) * count
+            self.foregroundPlane[offset:offset + count] = chr(self.charAttForeground) * count
+            # As touch does, inline as this is the busiest writer
+            stamp = self.stamp
+            if stamp[0] != self.version:
+                stamp = self.stamp = versions(self.version, WIDTH)
+            self.cellVersions[offset:offset + count] = stamp[:count]
+            self.rowVersions[self.cursorY] = self.version
+            start += count
+            self.cursorX += count
+            if self.cursorX >= WIDTH:
+                if self.cursorY < HEIGHT - 1:
+                    self.cursorY += 1
+                self.cursorX = 0
 
     def printch (self, ch):
         """ Internal auxiliary method.  You shouldn't need to invoke this """
@@ -146,10 +417,9 @@ class Screen(object):
         elif ch == '\x0f': # Shift in - Invoke G0 charset
             self.charSet = self.G0
         elif ch >= ' ' and ch <= '~':
-            self.screen[self.cursorY][self.cursorX].set(ch,
-                                                        self.charAttBold,
-                                                        self.charAttInverse,
-                                                        self.charAttForeground)
+            self.setCell(self.cursorY * WIDTH + self.cursorX, ch,
+                         self.charAttBold, self.charAttInverse,
+                         self.charAttForeground)
             self.cursorX += 1
             if self.cursorX >= 80:
                 if self.cursorY < HEIGHT - 1:
@@ -167,7 +437,7 @@ class Screen(object):
     def clearScreen (self, cmd):
         """ Internal auxiliary method.  You shouldn't need to invoke this """
         ## Shouldn't this send the cursor to (0,0) also??
-        self.screen = [[Cell() for cell in range(WIDTH)] for x in range(HEIGHT + 1)]
+        self.erase(0, SIZE)
 
     def leftN (self, cmd):
         """ Internal auxiliary method.  You shouldn't need to invoke this.
@@ -223,8 +493,17 @@ class Screen(object):
 
     def eraseToEndOfLine (self, cmd):
         """ Internal auxiliary method.  You shouldn't need to invoke this """
-        for i in range(self.cursorX, WIDTH):
-            self.screen[self.cursorY][i] = Cell()
+        self.erase(self.cursorY * WIDTH + self.cursorX, (self.cursorY + 1) * WIDTH)
+
+    def erase (self, start, end):
+        """ Internal auxiliary method.  Blanks the planes between offsets 'start' and 'end' """
+        count = end - start
+        self.charPlane[start:end] = BLANK_CHARS[:count]
+        self.boldPlane[start:end] = BLANK_FLAGS[:count]
+        self.inversePlane[start:end] = BLANK_FLAGS[:count]
+        self.foregroundPlane[start:end] = BLANK_FOREGROUND[:count]
+        if count > 0:
+            self.touch(start, end)
 
     def insertLines (self, cmd):
         """ Internal auxiliary method.  You shouldn't need to invoke this
@@ -232,7 +511,13 @@ class Screen(object):
         """
         val = self.parseInt (cmd, 1)
         print "InsertLines", val
-        self.screen = self.screen[:self.cursorY] + [[Cell() for cell in range(WIDTH)] for x in range(val)] + self.screen [self.cursorY:HEIGHT-val]
+        start = self.cursorY * WIDTH
+        end = HEIGHT * WIDTH
+        shift = val * WIDTH
+        for plane in [self.charPlane, self.boldPlane, self.inversePlane, self.foregroundPlane]:
+            plane[start + shift:end] = plane[start:end - shift]
+        self.touch(start, end)
+        self.erase(start, start + shift)
 
     def setCharacterAtts (self, cmd):
         """ Internal auxiliary method.  You shouldn't need to invoke this """
@@ -261,12 +546,20 @@ class Screen(object):
 
     def getArea (self, x=0, y=0, w=WIDTH, h=HEIGHT):
         """ Retrieve a rectangular area of the screen """
-        return [''.join ([cell.char for cell in row[x:x+w]]) for row in self.screen[y:y+h]]
+        start, finish, step = slice(x, x + w).indices(WIDTH)
+        finish = max(start, finish)
+        plane = self.charPlane
+        return [str(plane[row * WIDTH + start:row * WIDTH + finish])
+                for row in range(*slice(y, y + h).indices(ROWS))]
 
     def getRow (self, row, start=0, finish=WIDTH):
         """ Retrieve a row off the screen, or a substring of a row """
-        result = ''.join ([cell.char for cell in self.screen[row][start:finish]])
-        return result
+        if row < 0:
+            row += ROWS
+        if row < 0 or row >= ROWS:
+            raise IndexError, "row out of range"
+        start, finish, step = slice(start, finish).indices(WIDTH)
+        return str(self.charPlane[row * WIDTH + start:row * WIDTH + max(start, finish)])
 
     def getCharAtRelativePos (self, offsetX=0, offsetY=0):
         """ Internal auxiliary method.  You shouldn't need to invoke this """
@@ -274,33 +567,37 @@ class Screen(object):
         posY = self.cursorY + offsetY
         if posX < 0 or posX >= WIDTH or posY < 0 or posY >= HEIGHT:
             return None
-        return self.screen[posY][posX].char
+        return chr(self.charPlane[posY * WIDTH + posX])
+
+    def textBeforeCursor (self):
+        """ Returns the part of the cursor's row that comes before the cursor """
+        return self.getRow (self.cursorY, finish=self.cursorX)
 
-    def matches (self, pattern):
+    def matches (self, pattern, text=None):
         """ Returns True if the string appearing right before the cursor matches
             'pattern'.
             Pattern can be any Python regular expression.
+            'text' can be passed in if you already have textBeforeCursor() at hand.
         """
-        self._last_match = None
-        toMatch = self.getRow (self.cursorY, finish=self.cursorX)
-        if not pattern.endswith('$'):
-            pattern = pattern + '$'
-        match = re.search (pattern, toMatch)
-        if not match is None:
-            self._last_match = match
-        return not self._last_match is None
+        if text is None:
+            text = self.textBeforeCursor()
+        match = compileAnchored(pattern).search (text)
+        self._last_match = match
+        return not match is None
 
     def lastMatch (self):
         """ Returns last match found by 'matches'.  Returns the exact string
             that matched, not the pattern """
         return getattr(self, '_last_match', None)
 
-    def multiMatch (self, patterns):
+    def multiMatch (self, patterns, text=None):
         """ Returns the string that appears before the cursor that matches some
             pattern in 'patterns', or None if none match.
         """
+        if text is None:
+            text = self.textBeforeCursor()
         for pattern in patterns:
-            if self.matches (pattern):
+            if self.matches (pattern, text):
                 return self._last_match
         return None
 
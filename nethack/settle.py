@@ -0,0 +1,98 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# SettleDetector tells NetHackConnection.watch how long to keep waiting for
+# output, so that it doesn't have to sit through a full timeout after every
+# key it sends.
+
+import re
+import time
+from scraper import HEIGHT
+
+MAP_TOP = 1
+MAP_BOTTOM = 21
+
+menuMarker = re.compile(r'\(end\) $|\(\d+ of \d+\)$|--More--$')
+
+class SettleDetector(object):
+    """ I decide when the game is done drawing and is waiting for a key.
+
+        Once the game has answered the last key sent, and the screen is in a
+        state where nethack waits for input (the cursor parked on the hero
+        with the status lines drawn, a question on the top line, or a menu)
+        watch only waits 'grace' seconds for more output.
+        Otherwise it waits up to the fallback timeout.  The fallback starts at
+        'fallback' seconds and, if 'adaptive' is set, shrinks to a multiple
+        of the time the game usually takes to start answering, but never
+        below 'minimumFallback'; only once the game has started answering,
+        though, so a slow answer isn't given up on. """
+    latencyFactor = 4
+    latencyWeight = 0.2
+
+    def __init__(self, grace=0.01, fallback=0.3, minimumFallback=0.05, adaptive=True):
+        self.grace = grace
+        self.fallback = fallback
+        self.minimumFallback = minimumFallback
+        self.adaptive = adaptive
+        self.latency = None
+        self.sentAt = None
+        self.answered = False
+
+    def sent(self):
+        """ Called when a key is sent down the wire """
+        self.sentAt = time.time()
+        self.answered = False
+
+    def received(self):
+        """ Called when output comes in """
+        if not self.answered:
+            self.answered = True
+            if self.sentAt is not None:
+                sample = time.time() - self.sentAt
+                if self.latency is None:
+                    self.latency = sample
+                else:
+                    self.latency += self.latencyWeight * (sample - self.latency)
+
+    def fallbackTimeout(self):
+        """ Seconds to wait for output when we can't tell the game is idle.
+            Until the game has started answering the last key, it may just be
+            slow this time, so the full fallback is waited. """
+        if not self.adaptive or self.latency is None or not self.answered:
+            return self.fallback
+        return min(self.fallback, max(self.minimumFallback,
+                                      self.latencyFactor * self.latency))
+
+    def timeout(self, screen, expecting=None):
+        """ Seconds watch should wait for more output, given the current screen """
+        if self.answered and self.idle(screen, expecting):
+            return self.grace
+        return self.fallbackTimeout()
+
+    def idle(self, screen, expecting=None):
+        """ True if 'screen' shows the game waiting for a key """
+        x = screen.cursorX
+        y = screen.cursorY
+        if not expecting is None and not screen.multiMatch(expecting) is None:
+            return True
+        if y == 0:
+            # A question on the top line
+            return x > 0
+        if MAP_TOP <= y <= MAP_BOTTOM and screen.getCharAtRelativePos() == '@':
+            # Parked on the hero, once the status lines are there
+            return (screen.getRow(HEIGHT - 2).strip() != '' and
+                    screen.getRow(HEIGHT - 1).strip() != '')
+        return not menuMarker.search(screen.getRow(y, finish=x)) is None
@@ -0,0 +1,138 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Status holds what the two status lines at the bottom of the screen say,
+# parsed once each time they change.
+
+import re
+from scraper import WIDTH
+
+STATUS_TOP = 22
+
+attributes = re.compile(r'St:(?P<St>\S+) Dx:(?P<Dx>\d+) Co:(?P<Co>\d+) '
+                        r'In:(?P<In>\d+) Wi:(?P<Wi>\d+) Ch:(?P<Ch>\d+)')
+alignments = re.compile(r'\b(Lawful|Chaotic|Neutral)\b')
+fields = [('dungeonLevel', re.compile(r'Dlvl:(\d+)')),
+          ('gold', re.compile(r'\$:(\d+)')),
+          ('hitPoints', re.compile(r'HP:(-?\d+)\((\d+)\)')),
+          ('power', re.compile(r'Pw:(\d+)\((\d+)\)')),
+          ('armourClass', re.compile(r'AC:(-?\d+)')),
+          ('experienceLevel', re.compile(r'(?:Exp|Xp):(\d+)(?:/(\d+))?')),
+          ('turn', re.compile(r'T:(\d+)'))]
+hungerStates = ["Satiated", "Hungry", "Weak", "Fainting", "Fainted"]
+encumbranceStates = ["Burdened", "Stressed", "Strained", "Overtaxed", "Overloaded"]
+conditionNames = ["Conf", "Stun", "FoodPois", "Ill", "Blind", "Hallu", "Slime"]
+
+def parseStrength (value):
+    """ Internal auxiliary method.  18/25 -> 18.25, and 18/** -> 19 """
+    if value == '18/**':
+        return 19.0
+    return float(value.replace('/', '.'))
+
+class Status (object):
+    """ I'm what the status lines say at some point.  Anything they don't
+        show is None, except 'turn', that is -1 when the turn counter is off. """
+    __slots__ = ['strength', 'dexterity', 'constitution', 'intelligence', 'wisdom',
+                 'charisma', 'alignment', 'dungeonLevel', 'gold', 'hitPoints',
+                 'maxHitPoints', 'power', 'maxPower', 'armourClass', 'experienceLevel',
+                 'experience', 'turn', 'hunger', 'encumbrance', 'conditions']
+
+    def __init__ (self, top, bottom):
+        """ 'top' and 'bottom' are the two status lines """
+        for slot in self.__slots__:
+            setattr(self, slot, None)
+        match = attributes.search(top)
+        if not match is None:
+            self.strength = parseStrength(match.group('St'))
+            self.dexterity = int(match.group('Dx'))
+            self.constitution = int(match.group('Co'))
+            self.intelligence = int(match.group('In'))
+            self.wisdom = int(match.group('Wi'))
+            self.charisma = int(match.group('Ch'))
+            match = alignments.search(top, match.end())
+        else:
+            match = alignments.search(top)
+        if not match is None:
+            self.alignment = match.group(1)
+        end = 0
+        for name, pattern in fields:
+            match = pattern.search(bottom)
+            if match is None:
+                continue
+            end = max(end, match.end())
+            setattr(self, name, int(match.group(1)))
+            if name == 'hitPoints':
+                self.maxHitPoints = int(match.group(2))
+            elif name == 'power':
+                self.maxPower = int(match.group(2))
+            elif name == 'experienceLevel' and not match.group(2) is None:
+                self.experience = int(match.group(2))
+        if self.turn is None:
+            self.turn = -1
+        # Whatever follows the numbers is hunger, encumbrance and conditions
+        words = bottom[end:].split()
+        self.hunger = "Not Hungry"
+        for state in hungerStates:
+            if state in words:
+                self.hunger = state
+        self.encumbrance = "Unencumbered"
+        for state in encumbranceStates:
+            if state in words:
+                self.encumbrance = state
+        self.conditions = tuple([name for name in conditionNames if name in words])
+
+    def __getstate__ (self):
+        return dict((slot, getattr(self, slot)) for slot in self.__slots__)
+
+    def __setstate__ (self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def __repr__ (self):
+        return '<Status HP:%s(%s) T:%s>' % (self.hitPoints, self.maxHitPoints, self.turn)
+
+class StatusReader (object):
+    """ I hand out a Status for a screen, and only parse the status lines again
+        when they have changed since the last time I was asked.  While the
+        screen's versions say they haven't been written to, they aren't even read. """
+    screen = None
+    version = -1
+
+    def __init__ (self):
+        self.lines = None
+        self.status = None
+        self.parses = 0
+
+    def read (self, screen):
+        """ Returns the Status that 'screen' shows """
+        if (screen is self.screen and screen.rowVersions[STATUS_TOP] <= self.version and
+            screen.rowVersions[STATUS_TOP + 1] <= self.version):
+            return self.status
+        self.screen = screen
+        self.version = screen.version
+        start = STATUS_TOP * WIDTH
+        lines = str(screen.charPlane[start:start + 2 * WIDTH])
+        if lines != self.lines:
+            self.status = Status(lines[:WIDTH], lines[WIDTH:])
+            self.lines = lines
+            self.parses += 1
+        return self.status
+
+    def __getstate__ (self):
+        state = dict(self.__dict__)
+        state.pop('screen', None)
+        state.pop('version', None)
+        return state
@@ -0,0 +1,251 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# TelnetChild talks telnet to a game server straight from a socket, instead
+# of running the telnet program in a pseudo terminal for every game.
+
+import os
+import re
+import tty
+import socket
+import select
+import struct
+import errno
+import time
+import pexpect
+from telnetlib import IAC, DO, DONT, WILL, WONT, SB, SE, ECHO, SGA, TTYPE, NAWS
+
+from channel import BufferedChannel
+
+IS = chr(0)
+SEND = chr(1)
+TELNET_PORT = 23
+BARE_CR = re.compile('\r(?!\n)') # The NVT wants a NUL after a carriage return on its own
+
+def address (host):
+    """ Returns the (host, port) in 'host', that can be 'host', 'host:port' or 'host port' """
+    for sep in [':', ' ']:
+        if sep in host.strip():
+            name, port = host.strip().split(sep, 1)
+            return name, int(port)
+    return host.strip(), TELNET_PORT
+
+class TelnetChild (BufferedChannel):
+    """ I'm a telnet connection to 'host', that looks like a pexpect child.
+        I tell the server that the terminal is a 'width' x 'height'
+        'terminal', and let it echo what we send. """
+    readSize = 16384
+    STDIN_FILENO = 0
+    STDOUT_FILENO = 1
+
+    def __init__ (self, host, port=TELNET_PORT, width=80, height=24, terminal='xterm', timeout=30):
+        super (TelnetChild, self).__init__()
+        self.width = width
+        self.height = height
+        self.terminal = terminal
+        self.timeout = timeout
+        self.logfile_read = None
+        self.logfile_send = None
+        self.partial = ''   # An incomplete telnet command at the end of the last read
+        self.answered = {}  # The last answer given for each option
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(0)
+
+    def fileno (self):
+        return self.sock.fileno()
+
+    def negotiate (self, command, option):
+        """ Internal auxiliary method.  Answers the server's DO, DONT, WILL and WONT """
+        if command == DO:
+            if option in (NAWS, TTYPE):
+                if self.reply(WILL, option) and option == NAWS:
+                    self.sendWindowSize()
+            else:
+                self.reply(WONT, option)
+        elif command == WILL:
+            if option in (ECHO, SGA):
+                self.reply(DO, option)
+            else:
+                self.reply(DONT, option)
+        elif command == DONT:
+            self.reply(WONT, option)
+        elif command == WONT:
+            self.reply(DONT, option)
+
+    def reply (self, command, option):
+        """ Internal auxiliary method.  Answers about 'option', unless we already
+            answered the same, so that we don't go round in circles.  Returns
+            True if the answer was sent. """
+        if self.answered.get(option) == command:
+            return False
+        self.answered[option] = command
+        self.write(IAC + command + option)
+        return True
+
+    def subnegotiate (self, data):
+        """ Internal auxiliary method.  Answers the server's subnegotiations """
+        if data == TTYPE + SEND:
+            self.write(IAC + SB + TTYPE + IS + self.terminal + IAC + SE)
+
+    def sendWindowSize (self):
+        """ Tell the server how big the terminal is (NAWS) """
+        size = struct.pack('>HH', self.width, self.height).replace(IAC, IAC + IAC)
+        self.write(IAC + SB + NAWS + size + IAC + SE)
+
+    def process (self, data):
+        """ Internal auxiliary method.  Handles the telnet commands in 'data',
+            and returns the rest, which is the game's output """
+        if self.partial:
+            data, self.partial = self.partial + data, ''
+        if not IAC in data:
+            return data
+        output = []
+        start = 0
+        while True:
+            i = data.find(IAC, start)
+            if i == -1:
+                output.append(data[start:])
+                break
+            output.append(data[start:i])
+            if i + 1 >= len(data):
+                self.partial = data[i:]
+                break
+            command = data[i + 1]
+            if command == IAC:
+                output.append(IAC)
+                start = i + 2
+            elif command in (DO, DONT, WILL, WONT):
+                if i + 2 >= len(data):
+                    self.partial = data[i:]
+                    break
+                self.negotiate(command, data[i + 2])
+                start = i + 3
+            elif command == SB:
+                end = data.find(IAC + SE, i + 2)
+                if end == -1:
+                    self.partial = data[i:]
+                    break
+                self.subnegotiate(data[i + 2:end].replace(IAC + IAC, IAC))
+                start = end + 2
+            else:
+                # NOP, GA and friends mean nothing to us
+                start = i + 2
+        return ''.join(output)
+
+    def read (self, timeout):
+        """ Internal auxiliary method.  Waits up to 'timeout' seconds for output,
+            and reads all there is """
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return
+        while True:
+            try:
+                data = self.sock.recv(self.readSize)
+            except socket.error, e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                data = ''
+            if not data:
+                self.flag_eof = True
+                return
+            data = self.process(data)
+            if not self.logfile_read is None:
+                self.logfile_read.write(data)
+            self.buffer += data
+
+    def write (self, data):
+        """ Internal auxiliary method.  Sends 'data' as is """
+        while data:
+            try:
+                data = data[self.sock.send(data):]
+            except socket.error, e:
+                if not e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                select.select([], [self.sock], [])
+
+    def expect (self, patterns, timeout=-1):
+        """ Like pexpect's expect """
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        if timeout == -1:
+            timeout = self.timeout
+        deadline = None
+        if not timeout is None:
+            deadline = time.time() + timeout
+        while True:
+            index = self.search(patterns)
+            if not index is None:
+                return index
+            if self.flag_eof:
+                return self.special(pexpect.EOF, patterns)
+            remaining = None
+            if not deadline is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return self.special(pexpect.TIMEOUT, patterns)
+            self.read(remaining)
+
+    def send (self, msg):
+        if not self.logfile_send is None:
+            self.logfile_send.write(msg)
+        self.write(BARE_CR.sub('\r\0', msg.replace(IAC, IAC + IAC)))
+        return len(msg)
+
+    def sendline (self, msg=''):
+        """ Sends 'msg' and a telnet end of line """
+        return self.send(msg + '\r\n')
+
+    def isalive (self):
+        return not self.flag_eof
+
+    def close (self, force=True):
+        self.sock.close()
+        self.flag_eof = True
+
+    def interact (self, escape_character=chr(29)):
+        """ Like pexpect's interact: the user's keys go to the server, and the
+            game's output goes to the terminal, until 'escape_character' is
+            typed or the server hangs up """
+        self.writeOut(self.buffer)
+        self.buffer = ''
+        mode = None
+        if os.isatty(self.STDIN_FILENO):
+            mode = tty.tcgetattr(self.STDIN_FILENO)
+            tty.setraw(self.STDIN_FILENO)
+        try:
+            while not self.flag_eof:
+                ready = select.select([self.sock, self.STDIN_FILENO], [], [])[0]
+                if self.sock in ready:
+                    self.read(0)
+                    self.writeOut(self.buffer)
+                    self.buffer = ''
+                if self.STDIN_FILENO in ready:
+                    data = os.read(self.STDIN_FILENO, 1000)
+                    i = -1
+                    if not escape_character is None:
+                        i = data.find(escape_character)
+                    if i != -1:
+                        self.send(data[:i])
+                        break
+                    self.send(data)
+        finally:
+            if not mode is None:
+                tty.tcsetattr(self.STDIN_FILENO, tty.TCSAFLUSH, mode)
+
+    def writeOut (self, data):
+        """ Internal auxiliary method.  Writes 'data' to the terminal """
+        while data:
+            data = data[os.write(self.STDOUT_FILENO, data):]
@@ -0,0 +1,476 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Archive games in ttyrec format, the one nethack servers and players use:
+# each chunk of output is a frame, made of a header with the time it was
+# read (seconds and microseconds) and its length, all little endian 32 bit
+# integers, followed by the output itself.  Set a connection's 'ttyrec' to
+# a TtyrecWriter to record everything watch reads:
+#
+#   conn.ttyrec = TtyrecWriter('game.ttyrec.gz', compression=GZIP)
+#   ...
+#   conn.ttyrec.close()
+#
+# Frames that are still pending when the program exits are written out then,
+# but closing the writer is the only way to know they made it to the file.
+#
+# TtyrecReader plays them back, as fast as they can be read, into a Screen,
+# and hands out what it shows after every frame:
+#
+#   for frame in TtyrecReader('game.ttyrec').replay():
+#       print frame.status.turn, frame.chars[frame.y, frame.x]
+#
+# Or jump to any frame, or turn, straight away, with a KeyframeIndex that's
+# built the first time and kept next to the recording:
+#
+#   print TtyrecReader('game.ttyrec').seekTurn(40000).status
+
+import struct
+import threading
+import time
+import gzip
+import zlib
+import mmap
+import os
+import pickle
+import bisect
+import atexit
+import weakref
+from array import array
+from collections import deque
+
+from scraper import Screen
+from status import StatusReader
+from mapanalysis import plane, MAP_TOP
+
+HEADER = struct.Struct('<III')
+LENGTH = struct.Struct('<I') # Just the length, at offset 8 of the header
+INDEX_SUFFIX = '.idx'
+
+GZIP = 'gzip'
+ZLIB = 'zlib'
+
+# The writers that haven't been closed, to write out what they have pending
+# when the program exits: their threads are daemons, and won't see it through
+openWriters = weakref.WeakSet()
+
+def closeWriters ():
+    """ Internal auxiliary function.  Closes the writers left open at exit """
+    for writer in list(openWriters):
+        try:
+            writer.close()
+        except (IOError, OSError):
+            pass # Nobody's left to tell
+
+atexit.register(closeWriters)
+
+class ZlibFile (object):
+    """ A file that compresses what's written to it as a single zlib stream """
+    def __init__ (self, f, level=6):
+        self.f = f
+        self.compressor = zlib.compressobj(level)
+    def write (self, data):
+        self.f.write(self.compressor.compress(data))
+    def flush (self):
+        self.f.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.f.flush()
+    def close (self):
+        self.f.write(self.compressor.flush())
+        self.f.close()
+
+def openOutput (filename, compression=None):
+    """ Opens 'filename' to append a ttyrec to, compressed with 'compression'
+        (None, GZIP or ZLIB) """
+    if compression is None:
+        return open(filename, 'ab')
+    if compression == GZIP:
+        return gzip.open(filename, 'ab')
+    if compression == ZLIB:
+        return ZlibFile(open(filename, 'ab'))
+    raise ValueError, "Unknown compression: %s" % compression
+
+class TtyrecWriter (object):
+    """ I write frames of output to a ttyrec file.  Frames are only queued
+        by 'write'; a background thread writes them out, and compresses them,
+        every 'interval' seconds or as soon as there's 'bufferSize' bytes
+        waiting, so that recording costs the bot next to nothing.
+        'output' is a filename or a file-like object that's already open.
+        The thread only keeps a weak reference to me, so a writer that's
+        dropped without being closed is closed when it's collected. """
+    def __init__ (self, output, compression=None, bufferSize=65536, interval=1.0):
+        if isinstance(output, basestring):
+            output = openOutput(output, compression)
+        self.output = output
+        self.bufferSize = bufferSize
+        self.interval = interval
+        # Appending to a deque needs no lock, which keeps write cheap
+        self.pending = deque()
+        self.pendingSize = 0
+        self.frames = 0
+        self.error = None
+        self.closed = False
+        self.full = threading.Event()
+        self.writing = threading.Lock()
+        self.thread = threading.Thread(target=flushing, name='ttyrec writer',
+                                       args=(weakref.ref(self), self.full, interval))
+        self.thread.daemon = True
+        self.thread.start()
+        openWriters.add(self)
+
+    def write (self, data, stamp=None):
+        """ Add a frame with 'data', read at 'stamp' (now, by default) """
+        if not data:
+            return
+        if not self.error is None:
+            raise IOError, "Couldn't write the ttyrec: %s" % self.error
+        if self.closed:
+            raise ValueError, "The ttyrec is closed"
+        if stamp is None:
+            stamp = time.time()
+        seconds = int(stamp)
+        self.pending.append(HEADER.pack(seconds, int((stamp - seconds) * 1000000), len(data)) + data)
+        self.frames += 1
+        # Only this thread adds to it, so at worst it's a little off
+        self.pendingSize += HEADER.size + len(data)
+        if self.pendingSize >= self.bufferSize:
+            self.pendingSize = 0
+            self.full.set()
+
+    def drain (self):
+        """ Internal auxiliary method.  Writes out what's pending.  Must be
+            called with the writing lock held. """
+        chunks = []
+        try:
+            while True:
+                chunks.append(self.pending.popleft())
+        except IndexError:
+            pass
+        if chunks:
+            self.output.write(''.join(chunks))
+        self.output.flush()
+
+    def flush (self):
+        """ Write out everything that's pending now, rather than wait for the
+            background thread """
+        self.writing.acquire()
+        try:
+            self.drain()
+        finally:
+            self.writing.release()
+
+    def close (self):
+        """ Write out what's pending and close the file """
+        if self.closed:
+            return
+        self.closed = True
+        openWriters.discard(self)
+        self.full.set()
+        if not self.thread is threading.current_thread():
+            self.thread.join()
+        try:
+            if self.error is None:
+                self.drain()
+        finally:
+            self.output.close()
+        if not self.error is None:
+            raise IOError, "Couldn't write the ttyrec: %s" % self.error
+
+    def __del__ (self):
+        if not self.__dict__.has_key('thread'):
+            return # __init__ didn't get that far
+        try:
+            self.close()
+        except (IOError, OSError):
+            pass # Nobody's left to tell
+
+def flushing (ref, full, interval):
+    """ Internal auxiliary function.  What a TtyrecWriter's background thread
+        does, until the writer is closed, or collected: 'ref' is a weak
+        reference to it, and 'full' is set when it has enough pending. """
+    while True:
+        full.wait(interval)
+        full.clear()
+        writer = ref()
+        if writer is None or writer.closed:
+            return
+        writer.writing.acquire()
+        try:
+            try:
+                writer.drain()
+            except (IOError, OSError), e:
+                writer.error = e
+                return
+        finally:
+            writer.writing.release()
+        # Don't keep the writer alive while waiting
+        del writer
+
+def planes (screen):
+    """ Returns the map rows of the planes of 'screen' a Frame keeps """
+    return (plane(screen.charPlane), plane(screen.foregroundPlane),
+            plane(screen.boldPlane), plane(screen.inversePlane))
+
+class Frame (object):
+    """ What the screen showed after a frame of a ttyrec was played: copies of
+        the map rows of its planes, as (H, W) arrays, the status lines, parsed,
+        and where the cursor was, on the map ('y' is -1 above it).
+        'stamp' is when the frame was recorded, in seconds, or None when the
+        reader was told to skip timestamps, and 'offset' is where in the
+        (uncompressed) ttyrec the frame starts. """
+    __slots__ = ['index', 'offset', 'stamp', 'chars', 'foreground', 'bold', 'inverse',
+                 'status', 'x', 'y']
+    def __init__ (self, index, offset, stamp, screen, status, views=None):
+        """ 'views' are the screen's planes as mapanalysis.plane returns them,
+            chars, foreground, bold and inverse, if they're at hand """
+        if views is None:
+            views = planes(screen)
+        self.index = index
+        self.offset = offset
+        self.stamp = stamp
+        self.chars = views[0].copy()
+        self.foreground = views[1].copy()
+        self.bold = views[2].copy()
+        self.inverse = views[3].copy()
+        self.status = status
+        self.x = screen.cursorX
+        self.y = screen.cursorY - MAP_TOP
+
+    def __repr__ (self):
+        return '<Frame %d at %d>' % (self.index, self.offset)
+
+class TtyrecReader (object):
+    """ I read the frames of a ttyrec file.  Plain files are memory mapped,
+        and the frames are taken straight from the map; compressed ones (GZIP
+        or ZLIB) are decompressed in memory first.  A last frame that was cut
+        short, because the game was still being recorded, is left out. """
+    def __init__ (self, filename, compression=None):
+        self.filename = filename
+        self.compression = compression
+        self.index = None
+        self.map = None
+        if compression is None:
+            f = open(filename, 'rb')
+            try:
+                size = os.fstat(f.fileno()).st_size
+                if size > 0:
+                    self.map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+                    self.data = self.map
+                else:
+                    self.data = ''
+            finally:
+                # The map stays valid on its own
+                f.close()
+        elif compression == GZIP:
+            f = gzip.open(filename, 'rb')
+            try:
+                self.data = f.read()
+            finally:
+                f.close()
+        elif compression == ZLIB:
+            f = open(filename, 'rb')
+            try:
+                self.data = zlib.decompressobj().decompress(f.read())
+            finally:
+                f.close()
+        else:
+            raise ValueError, "Unknown compression: %s" % compression
+
+    def __len__ (self):
+        """ The size of the ttyrec, uncompressed, in bytes """
+        return len(self.data)
+
+    def frames (self, start=0, timestamps=True):
+        """ Yields (offset, stamp, output) for each frame from byte 'start' on,
+            'stamp' being None if not 'timestamps' """
+        data = self.data
+        size = len(data)
+        offset = start
+        headerSize = HEADER.size
+        unpackHeader = HEADER.unpack_from
+        unpackLength = LENGTH.unpack_from
+        while offset + headerSize <= size:
+            if timestamps:
+                seconds, useconds, length = unpackHeader(data, offset)
+                stamp = seconds + useconds / 1000000.0
+            else:
+                length, = unpackLength(data, offset + 8)
+                stamp = None
+            end = offset + headerSize + length
+            if end > size:
+                break
+            yield offset, stamp, data[offset + headerSize:end]
+            offset = end
+
+    def replay (self, screen=None, start=0, timestamps=True):
+        """ Plays the frames from byte 'start' on into 'screen' (a new one by
+            default), and yields a Frame after each of them """
+        if screen is None:
+            screen = Screen()
+        reader = StatusReader()
+        printstr = screen.printstr
+        views = planes(screen)
+        for index, (offset, stamp, output) in enumerate(self.frames(start, timestamps)):
+            printstr(output)
+            yield Frame(index, offset, stamp, screen, reader.read(screen), views)
+
+    def keyframes (self, interval=1000, cache=True):
+        """ Returns the KeyframeIndex of this ttyrec, with a keyframe every
+            'interval' frames.  If 'cache', it's read from the file next to the
+            ttyrec, or built and written there if it's missing or out of date. """
+        if not self.index is None and self.index.interval == interval:
+            return self.index
+        indexFile = self.filename + INDEX_SUFFIX
+        index = None
+        if cache and os.path.exists(indexFile):
+            try:
+                index = loadIndex(indexFile)
+            except Exception:
+                pass # Not an index we can read; it'll be built again
+            if not index is None and not (index.describes(self.filename) and
+                                          index.interval == interval):
+                index = None
+        if index is None:
+            index = buildIndex(self, interval)
+            if cache:
+                try:
+                    index.save(indexFile)
+                except (IOError, OSError):
+                    pass # Somewhere we can't write; it's just slower next time
+        self.index = index
+        return index
+
+    def seek (self, number):
+        """ Returns the Frame for frame 'number' (counting from 0), replaying
+            only the frames since the keyframe before it.  Unless keyframes
+            was called first, the index has the default interval. """
+        index = self.index
+        if index is None:
+            index = self.keyframes()
+        if not 0 <= number < len(index):
+            raise IndexError, "There's no frame %d" % number
+        start, screen = index.screenBefore(number)
+        frames = self.frames(index.offsets[start])
+        for skipped in xrange(number - start):
+            offset, stamp, output = frames.next()
+            screen.printstr(output)
+        offset, stamp, output = frames.next()
+        screen.printstr(output)
+        return Frame(number, offset, stamp, screen, StatusReader().read(screen))
+
+    def seekTurn (self, turn):
+        """ Returns the Frame for the first frame that shows turn 'turn', or a
+            later one, or None if the game never got there """
+        index = self.index
+        if index is None:
+            index = self.keyframes()
+        keyframe = max(bisect.bisect_left(index.turns, turn) - 1, 0)
+        number = keyframe * index.interval
+        if number >= len(index):
+            return None
+        screen = index.screen(keyframe)
+        reader = StatusReader()
+        views = planes(screen)
+        for offset, stamp, output in self.frames(index.offsets[number]):
+            screen.printstr(output)
+            status = reader.read(screen)
+            if status.turn >= turn:
+                return Frame(number, offset, stamp, screen, status, views)
+            number += 1
+        return None
+
+    def close (self):
+        if not self.map is None:
+            self.map.close()
+            self.map = None
+        self.data = ''
+
+class KeyframeIndex (object):
+    """ I'm an index of a ttyrec: where each frame starts, and every
+        'interval' frames, a keyframe, the pickled Screen as it was before
+        that frame, compressed, and the highest turn shown up to then, so that
+        'turns' never goes down.  I also remember the size and modification
+        time of the ttyrec, to tell when I'm out of date. """
+    FORMAT = 2 # Goes up when what's saved changes
+
+    def __init__ (self, interval=1000, size=None, mtime=None):
+        self.interval = interval
+        self.size = size
+        self.mtime = mtime
+        self.offsets = array('l')
+        self.keyframes = []
+        self.turns = array('l')
+
+    def __len__ (self):
+        """ How many frames there are """
+        return len(self.offsets)
+
+    def describes (self, filename):
+        """ Whether I'm still the index of 'filename', or it has changed """
+        info = os.stat(filename)
+        return info.st_size == self.size and info.st_mtime == self.mtime
+
+    def screen (self, keyframe):
+        """ Returns a new Screen, as keyframe number 'keyframe' has it """
+        return pickle.loads(zlib.decompress(self.keyframes[keyframe]))
+
+    def screenBefore (self, number):
+        """ Returns the number of the frame the closest keyframe before frame
+            'number' is for, and a Screen as it was then """
+        keyframe = number // self.interval
+        return keyframe * self.interval, self.screen(keyframe)
+
+    def save (self, filename):
+        """ Write me to 'filename'.  A new file is written and moved in its
+            place, so readers never see half an index """
+        temporary = '%s.%d' % (filename, os.getpid())
+        f = open(temporary, 'wb')
+        try:
+            pickle.dump((self.FORMAT, self.__dict__), f, 2)
+        finally:
+            f.close()
+        os.rename(temporary, filename)
+
+def buildIndex (reader, interval=1000):
+    """ Returns the KeyframeIndex of the ttyrec 'reader' reads, played through once """
+    info = os.stat(reader.filename)
+    index = KeyframeIndex(interval, info.st_size, info.st_mtime)
+    screen = Screen()
+    status = StatusReader()
+    printstr = screen.printstr
+    offsets = index.offsets
+    highest = -1
+    for number, (offset, stamp, output) in enumerate(reader.frames(timestamps=False)):
+        if number % interval == 0:
+            index.keyframes.append(zlib.compress(pickle.dumps(screen, 2)))
+            index.turns.append(highest)
+        offsets.append(offset)
+        printstr(output)
+        # Menus and text windows hide the status lines, and read as turn -1
+        highest = max(highest, status.read(screen).turn)
+    return index
+
+def loadIndex (filename):
+    """ Returns the KeyframeIndex saved in 'filename' """
+    f = open(filename, 'rb')
+    try:
+        version, state = pickle.load(f)
+    finally:
+        f.close()
+    if version != KeyframeIndex.FORMAT:
+        raise ValueError, "Index format %s, not %s" % (version, KeyframeIndex.FORMAT)
+    index = KeyframeIndex()
+    index.__dict__.update(state)
+    return index
@@ -0,0 +1,188 @@
+# PyNethack.  A library to allow you to write bots that play nethack
+# Copyright (C) 2007  Anthony Lenton
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# VectorEnv plays several games in lockstep, the way reinforcement learning
+# code likes them: one action for each game goes in, and the observations,
+# rewards and whether each game is over come out, all as arrays.
+#
+#   env = VectorEnv(LocalNetHackConnection, 8)
+#   observations = env.reset()
+#   while True:
+#       actions = agent.act(observations)
+#       observations, rewards, dones, infos = env.step(actions)
+
+from multiprocessing.pool import ThreadPool
+import numpy
+import pexpect
+
+from scraper import WIDTH, ROWS
+from nethack import NetHackPlayer
+from observation import ObservationEncoder, PLANES, STATUS_FIELDS, GOLD, DUNGEON_LEVEL, \
+     EXPERIENCE_LEVEL, EXPERIENCE
+
+# The keys each action sends: the eight directions, stairs, searching,
+# resting, picking up, and for questions, going on and giving up.  The 'y'
+# and 'n' that most questions want are NW and SE.
+ACTIONS = ['k', 'u', 'l', 'n', 'j', 'b', 'h', 'y', '<', '>', 's', '.', ',',
+           ' ', '\r', '\x1b']
+
+class StatusReward (object):
+    """ I reward each game for how its status vector changed in a step:
+        the change in each field, times its weight.  Fields that weren't on
+        show before or after count for nothing. """
+    def __init__ (self, weights=None):
+        if weights is None:
+            weights = {GOLD: 1.0, DUNGEON_LEVEL: 50.0, EXPERIENCE_LEVEL: 20.0, EXPERIENCE: 1.0}
+        self.weights = numpy.zeros(len(STATUS_FIELDS), dtype=numpy.float32)
+        for field, weight in weights.items():
+            self.weights[field] = weight
+
+    def __call__ (self, before, after):
+        """ 'before' and 'after' are the (games, fields) status vectors;
+            returns a reward for each game """
+        return numpy.nansum((after - before) * self.weights, axis=1).astype(numpy.float32)
+
+class Game (object):
+    """ Internal auxiliary class.  One of the games a VectorEnv plays """
+    __slots__ = ['connection', 'player', 'encoder', 'interaction', 'done']
+    def __init__ (self, connection, player):
+        self.connection = connection
+        self.player = player
+        self.encoder = ObservationEncoder(connection.screen)
+        self.interaction = None
+        self.done = False
+
+class VectorEnv (object):
+    """ I play 'count' games at once.  'connectionFactory' is called with a
+        game's number and returns a new connection; 'playerClass' (a
+        NetHackPlayer by default) gets to start the game on it.  Actions are
+        numbers, the positions in 'actions' of the keys to send.
+        The games are stepped on a pool of 'threads' threads, one per game by
+        default, so that they all wait for their game at the same time, and a
+        step takes about as long as the slowest game.
+        Games that end are started again, on a new connection, in the same
+        step, and their observation is the new game's; the last status
+        vector of the one that ended is in its info, as 'final_status'.
+        'reward' is called with the status vectors before and after a step
+        and returns the rewards; by default, a StatusReward. """
+    def __init__ (self, connectionFactory, count, playerClass=NetHackPlayer, actions=None,
+                  reward=None, threads=None):
+        if actions is None:
+            actions = ACTIONS
+        if reward is None:
+            reward = StatusReward()
+        self.connectionFactory = connectionFactory
+        self.count = count
+        self.playerClass = playerClass
+        self.actions = actions
+        self.reward = reward
+        self.pool = ThreadPool(threads or count)
+        self.games = [None] * count
+        self.status = None
+        self.steps = 0
+
+    def start (self, number):
+        """ Internal auxiliary method.  Starts game 'number' on a new connection """
+        connection = self.connectionFactory(number)
+        player = self.playerClass(connection)
+        game = Game(connection, player)
+        game.interaction = player.play()
+        self.games[number] = game
+        return game
+
+    def stop (self, game):
+        """ Internal auxiliary method.  Closes the connection of 'game' """
+        child = game.connection.child
+        if hasattr(child, 'close'):
+            try:
+                child.close(force=True)
+            except Exception:
+                pass
+
+    def reset (self):
+        """ Starts all of the games afresh, and returns their observations """
+        for game in self.games:
+            if not game is None:
+                self.stop(game)
+        self.pool.map(self.start, range(self.count))
+        observations = self.observe()
+        self.status = observations['status'].copy()
+        return observations
+
+    def act (self, job):
+        """ Internal auxiliary method.  Sends game 'number' the key for
+            'action', and watches what it does """
+        number, action = job
+        game = self.games[number]
+        connection = game.connection
+        # Whatever the game was asking, the key is the answer
+        connection.pendingInteraction = None
+        try:
+            connection.send(self.actions[action])
+            game.interaction = game.player.watch()
+            game.done = connection.child.after is pexpect.EOF
+        except pexpect.EOF:
+            game.done = True
+
+    def step (self, actions):
+        """ Does 'actions', one for each game, and returns (observations,
+            rewards, dones, infos) """
+        actions = numpy.asarray(actions)
+        if actions.shape != (self.count,):
+            raise ValueError, "Expected %d actions, got %s" % (self.count, actions.shape)
+        self.pool.map(self.act, enumerate(actions.tolist()))
+        observations = self.observe()
+        rewards = self.reward(self.status, observations['status'])
+        dones = numpy.array([game.done for game in self.games], dtype=bool)
+        infos = [{'interaction': game.interaction} for game in self.games]
+        ended = [number for number in range(self.count) if dones[number]]
+        if ended:
+            for number in ended:
+                infos[number]['final_status'] = observations['status'][number].copy()
+                self.stop(self.games[number])
+            self.pool.map(self.start, ended)
+            again = self.observe(ended)
+            for key, value in again.items():
+                observations[key][ended] = value
+        self.status = observations['status'].copy()
+        self.steps += 1
+        return observations, rewards, dones, infos
+
+    def observe (self, numbers=None):
+        """ Internal auxiliary method.  Returns the observations of the games
+            'numbers' (all of them by default), as a dict of arrays:
+            'planes' (games, 4, ROWS, WIDTH), 'status' (games, fields) and
+            'cursor' (games, 2) """
+        if numbers is None:
+            numbers = range(self.count)
+        planes = numpy.empty((len(numbers), len(PLANES), ROWS, WIDTH), dtype=numpy.uint8)
+        status = numpy.empty((len(numbers), len(STATUS_FIELDS)), dtype=numpy.float32)
+        cursor = numpy.empty((len(numbers), 2), dtype=numpy.int16)
+        for row, number in enumerate(numbers):
+            encoder = self.games[number].encoder
+            for plane, live in zip(planes[row], encoder.live):
+                plane[...] = live
+            status[row] = encoder.statusVector()
+            cursor[row] = encoder.screen.cursorX, encoder.screen.cursorY
+        return {'planes': planes, 'status': status, 'cursor': cursor}
+
+    def close (self):
+        """ Closes every game, and the pool """
+        for game in self.games:
+            if not game is None:
+                self.stop(game)
+        self.pool.terminate()
+        self.pool.join()
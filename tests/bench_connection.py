@@ -0,0 +1,69 @@
+#!/usr/bin/python
+
+# Measure how many actions per second NetHackConnection.watch lets a bot take
+# against a game that answers each key after a fixed delay.
+
+import sys
+import time
+import re
+sys.path.append('..')
+
+import pexpect
+from nethack.connection import NetHackConnection
+from nethack.settle import SettleDetector
+
+STATUS = ('\x1b[23;1HAnthony the Stripling  St:15 Dx:13 Co:18 In:11 Wi:10 Ch:8  Lawful'
+          '\x1b[24;1HDlvl:1  $:0  HP:16(16) Pw:2(2) AC:6  Exp:1  T:%d')
+
+class FakeGame(object):
+    """ A stand-in for a pexpect child: every key sent moves the hero and,
+        'latency' seconds later, the new screen becomes available. """
+    def __init__(self, latency=0.002):
+        self.latency = latency
+        self.buffer = ''
+        self.readyAt = None
+        self.x = 10
+        self.turn = 1
+        self.before = ''
+        self.after = ''
+
+    def send(self, msg):
+        self.x = 10 + (self.x - 9) % 40
+        self.turn += 1
+        self.buffer += ('\x1b[10;1H\x1b[K\x1b[10;%dH@' % (self.x + 1) + STATUS % self.turn +
+                        '\x1b[10;%dH' % (self.x + 1))
+        self.readyAt = time.time() + self.latency
+
+    def expect(self, patterns, timeout):
+        deadline = time.time() + timeout
+        if self.buffer and self.readyAt < deadline:
+            time.sleep(max(0, self.readyAt - time.time()))
+            self.before = ''
+            self.after, self.buffer = self.buffer, ''
+            return patterns.index('(?s).+')
+        time.sleep(timeout)
+        self.before = ''
+        self.after = pexpect.TIMEOUT
+        return patterns.index(pexpect.TIMEOUT)
+
+class FixedTimeout(SettleDetector):
+    """ What watch used to do: always wait for a 0.3 seconds timeout """
+    def timeout(self, screen, expecting=None):
+        return self.fallback
+
+def actionsPerSecond(settle, actions=20):
+    conn = NetHackConnection()
+    conn.child = FakeGame()
+    conn.settle = settle
+    start = time.time()
+    for i in range(actions):
+        conn.send('l')
+        conn.watch()
+    return actions / (time.time() - start)
+
+def main():
+    print '%-30s %8.1f actions/s' % ('fixed 0.3s timeout', actionsPerSecond(FixedTimeout(), 5))
+    print '%-30s %8.1f actions/s' % ('settle detection', actionsPerSecond(SettleDetector()))
+
+if __name__ == "__main__":
+    main()
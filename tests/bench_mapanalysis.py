@@ -0,0 +1,155 @@
+#!/usr/bin/python
+
+# Measure how long Explorer takes to decide where to go next, with the map
+# analysed as NumPy arrays, against the old cell by cell loops.
+
+import sys
+import time
+sys.path.append('..')
+
+import numpy
+from nethack.connection import NetHackConnection
+from nethack.examples import Explorer, LevelStuff, W, H
+from nethack.mapanalysis import YES, NO, MAYBE
+from nethack.pathfinding import PathFinder
+
+STATUS = ('\x1b[23;1HAnthony the Stripling  St:15 Dx:13 Co:18 In:11 Wi:10 Ch:8  Lawful'
+          '\x1b[24;1HDlvl:1  $:0  HP:16(16) Pw:2(2) AC:6  Exp:1  T:1')
+
+def room(x, y, w, h):
+    """ Draw a lit room with its top left corner at (x, y) on the map """
+    rows = ['-' * w] + ['|' + '.' * (w - 2) + '|'] * (h - 2) + ['-' * w]
+    return ''.join('\x1b[%d;%dH%s' % (y + row + 2, x + 1, text) for row, text in enumerate(rows))
+
+def level():
+    """ A few rooms joined by corridors, with the hero in the first one """
+    output = room(2, 1, 14, 6) + room(30, 3, 20, 8) + room(60, 12, 15, 7) + room(8, 12, 12, 6)
+    output += '\x1b[5;17H' + '#' * 13 + '\x1b[12;51H' + '#' * 9
+    output += '\x1b[16;21H' + '#' * 20 + '\x1b[17;70H>' + '\x1b[4;6Hd'
+    return output + STATUS + '\x1b[4;5H@\x1b[4;5H'
+
+class LoopExplorer (Explorer):
+    """ The Explorer's decision as it used to be, looking at one cell at a time """
+    def hasInspected (self, y, x):
+        result = False
+        for d in self.dy.keys():
+            if 0 <= y+self.dy[d] and y+self.dy[d] < H and 0 <= x+self.dx[d] and x+self.dx[d] < W:
+                if self.beenThere[y+self.dy[d]][x+self.dx[d]]:
+                    result = True
+        return result
+
+    def somethingToExploreAt (self, y, x):
+        result = False
+        for d in self.dy.keys():
+            if 0 <= y+self.dy[d] and y+self.dy[d] < H and 0 <= x+self.dx[d] and x+self.dx[d] < W:
+                if self.reachable[y+self.dy[d]][x+self.dx[d]] == 'Maybe':
+                    result = True
+        return result
+
+    def reachableDistance (self, j, i):
+        self.distances = [[-1] * W for row in range(H)]
+        self.distances[j][i] = 0
+        stack = [(j, i)]
+        while len(stack):
+            y, x = stack.pop()
+            for d in self.dx.keys():
+                if self.distances[y+self.dy[d]][x+self.dx[d]] == -1 and self.reachable[y+self.dy[d]][x+self.dx[d]] == 'Yes':
+                    self.distances[y+self.dy[d]][x+self.dx[d]] = self.distances[y][x] + 1
+                    stack = [(y+self.dy[d], x+self.dx[d])] + stack
+
+    def normalExploratoryDecision (self):
+        for j in range(H):
+            for i in range(W):
+                if self.look(i, j).char in r'.#?\dfkx@+><%$(}][{):!"`/_':
+                    self.reachable[j][i] = 'Yes'
+                elif self.beenThere[j][i]:
+                    self.reachable[j][i] = 'Yes'
+                elif self.look(i, j).char in '-|':
+                    if self.look(i, j).foreground == 9:
+                        self.reachable[j][i] = 'No'
+                    else:
+                        self.reachable[j][i] = 'Yes'
+                elif self.look(i, j).char == ' ':
+                    if self.hasInspected (j,i):
+                        self.reachable[j][i] = 'No'
+        interesting = [[0] * W for i in range(H)]
+        for j in range(H):
+            for i in range(W):
+                if self.look(i, j).char in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ:@&;' and not self.look(i, j).inverse:
+                    interesting[j][i] = 1
+                if self.reachable[j][i] == 'Yes' and not self.beenThere[j][i] and self.somethingToExploreAt (j, i):
+                    interesting[j][i] = 1
+                elif self.look (i, j).char == '>':
+                    interesting[j][i] = 2
+        self.interesting = interesting
+        sites = [(j, i) for j in range(H) for i in range(W) if interesting[j][i]]
+        if len(sites) == 0:
+            return None
+        self.reachableDistance (self.y(), self.x())
+        sites = [site for site in sites if self.distances[site[0]][site[1]] > 0]
+        if len(sites) == 0:
+            return None
+        best = sites[0]
+        for site in sites:
+            if (interesting[site[0]][site[1]] > interesting[best[0]][best[1]] or
+              (interesting[site[0]][site[1]] == interesting[best[0]][best[1]] and
+              self.distances[site[0]][site[1]] < self.distances[best[0]][best[1]])):
+                best = site
+        return best
+
+def explorer(cls):
+    conn = NetHackConnection()
+    conn.screen.printstr(level())
+    bot = cls(conn)
+    bot.setLevelStuffFromDungeonLevel()
+    if cls is LoopExplorer:
+        bot.beenThere = [[False] * W for i in range(H)]
+        bot.reachable = [['Maybe'] * W for i in range(H)]
+    bot.beenThere[bot.y()][bot.x()] = True
+    return bot
+
+def timePerDecision(bot, runs):
+    start = time.time()
+    for i in range(runs):
+        bot.normalExploratoryDecision()
+    return (time.time() - start) / runs
+
+def timePerUpdate(bot, runs, incremental):
+    """ Time to get the distance field again after a corridor cell opens up """
+    walkable = bot.reachable == YES
+    opened = walkable.copy()
+    opened[14, 40] = True
+    y, x = bot.y(), bot.x()
+    total = 0
+    for i in range(runs):
+        paths = PathFinder(walkable)
+        paths.distances(y, x)
+        start = time.time()
+        if incremental:
+            paths.update(opened)
+        else:
+            paths = PathFinder(opened)
+        paths.distances(y, x)
+        total += time.time() - start
+    return total / runs
+
+def main():
+    new, old = explorer(Explorer), explorer(LoopExplorer)
+    new.normalExploratoryDecision()
+    old.normalExploratoryDecision()
+    codes = {'Maybe': MAYBE, 'Yes': YES, 'No': NO}
+    if not (new.reachable == numpy.array([[codes[r] for r in row] for row in old.reachable])).all():
+        raise ValueError, "Reachable cells differ"
+    if not (new.distances == numpy.array(old.distances)).all():
+        raise ValueError, "Distances differ"
+    fast = timePerDecision(new, 200)
+    slow = timePerDecision(old, 5)
+    print '%-30s %8.3f ms (was %.3f ms, x%.0f)' % ('exploratory decision', fast * 1000,
+                                                  slow * 1000, slow / fast)
+    fast = timePerUpdate(new, 200, True)
+    slow = timePerUpdate(new, 200, False)
+    print '%-30s %8.3f ms (recomputing: %.3f ms)' % ('distances after a cell opens', fast * 1000,
+                                                     slow * 1000)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+# Measure how fast Screen.printstr digests terminal output.
+# The streams are rebuilt from the screenshots used by the tests: a full
+# colour redraw of each one, a chain of --More-- messages and a menu.
+
+import sys
+import time
+sys.path.append('..')
+
+from nethack.scraper import Screen, Cell, WIDTH, HEIGHT, ROWS
+
+SCREENSHOTS = ['direction.txt', 'multiSelectLoot.txt', 'select.txt',
+               'yesno.txt', 'yesnoquit.txt']
+
+class CharByCharScreen(Screen):
+    """ The printstr engine Screen used to have: one character at a time,
+        trying every escape sequence pattern on a copy of the remaining
+        input.  Kept here as a reference for the benchmark. """
+    def printstr (self, cmd):
+        import re
+        index = 0
+        while index < len(cmd):
+            if cmd[index] == '\x1b':
+                index += 1
+                for seq in self.escape_sequences.keys():
+                    match = re.match(seq, cmd[index:])
+                    if not match is None:
+                        self.escape_sequences[seq](match)
+                        index += len(match.group(0))
+                        break
+                else:
+                    raise ValueError, list(cmd[index-1:index+30])
+            else:
+                self.printch(cmd[index])
+                index += 1
+
+def loadScreenshot(filename):
+    """ Returns the rows of a screenshot file, and the cursor position """
+    f = open('screenshots/' + filename)
+    y, x = [int(w) for w in f.readline().split()]
+    rows = [line.rstrip('\n')[:WIDTH - 1] for line in f][:HEIGHT]
+    return rows, x, y
+
+def redraw(rows, x, y):
+    """ Output that draws 'rows' the way nethack does after a CTRL+R """
+    out = ['\x1b[H\x1b[2J']
+    for i, row in enumerate(rows):
+        if not row.strip():
+            continue
+        out.append('\x1b[%d;1H' % (i + 1))
+        for ch in row:
+            if ch in '|-':
+                out.append('\x1b[1m\x1b[34m%s\x1b[m' % ch)
+            elif ch == '@':
+                out.append('\x1b[7m@\x1b[m')
+            else:
+                out.append(ch)
+        out.append('\x1b[K')
+    out.append('\x1b[%d;%dH' % (y + 1, x + 1))
+    return ''.join(out)
+
+def moreChain(count=20):
+    """ A sequence of top-line messages, each acknowledged with --More-- """
+    out = []
+    for i in range(count):
+        out.append('\x1b[H\x1b[KYou hear the footsteps of a guard on patrol. (%d)--More--' % i)
+    out.append('\x1b[H\x1b[K\x1b[17;49H')
+    return ''.join(out)
+
+def menu(rows, x, y):
+    """ A menu drawn over the map, one line at a time """
+    out = ['\x1b7']
+    for i, row in enumerate(rows):
+        out.append('\x1b[%d;%dH\x1b[7m%s\x1b[m\x1b[K' % (i + 1, 1, row))
+    out.append('\x1b8\x1b[%d;%dH' % (y + 1, x + 1))
+    return ''.join(out)
+
+def streams():
+    result = []
+    for filename in SCREENSHOTS:
+        rows, x, y = loadScreenshot(filename)
+        result.append(('redraw ' + filename, redraw(rows, x, y)))
+    rows, x, y = loadScreenshot('multiSelectLoot.txt')
+    result.append(('menu', menu(rows, x, y)))
+    result.append(('more chain', moreChain()))
+    result.append(('bulk', ''.join([stream for name, stream in result]) * 4))
+    return result
+
+def sameState(a, b):
+    cells = lambda sc: [(c.char, c.bold, c.inverse, c.foreground)
+                        for row in sc.screen for c in row]
+    return (cells(a) == cells(b) and a.cursorX == b.cursorX and
+            a.cursorY == b.cursorY)
+
+def throughput(screenClass, stream, seconds=0.5):
+    """ Bytes per second that 'screenClass' parses 'stream' at """
+    screen = screenClass()
+    repeats = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        screen.printstr(stream)
+        repeats += 1
+    return len(stream) * repeats / (time.time() - start)
+
+def footprint():
+    """ Bytes taken by a Screen's planes, and by the Cell grid it used to hold """
+    screen = Screen()
+    planes = sum([sys.getsizeof(plane) for plane in [screen.charPlane,
+                  screen.boldPlane, screen.inversePlane, screen.foregroundPlane]])
+    cell = Cell()
+    grid = ROWS * (sys.getsizeof([]) + WIDTH * (8 + sys.getsizeof(cell) +
+                                                sys.getsizeof(cell.__dict__)))
+    return planes, grid
+
+def main():
+    for name, stream in streams():
+        new, old = Screen(), CharByCharScreen()
+        new.printstr(stream)
+        old.printstr(stream)
+        if not sameState(new, old):
+            raise ValueError, "Screens differ after replaying " + name
+        fast = throughput(Screen, stream)
+        slow = throughput(CharByCharScreen, stream)
+        print '%-30s %6d bytes %10.0f bytes/s (was %9.0f, x%.1f)' % (
+            name, len(stream), fast, slow, fast / slow)
+    planes, grid = footprint()
+    print '%-30s %6d bytes (Cell grid: %d bytes)' % ('screen footprint', planes, grid)
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,11 @@ def main():
     suite = unittest.TestSuite()
 
     for moduleName in ['test_items', 'test_nethackplayer', 'test_connection',
-                       'test_scraper', 'test_endings']:
+                       'test_scraper', 'test_endings', 'test_interactions',
+                       'test_inventory', 'test_status', 'test_mapanalysis',
+                       'test_pathfinding', 'test_replay', 'test_runner',
+                       'test_reactor', 'test_telnet', 'test_instrumentation',
+                       'test_history', 'test_ttyrec', 'test_batch', 'test_observation', 'test_vecenv']:
         module = __import__(moduleName)
         suite.addTest (module.suite())
 
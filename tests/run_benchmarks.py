@@ -0,0 +1,246 @@
+#!/usr/bin/python
+
+# Measure the hot paths of the scraper and the connection, and print one JSON
+# object per benchmark, so that runs can be compared between releases:
+#
+#   python run_benchmarks.py [--seconds S] [--only NAME] > results.jsonl
+#
+# Each benchmark runs in a process of its own, so that the peak memory it
+# reports is its own.  'objects' is how many more objects the garbage
+# collector tracks after the benchmark than before it: it should stay put.
+
+import sys
+import os
+import gc
+import time
+import json
+import resource
+import optparse
+import tempfile
+import cPickle
+sys.path.append('..')
+
+from nethack.scraper import Screen
+from nethack.replay import Recording, ReplayNetHackConnection, READ, SENT
+from nethack.instrumentation import Instrumentation
+from nethack.ttyrec import TtyrecWriter, TtyrecReader
+from nethack.observation import ObservationEncoder
+from nethack.scraper import WIDTH, ROWS
+import numpy
+import bench_scraper
+
+STATUS = ('\x1b[23;1HAnthony the Stripling  St:15 Dx:13 Co:18 In:11 Wi:10 Ch:8  Lawful'
+          '\x1b[24;1HDlvl:1  $:0  HP:16(16) Pw:2(2) AC:6  Exp:1  T:%d')
+
+def walkingGame(moves=200):
+    """ A recorded game where the hero walks back and forth along a corridor """
+    recording = Recording()
+    recording.add(READ, '\x1b[2J\x1b[10;11H@' + STATUS % 1 + '\x1b[10;11H')
+    x = 10
+    for turn in range(2, moves + 2):
+        x = 10 + (x - 9) % 40
+        recording.add(SENT, 'l')
+        recording.add(READ, '\x1b[10;1H\x1b[K\x1b[10;%dH@' % (x + 1) + STATUS % turn +
+                      '\x1b[10;%dH' % (x + 1))
+    return recording
+
+def chattyGame(actions=50, messages=4):
+    """ A recorded game where every action brings a chain of --More-- messages """
+    recording = Recording()
+    recording.add(READ, '\x1b[2J\x1b[10;11H@' + STATUS % 1 + '\x1b[10;11H')
+    for turn in range(2, actions + 2):
+        recording.add(SENT, 's')
+        for i in range(messages):
+            recording.add(READ, '\x1b[H\x1b[KYou hear the footsteps of a guard on patrol.--More--')
+            recording.add(SENT, ' ')
+        recording.add(READ, '\x1b[H\x1b[K' + STATUS % turn + '\x1b[10;11H')
+    return recording
+
+def printing(stream):
+    """ A benchmark that feeds 'stream' to a Screen """
+    def run():
+        screen = Screen()
+        screen.printstr(stream)
+        return {'bytes': len(stream), 'escapes': stream.count('\x1b')}
+    return run
+
+def watching(recording, instrumented=False, recorded=False):
+    """ A benchmark that plays 'recording' back through watch, as a bot would,
+        optionally timing it or archiving it as a ttyrec """
+    keys = [data for stamp, kind, data in recording.events if kind == SENT and data != ' ']
+    output = recording.output()
+    writers = [] # One for the whole run, opened in the process that runs it
+    def run():
+        conn = ReplayNetHackConnection(recording)
+        if instrumented:
+            conn.instrumentation = Instrumentation()
+        if recorded:
+            if not writers:
+                writers.append(TtyrecWriter(os.devnull))
+            conn.ttyrec = writers[0]
+        conn.watch()
+        for key in keys:
+            conn.send(key)
+            conn.watch()
+        return {'bytes': len(output), 'escapes': output.count('\x1b'), 'settles': len(keys) + 1}
+    return run
+
+def ttyrec(recording, interval=None):
+    """ Returns a TtyrecReader for 'recording', written as a ttyrec, with a
+        keyframe index every 'interval' frames if it's given """
+    fd, filename = tempfile.mkstemp(suffix='.ttyrec')
+    os.close(fd)
+    writer = TtyrecWriter(filename)
+    for stamp, kind, data in recording.events:
+        if kind == READ:
+            writer.write(data, stamp)
+    writer.close()
+    reader = TtyrecReader(filename)
+    if not interval is None:
+        reader.keyframes(interval, cache=False)
+    os.remove(filename) # The reader has it mapped
+    return reader
+
+def replaying(recording, timestamps=True):
+    """ A benchmark that replays 'recording', written as a ttyrec, into a
+        Screen, as when turning archived games into data """
+    reader = ttyrec(recording)
+    def run():
+        frames = 0
+        for frame in reader.replay(timestamps=timestamps):
+            frames += 1
+        return {'bytes': len(reader), 'frames': frames}
+    return run
+
+def seeking(recording, interval=50):
+    """ A benchmark that jumps to frames all over 'recording', written as a
+        ttyrec, through a keyframe index """
+    reader = ttyrec(recording, interval)
+    numbers = range(0, len(reader.index), 7)
+    def run():
+        for number in numbers:
+            reader.seek(number)
+        return {'seeks': len(numbers)}
+    return run
+
+def encoding(recording, copy=True, frames=200):
+    """ A benchmark that encodes the screen after each chunk of output of
+        'recording' as an Observation, as a learning agent would each step """
+    chunks = [data for stamp, kind, data in recording.events if kind == READ][:frames]
+    screens = []
+    screen = Screen()
+    for chunk in chunks:
+        screen.printstr(chunk)
+        screens.append(cPickle.loads(cPickle.dumps(screen, 2))) # A copy, as it is now
+    encoders = [ObservationEncoder(screen) for screen in screens]
+    def run():
+        for encoder in encoders:
+            encoder.status = None # So the status vector is worked out every time
+            encoder.encode(copy)
+        return {'frames': len(encoders)}
+    return run
+
+def encodingCells(recording, frames=200):
+    """ The 'observation' benchmark, going cell by cell through cellAt, to
+        compare with """
+    chunks = [data for stamp, kind, data in recording.events if kind == READ][:frames]
+    screen = Screen()
+    for chunk in chunks:
+        screen.printstr(chunk)
+    def run():
+        for i in range(frames):
+            chars = numpy.empty((ROWS, WIDTH), dtype=numpy.uint8)
+            for y in range(ROWS):
+                for x in range(WIDTH):
+                    chars[y, x] = ord(screen.cellAt(x, y).char)
+        return {'frames': frames}
+    return run
+
+def benchmarks():
+    """ Returns the (name, benchmark) pairs to run """
+    result = [('printstr ' + name, printing(stream)) for name, stream in bench_scraper.streams()]
+    result.append(('watch walking', watching(walkingGame())))
+    result.append(('watch walking instrumented', watching(walkingGame(), True)))
+    result.append(('watch walking recorded', watching(walkingGame(), recorded=True)))
+    result.append(('watch --More-- chains', watching(chattyGame())))
+    result.append(('ttyrec replay walking', replaying(walkingGame())))
+    result.append(('ttyrec replay walking untimed', replaying(walkingGame(), False)))
+    result.append(('ttyrec seek walking', seeking(walkingGame())))
+    result.append(('observation encode', encoding(walkingGame())))
+    result.append(('observation encode zero copy', encoding(walkingGame(), False)))
+    result.append(('observation chars via cellAt', encodingCells(walkingGame(), 20)))
+    return result
+
+def measure(name, run, seconds):
+    """ Runs 'run' over and over for about 'seconds', and returns the rates of
+        what it did, and what it cost """
+    run() # Warm up caches, compiled patterns and the like
+    gc.collect()
+    objects = len(gc.get_objects())
+    totals = {}
+    repeats = 0
+    start = time.time()
+    cpuStart = time.clock()
+    while time.time() - start < seconds:
+        for key, value in run().items():
+            totals[key] = totals.get(key, 0) + value
+        repeats += 1
+    elapsed = time.time() - start
+    cpu = time.clock() - cpuStart
+    gc.collect()
+    result = {'benchmark': name, 'repeats': repeats, 'seconds': round(elapsed, 4),
+              'cpu_seconds': round(cpu, 4),
+              'objects': len(gc.get_objects()) - objects,
+              'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    for key, value in totals.items():
+        result[key] = value
+        result[key + '_per_s'] = round(value / elapsed, 1)
+    return result
+
+def isolated(function, *args):
+    """ Calls 'function' in a child process, and returns what it returns, which
+        must be JSON serializable """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        status = 0
+        try:
+            try:
+                os.write(write, json.dumps(function(*args)))
+            except Exception:
+                import traceback
+                traceback.print_exc()
+                status = 1
+        finally:
+            os._exit(status)
+    os.close(write)
+    chunks = []
+    while True:
+        chunk = os.read(read, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read)
+    pid, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError, "Benchmark failed: %s" % args[0]
+    return json.loads(''.join(chunks))
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--seconds', type='float', default=1.0,
+                      help='how long to run each benchmark for')
+    parser.add_option('--only', default=None,
+                      help='only run the benchmarks whose name contains this')
+    options, args = parser.parse_args()
+    for name, run in benchmarks():
+        if options.only and not options.only in name:
+            continue
+        result = isolated(measure, name, run, options.seconds)
+        result['python'] = sys.version.split()[0]
+        print json.dumps(result, sort_keys=True)
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.append('..')
+from nethack.batch import Batch, Extractor, StatusExtractor, MessageExtractor, compressionOf
+from nethack.ttyrec import TtyrecWriter, GZIP, ZLIB
+
+BOTTOM = '\x1b[24;1HDlvl:%d  $:%d  HP:%d(16) Pw:2(2) AC:6  Exp:1  T:%d'
+
+def writeGame (filename, frames, compression=None):
+    """ Writes a ttyrec of 'frames', (dungeon level, hit points, turn,
+        message) tuples, the message being None when there isn't one """
+    if filename.endswith('.gz'):
+        compression = GZIP
+    writer = TtyrecWriter(filename, compression)
+    writer.write('\x1b[2J\x1b[10;10H@')
+    for level, hitPoints, turn, message in frames:
+        output = BOTTOM % (level, 5, hitPoints, turn)
+        if not message is None:
+            output += '\x1b[H\x1b[K' + message
+        writer.write(output + '\x1b[10;10H')
+    writer.close()
+
+class CursorExtractor (Extractor):
+    """ Counts the frames that leave the cursor on the hero """
+    def __init__ (self):
+        self.count = 0
+    def frame (self, frame, screen):
+        if (frame.x, frame.y) == (9, 8):
+            self.count += 1
+    def finish (self):
+        return {'on_hero': self.count}
+
+class TestBatch (unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.died = os.path.join(self.directory, 'died.ttyrec.gz')
+        writeGame(self.died, [(1, 16, 1, None), (1, 16, 5, 'This food ration is delicious!'),
+                              (2, 12, 9, None), (3, 8, 20, 'The jackal bites!'),
+                              (3, 0, 21, 'You die...--More--'),
+                              (3, 0, 21, 'Do you want your possessions identified?')])
+        self.quit = os.path.join(self.directory, 'quit.ttyrec')
+        writeGame(self.quit, [(1, 16, 1, None), (1, 16, 3, 'Really quit?')])
+        self.broken = os.path.join(self.directory, 'broken.ttyrec.gz')
+        f = open(self.broken, 'wb')
+        f.write('not gzip at all')
+        f.close()
+        self.journal = os.path.join(self.directory, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testColumns(self):
+        batch = Batch([self.died, self.quit, self.broken], processes=2)
+        self.assertEquals(3, batch.run())
+        columns = batch.columns()
+        self.assertEquals([self.died, self.quit, self.broken], columns['file'])
+        self.assertEquals([7, 3, None], columns['frames'])
+        self.assertEquals([21, 3, None], columns['turns'])
+        self.assertEquals([3, 1, None], columns['deepest'])
+        self.assertEquals([0, 16, None], columns['hit_points'])
+        self.assertEquals([True, False, None], columns['died'])
+        self.assertEquals({'1': 9, '2': 11, '3': 1}, columns['turns_per_level'][0])
+        self.assertEquals(1, columns['uses'][0]['eat'])
+        self.assertEquals(4, columns['messages'][0])
+        self.assertEquals([None, None], columns['error'][:2])
+        self.assertTrue('IOError' in columns['error'][2])
+
+    def testExtractors(self):
+        batch = Batch([self.quit], extractors=[CursorExtractor], processes=1)
+        batch.run()
+        self.assertEquals({'file': [self.quit], 'frames': [3], 'error': [None],
+                           'on_hero': [2]}, batch.columns())
+
+    def testResume(self):
+        batch = Batch([self.died], journal=self.journal, processes=1)
+        batch.run()
+        # Stopped while writing down another game
+        f = open(self.journal, 'a')
+        f.write('{"file": "')
+        f.close()
+        batch = Batch([self.died, self.quit], journal=self.journal, processes=1)
+        self.assertEquals([self.quit], batch.pending())
+        self.assertEquals([self.quit], [entry['file'] for entry in batch.results()])
+        self.assertEquals([21, 3], batch.columns()['turns'])
+        batch = Batch([self.died, self.quit], journal=self.journal)
+        self.assertEquals([], batch.pending())
+        self.assertEquals(0, batch.run())
+        self.assertEquals([21, 3], batch.columns()['turns'])
+
+    def testRetry(self):
+        Batch([self.died, self.broken], journal=self.journal, processes=1).run()
+        batch = Batch([self.died, self.broken], journal=self.journal, processes=1)
+        self.assertEquals([self.broken], batch.pending())
+        self.assertEquals(1, batch.run())
+        batch = Batch([self.died, self.broken], journal=self.journal, retry=False)
+        self.assertEquals([], batch.pending())
+        self.assertTrue('IOError' in batch.columns()['error'][1])
+
+    def testSave(self):
+        batch = Batch([self.quit], processes=1)
+        batch.run()
+        output = os.path.join(self.directory, 'columns.json')
+        batch.save(output)
+        self.assertEquals([3], json.load(open(output))['turns'])
+
+    def testCompression(self):
+        self.assertEquals(GZIP, compressionOf('a.ttyrec.gz'))
+        self.assertEquals(ZLIB, compressionOf('a.ttyrec.zlib'))
+        self.assertEquals(None, compressionOf('a.ttyrec'))
+        # Names that don't say are told by how the file starts
+        self.assertEquals(None, compressionOf(self.quit))
+        for compression in [GZIP, ZLIB]:
+            filename = os.path.join(self.directory, compression + '.ttyrec')
+            writeGame(filename, [(1, 16, 1, None)], compression)
+            self.assertEquals(compression, compressionOf(filename))
+            batch = Batch([filename], processes=1)
+            batch.run()
+            self.assertEquals([2], batch.columns()['frames'])
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestBatch))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,15 @@
 # Test the watching abilities of the connection.
 import unittest
 import sys
+import time
 sys.path.append('..')
 
 from nethack.connection import NetHackConnection
 from nethack.scraper import Screen, Cell
 
-from nethack.interactions import YesNoInteraction, YesNoQuitInteraction, SelectInteraction, SelectDialogInteraction, DirectionInteraction
+from nethack.interactions import YesNoInteraction, YesNoQuitInteraction, SelectInteraction, SelectDialogInteraction, DirectionInteraction, CursorPointInteraction, FreeEntryInteraction
+from nethack.classifier import defaultClassifier
+from nethack.items import Item
 
 class MockChild(object):
     def __init__(self, returnValue=1):
@@ -16,6 +19,48 @@ class MockChild(object):
     def expect(self, patterns, timeout):
         return self.returnValue
 
+class ScriptedChild(object):
+    """ Hands out 'chunks' of output, one per call to expect, and then times out """
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.timeouts = []
+        self.sent = []
+        self.before = ''
+        self.after = ''
+    def expect(self, patterns, timeout):
+        self.timeouts.append(timeout)
+        if self.chunks:
+            self.after = self.chunks.pop(0)
+            return len(patterns) - 1
+        self.after = patterns[1]
+        return 1
+    def send(self, msg):
+        self.sent.append(msg)
+
+class SlowChild(object):
+    """ Answers the first key sent with 'output', 'delay' seconds after it """
+    def __init__(self, delay, output):
+        self.delay = delay
+        self.output = output
+        self.sentAt = None
+        self.timeouts = []
+        self.before = ''
+        self.after = ''
+    def send(self, msg):
+        self.sentAt = time.time()
+    def expect(self, patterns, timeout):
+        self.timeouts.append(timeout)
+        wait = self.sentAt + self.delay - time.time()
+        if self.output and wait <= timeout:
+            time.sleep(max(wait, 0))
+            self.after, self.output = self.output, ''
+            return len(patterns) - 1
+        time.sleep(timeout)
+        self.after = patterns[1]
+        return 1
+
+STATUS = ('\x1b[23;1HAnthony the Stripling  St:15 Dx:13 Co:18 In:11 Wi:10 Ch:8  Lawful'
+          '\x1b[24;1HDlvl:1  $:0  HP:16(16) Pw:2(2) AC:6  Exp:1')
 
 
 class Screenshot(Screen):
@@ -49,12 +94,87 @@ class SelectDialogConnection(NetHackConnection):
         self.screen = Screenshot(filename)
         self.child = MockChild()
         self.filename = filename
+        self.sent = []
     def send(self, char):
-        if char == '>':
+        self.sent.append(char)
+        if char.endswith('>'):
             self.screen.setScreen(self.filename, 25)
         elif char == '<':
             self.screen.setScreen(self.filename)
 
+class TestSettle (unittest.TestCase):
+    def testSettlesOnHero(self):
+        conn = NetHackConnection()
+        conn.settle.adaptive = False
+        conn.child = ScriptedChild(['\x1b[10;10H.@.' + STATUS, '\x1b[10;11H'])
+        conn.send('l')
+        conn.watch()
+        self.assertEquals([conn.settle.fallback, conn.settle.fallback, conn.settle.grace],
+                          conn.child.timeouts)
+
+    def testWaitsWhileUnsettled(self):
+        conn = NetHackConnection()
+        conn.settle.adaptive = False
+        conn.child = ScriptedChild(['\x1b[10;10H.@.'])
+        conn.send('l')
+        conn.watch()
+        self.assertEquals([conn.settle.fallback, conn.settle.fallback], conn.child.timeouts)
+
+    def testMore(self):
+        conn = NetHackConnection()
+        conn.child = ScriptedChild(['\x1b[HHello there. --More--', '\x1b[H\x1b[K\x1b[10;11H'])
+        info = conn.watch()
+        self.assertEquals([' '], conn.child.sent)
+        self.assertEquals(['Hello there.'], info.message)
+
+    def testAdaptiveFallback(self):
+        conn = NetHackConnection()
+        conn.settle.latency = 0.001
+        conn.settle.answered = True
+        self.assertEquals(conn.settle.minimumFallback, conn.settle.fallbackTimeout())
+        conn.settle.latency = 1
+        self.assertEquals(conn.settle.fallback, conn.settle.fallbackTimeout())
+
+    def testSlowAnswer(self):
+        # The game usually answers straight away, but this time it takes 0.15s
+        conn = NetHackConnection()
+        conn.settle.latency = 0.001
+        conn.child = SlowChild(0.15, '\x1b[10;10H.@' + STATUS + '\x1b[10;11H')
+        conn.send('>')
+        conn.watch()
+        self.assertEquals('@', conn.screen.getCharAtRelativePos())
+        self.assertEquals(conn.settle.fallback, conn.child.timeouts[0])
+
+class TestClassifier (unittest.TestCase):
+    def testOrder(self):
+        classifier = defaultClassifier()
+        (name, pattern, factory), question = classifier.find('Really attack the guard? [yn] (n) ')
+        self.assertEquals('yesno', name)
+        self.assertEquals('Really attack the guard? [yn] (n) ', question)
+        (name, pattern, factory), question = classifier.find(' Weapons (1 of 2)')
+        self.assertEquals('selectdialog', name)
+        self.assertEquals(None, classifier.find('Hello'))
+
+    def testRegister(self):
+        conn = NetHackConnection()
+        conn.child = ScriptedChild(['\x1b[HWhere do you want to travel to? (For instructions type a ?)'])
+        self.assertEquals(FreeEntryInteraction, type(conn.watch()))
+        conn.pendingInteraction = None
+        conn.classifier.register(r'.*\(For instructions type a \?\)', CursorPointInteraction, 'position')
+        conn.child = ScriptedChild([])
+        match = conn.watch()
+        self.assertEquals(CursorPointInteraction, type(match))
+        self.assertEquals('Where do you want to travel to? (For instructions type a ?)', match.question)
+
+    def testFirst(self):
+        classifier = defaultClassifier()
+        classifier.register(r'.* \[yn\] \(n\) ', FreeEntryInteraction, 'careful', first=True)
+        (name, pattern, factory), question = classifier.find('Really attack the guard? [yn] (n) ')
+        self.assertEquals('careful', name)
+        classifier.unregister('careful')
+        (name, pattern, factory), question = classifier.find('Really attack the guard? [yn] (n) ')
+        self.assertEquals('yesno', name)
+
 class TestConnection (unittest.TestCase):
     def testYesNo(self):
         screen = Screenshot('screenshots/yesno.txt')
@@ -85,9 +205,60 @@ class TestConnection (unittest.TestCase):
         match = conn.watch()
         self.assertEquals(SelectDialogInteraction, type(match))
 
+    def testMultiSelectLazy(self):
+        conn = SelectDialogConnection('screenshots/multiSelectLoot.txt')
+        match = conn.watch()
+        self.assertEquals([], conn.sent)
+        self.assertEquals('a', match.iterOptions().next().key)
+        firstPage = match.options
+        self.assertEquals([], conn.sent)
+        options = match.readOptions()
+        self.assertEquals(['>'], conn.sent)
+        self.assertEquals(16, len(options))
+        self.assertEquals(options[:len(firstPage)], firstPage)
+        self.assertEquals('Wands', options[-2].category)
+        self.assertEquals(16, len(match.readOptions()))
+        self.assertEquals(16, len(match.options))
+        self.assertEquals(['>'], conn.sent)
+
+    def testMultiSelectAnswer(self):
+        conn = SelectDialogConnection('screenshots/multiSelectLoot.txt')
+        match = conn.watch()
+        match.answer([Item('a'), Item('b')])
+        self.assertEquals(['ab\r'], conn.sent)
+        # Each item is picked on its own page, on the way forward
+        conn = SelectDialogConnection('screenshots/multiSelectLoot.txt')
+        match = conn.watch()
+        match.answer([Item('n'), Item('a')])
+        self.assertEquals(['a>', 'n\r'], conn.sent)
+
+    def testMultiSelectMissing(self):
+        conn = SelectDialogConnection('screenshots/multiSelectLoot.txt')
+        match = conn.watch()
+        options = match.readOptions()
+        # The first page has been moved past, and there's no 'Z' at all
+        self.assertRaises(ValueError, match.reply, [options[-1], options[0]])
+        self.assertRaises(ValueError, match.reply, Item('Z'))
+        self.assertEquals(['>'], conn.sent)
+        self.assertTrue(conn.pendingInteraction is match)
+
+    def testMultiSelectChoose(self):
+        conn = SelectDialogConnection('screenshots/multiSelectLoot.txt')
+        match = conn.watch()
+        match.choose(lambda item: item.key == 'a' or item.category == 'Wands')
+        self.assertEquals(['a>', 'c\r'], conn.sent)
+
+    def testSingleSelectChoose(self):
+        conn = SelectDialogConnection('screenshots/multiSelectLoot.txt')
+        match = conn.watch()
+        match.choose(lambda item: item.category == 'Wands', multiple=False)
+        self.assertEquals(['>', 'c'], conn.sent)
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestConnection))
+    suite.addTest(unittest.makeSuite(TestSettle))
+    suite.addTest(unittest.makeSuite(TestClassifier))
     return suite
 
 if __name__ == '__main__':
@@ -0,0 +1,74 @@
+import sys
+import os
+import pickle
+import tempfile
+import unittest
+
+sys.path.append('..')
+from nethack.history import MessageHistory
+from nethack.interactions import Information
+from nethack.connection import NetHackConnection
+
+def info (text):
+    return Information(None, [text])
+
+class TestMessageHistory (unittest.TestCase):
+    def testRing(self):
+        history = MessageHistory(size=3)
+        for i in range(5):
+            history.append(info('message %d' % i))
+        self.assertEquals(5, len(history))
+        self.assertEquals(2, history.first)
+        self.assertEquals(['message 4'], history[-1].message)
+        self.assertEquals(['message 2'], history[2].message)
+        self.assertRaises(IndexError, lambda: history[1])
+        self.assertEquals(['message 3', 'message 4'], [i.message[0] for i in history.since(3)])
+        self.assertEquals(['message 2', 'message 3', 'message 4'],
+                          [i.message[0] for i in history.since(0)])
+        self.assertEquals([], history.since(5))
+        self.assertEquals(['message 4'], [i.message[0] for i in history.recent(1)])
+        self.assertEquals(3, len(list(history)))
+
+    def testSpill(self):
+        handle, filename = tempfile.mkstemp(suffix='.gz')
+        os.close(handle)
+        os.remove(filename)
+        try:
+            history = MessageHistory(size=2, spill=filename)
+            for i in range(4):
+                history.append(info('message %d \xe9' % i))
+            self.assertEquals(['message 0 \xe9', 'message 1 \xe9', 'message 2 \xe9', 'message 3 \xe9'],
+                              [i.message[0] for i in history])
+            history.append(info('message 4'))
+            self.assertEquals(5, len(list(history)))
+            self.assertEquals('message 2 \xe9', list(history)[2].message[0])
+            history.close()
+        finally:
+            os.remove(filename)
+
+    def testPickle(self):
+        history = MessageHistory(size=2)
+        for i in range(3):
+            history.append(info('message %d' % i))
+        copy = pickle.loads(pickle.dumps(history))
+        self.assertEquals(3, len(copy))
+        self.assertEquals(2, copy.entries.maxlen)
+        copy.append(info('message 3'))
+        self.assertEquals(['message 2', 'message 3'], [i.message[0] for i in copy.since(0)])
+
+    def testOldPickledConnections(self):
+        conn = NetHackConnection()
+        state = conn.__getstate__()
+        state['history'] = [info('Hello')]
+        conn = NetHackConnection.__new__(NetHackConnection)
+        conn.__setstate__(state)
+        self.assertEquals(1, len(conn.history))
+        self.assertEquals(['Hello'], conn.history[0].message)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestMessageHistory))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+
+sys.path.append('..')
+from nethack.instrumentation import Instrumentation, Histogram, PHASES
+from nethack.replay import Recording, ReplayNetHackConnection, READ, SENT
+from nethack.nethack import NetHackPlayer
+from test_replay import recordedGame, STATUS
+
+class TestHistogram (unittest.TestCase):
+    def testBuckets(self):
+        h = Histogram()
+        for seconds in [0.000001, 0.000003, 0.000003, 0.001]:
+            h.add(seconds)
+        self.assertEquals(4, h.count)
+        self.assertEquals([0, 1, 2, 0, 0, 0, 0, 0, 0, 0, 1], h.buckets[:11])
+        self.assertEquals(0.000004, h.percentile(50))
+        self.assertEquals(0.001, h.percentile(100))
+        self.assertEquals(0.000001, h.min)
+        self.assertTrue(h.asDict().has_key('buckets_us'))
+
+    def testBytes(self):
+        h = Histogram(1, 'bytes')
+        for size in [0, 100, 3000]:
+            h.add(size)
+        self.assertEquals(128, h.percentile(50))
+        self.assertEquals(3000, h.max)
+        self.assertEquals([[1, 1], [2, 0], [4, 0], [8, 0], [16, 0], [32, 0], [64, 0], [128, 1]],
+                          h.asDict()['buckets_bytes'][:8])
+        self.assertFalse(h.asDict().has_key('buckets_us'))
+
+class TestInstrumentation (unittest.TestCase):
+    def testDisabledByDefault(self):
+        conn = ReplayNetHackConnection(recordedGame())
+        conn.watch()
+        self.assertEquals(None, conn.instrumentation)
+
+    def testCycles(self):
+        recording = recordedGame()
+        conn = ReplayNetHackConnection(recording)
+        conn.instrumentation = Instrumentation()
+        np = NetHackPlayer(conn)
+        np.watch()
+        np.go('E')
+        np.go('E')
+        np.send('e')
+        np.watch()
+        timing = conn.instrumentation
+        self.assertEquals(4, timing.cycles)
+        self.assertEquals(len(recording.output()), timing.bytes)
+        self.assertEquals(recording.output().count('\x1b'), timing.escapes)
+        self.assertEquals(0, timing.mores)
+        self.assertEquals(3, timing.histograms['bot'].count)
+        for phase in ['wait', 'parse', 'classify', 'other', 'watch']:
+            self.assertEquals(4, timing.histograms[phase].count)
+
+    def testMoreAndDump(self):
+        recording = Recording()
+        recording.add(READ, '\x1b[HYou hear a door open.--More--')
+        recording.add(SENT, ' ')
+        recording.add(READ, '\x1b[H\x1b[K\x1b[10;10H@' + STATUS % 1 + '\x1b[10;10H')
+        conn = ReplayNetHackConnection(recording)
+        conn.instrumentation = Instrumentation()
+        conn.watch()
+        self.assertEquals(1, conn.instrumentation.mores)
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            conn.instrumentation.dump(filename)
+            dumped = json.load(open(filename))
+        finally:
+            os.remove(filename)
+        self.assertEquals(1, dumped['cycles'])
+        self.assertEquals(1, dumped['phases']['wait']['count'])
+        self.assertEquals(len(recording.output()), dumped['bytes_per_watch']['max'])
+        self.assertTrue('wait' in conn.instrumentation.summary())
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestHistogram))
+    suite.addTest(unittest.makeSuite(TestInstrumentation))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+sys.path.append('..')
+
+from nethack.connection import NetHackConnection
+from nethack.scraper import Screen
+from nethack.interactions import planCursorKeys, CursorPointInteraction, expandKeys
+
+class RecordingConnection(NetHackConnection):
+    """ A connection that writes down what's sent and never waits for output """
+    def __init__(self, output=''):
+        super (RecordingConnection, self).__init__()
+        self.screen.printstr(output)
+        self.sent = []
+    def send(self, msg):
+        self.sent.append(msg)
+    def watch(self, expecting=None, selectDialogQuestion=None):
+        return None
+
+class TestCursorPlanning(unittest.TestCase):
+    def testShortMoves(self):
+        self.assertEquals('', planCursorKeys(5, 5, 5, 5))
+        self.assertEquals('l', planCursorKeys(5, 5, 6, 5))
+        self.assertEquals('yy', planCursorKeys(5, 5, 3, 3))
+
+    def testLongMoves(self):
+        self.assertEquals(3, len(planCursorKeys(0, 0, 17, 0)))
+        self.assertEquals('N', planCursorKeys(2, 2, 10, 10))
+        self.assertEquals(2, len(planCursorKeys(0, 0, 7, 0)))
+
+    def testStaysOnTheMap(self):
+        # Overshooting with 'J' would be shorter, but it leaves the map
+        self.assertEquals('jjj', planCursorKeys(0, 17, 0, 20))
+        self.assertEquals('JJjjjj', planCursorKeys(0, 0, 0, 20))
+
+    def testJumps(self):
+        self.assertEquals('<', planCursorKeys(0, 0, 70, 18, {'<': (70, 18)}))
+        self.assertEquals('<h', planCursorKeys(0, 0, 69, 18, {'<': (70, 18)}))
+
+class TestExpandKeys(unittest.TestCase):
+    def testRanges(self):
+        self.assertEquals(list('def'), expandKeys('def'))
+        self.assertEquals(list('abcfxyz'), expandKeys('a-cfx-z'))
+        self.assertEquals(list('-$ab'), expandKeys('- $a-b'))
+
+class TestCursorPointInteraction(unittest.TestCase):
+    def testSingleWrite(self):
+        conn = RecordingConnection('\x1b[10;10H@\x1b[10;10H')
+        interaction = CursorPointInteraction(conn, 'Pick an object.')
+        interaction.answer(40, 8)
+        self.assertEquals(1, len(conn.sent))
+        self.assertEquals('LLLLh.', conn.sent[0])
+
+    def testStairs(self):
+        conn = RecordingConnection('\x1b[3;5H@\x1b[20;70H>\x1b[3;5H')
+        interaction = CursorPointInteraction(conn, 'Pick an object.', hero=(4, 1))
+        interaction.answer(69, 18)
+        self.assertEquals(['>.'], conn.sent)
+
+    def testMonster(self):
+        conn = RecordingConnection('\x1b[3;5H@\x1b[15;60Hd\x1b[3;5H')
+        interaction = CursorPointInteraction(conn, 'Pick an object.', hero=(4, 1))
+        interaction.answer(59, 13)
+        self.assertEquals(['m.'], conn.sent)
+        conn = RecordingConnection('\x1b[3;5H@\x1b[15;60Hd\x1b[3;5H')
+        interaction = CursorPointInteraction(conn, 'Pick an object.')
+        interaction.answer(59, 13)
+        self.assertNotEquals(['m.'], conn.sent)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestCursorPlanning))
+    suite.addTest(unittest.makeSuite(TestExpandKeys))
+    suite.addTest(unittest.makeSuite(TestCursorPointInteraction))
+    return suite
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import unittest
+
+sys.path.append('..')
+from nethack.connection import NetHackConnection
+from nethack.interactions import Information, SelectInteraction, YesNoInteraction, expandKeys
+from nethack.inventory import Inventory, guessCategory
+from nethack.items import Item
+from nethack.history import MessageHistory
+
+class TestInventory (unittest.TestCase):
+    def setUp(self):
+        self.server = NetHackConnection()
+        self.pack = Inventory(self.server)
+        self.pack.replace([Item('a', 'a blessed +1 quarterstaff (weapon in hands)', 'Weapons'),
+                           Item('b', 'an uncursed +0 cloak of magic resistance (being worn)', 'Armor'),
+                           Item('f', 'an uncursed potion of blindness', 'Potions'),
+                           Item('k', '2 uncursed scrolls of magic mapping', 'Scrolls')])
+
+    def say(self, *messages):
+        self.server.history.append(Information(self.server, list(messages)))
+
+    def testPickUp(self):
+        self.say('g - a bubbly potion.')
+        self.assertTrue(self.pack.current())
+        self.assertEquals('Potions', self.pack.get()['g'].category)
+        self.assertEquals(['f', 'g'], sorted(self.pack.get('Potions').keys()))
+
+    def testDrop(self):
+        self.say('You drop an uncursed potion of blindness.')
+        self.assertTrue(self.pack.current())
+        self.assertFalse(self.pack.get().has_key('f'))
+        self.say('You drop an uncursed scroll of magic mapping.')
+        self.assertFalse(self.pack.current())
+
+    def testWield(self):
+        self.say('c - a dagger (weapon in hand).')
+        self.assertTrue(self.pack.current())
+        self.assertFalse(self.pack.get()['a'].wielded())
+        self.assertEquals('Weapons', self.pack.get()['c'].category)
+
+    def testUsed(self):
+        self.pack.used(Item('f'))
+        self.assertFalse(self.pack.get().has_key('f'))
+        self.pack.used(Item('k'))
+        self.assertFalse(self.pack.current())
+
+    def testUsedIf(self):
+        question = 'What do you want to drink? [f or ?*]'
+        self.pack.usedIf(Item('f'), Information(self.server, ['Never mind.']), question)
+        self.assertTrue(self.pack.get().has_key('f'))
+        asked = SelectInteraction(self.server, question + ' ')
+        self.server.pendingInteraction = None
+        self.pack.usedIf(Item('f'), asked, asked.question)
+        self.assertTrue(self.pack.current())
+        self.assertTrue(self.pack.get().has_key('f'))
+        self.pack.usedIf(Item('f'), Information(self.server, ['This burns!']), question)
+        self.assertFalse(self.pack.get().has_key('f'))
+        self.pack.usedIf(Item('k'), YesNoInteraction(self.server, 'Really? [yn] (n)'), question)
+        self.assertFalse(self.pack.current())
+
+    def testUnknownKeys(self):
+        self.pack.checkKeys(['f', '-'])
+        self.assertTrue(self.pack.current())
+        self.pack.checkKeys(expandKeys('a-cf'))
+        self.assertFalse(self.pack.current())
+
+    def testCategories(self):
+        self.assertEquals('Armor', guessCategory('an uncursed +0 ring mail'))
+        self.assertEquals('Rings', guessCategory('a ruby ring'))
+        self.assertEquals(None, guessCategory('a dagger'))
+
+    def testMissedMessages(self):
+        self.server.history = MessageHistory(size=2)
+        self.pack.seen = 0
+        for i in range(3):
+            self.say('You hear some noises.')
+        self.assertFalse(self.pack.current())
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestInventory))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
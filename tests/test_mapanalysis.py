@@ -0,0 +1,73 @@
+import sys
+import unittest
+
+sys.path.append('..')
+import numpy
+from nethack.scraper import Screen
+from nethack.mapanalysis import MapView, neighbours, bestSite, H, W, MAYBE, YES, NO
+from nethack.pathfinding import PathFinder
+
+# A room with the hero at (12, 4), the down stairs at (15, 5) and an open
+# door at (16, 4).  Map rows start on the second row of the screen.
+ROOM = ('\x1b[4;11H-------'
+        '\x1b[5;11H|.....|'
+        '\x1b[6;11H|.@...\x1b[33m|\x1b[0m'
+        '\x1b[7;11H|....>|'
+        '\x1b[8;11H-------'
+        '\x1b[6;13H')
+
+class TestMapAnalysis (unittest.TestCase):
+    def setUp(self):
+        self.screen = Screen()
+        self.screen.printstr(ROOM)
+        self.view = MapView(self.screen)
+        self.reachable = numpy.zeros((H, W), dtype=numpy.uint8)
+        self.beenThere = numpy.zeros((H, W), dtype=numpy.bool_)
+        self.beenThere[4, 12] = True
+
+    def testViewsFollowTheScreen(self):
+        self.assertEquals(ord('@'), self.view.chars[4, 12])
+        self.screen.printstr('\x1b[6;13H.')
+        self.assertEquals(ord('.'), self.view.chars[4, 12])
+
+    def testNeighbours(self):
+        mask = neighbours(self.beenThere)
+        self.assertEquals(8, mask.sum())
+        self.assertFalse(mask[4, 12])
+
+    def testReachable(self):
+        self.view.updateReachable(self.reachable, self.beenThere)
+        self.assertEquals(YES, self.reachable[4, 13])
+        self.assertEquals(NO, self.reachable[2, 10])
+        self.assertEquals(YES, self.reachable[4, 16]) # The door
+        self.assertEquals(MAYBE, self.reachable[4, 17])
+        self.assertEquals(MAYBE, self.reachable[10, 40])
+
+    def testDecision(self):
+        self.view.updateReachable(self.reachable, self.beenThere)
+        interesting = self.view.interesting(self.reachable, self.beenThere)
+        self.assertEquals(2, interesting[5, 15])
+        self.assertEquals(1, interesting[4, 16])
+        paths = PathFinder(self.reachable == YES, self.view.doorways)
+        dist = paths.distances(4, 12)
+        self.assertEquals(3, dist[5, 15])
+        self.assertEquals(-1, dist[2, 10])
+        self.assertEquals((5, 15), tuple(bestSite(interesting, dist)))
+        self.assertEquals('SE', paths.firstStep(dist, 5, 15))
+
+    def testDoorways(self):
+        self.assertTrue(self.view.doorways[4, 16])
+        self.assertFalse(self.view.doorways[4, 10])
+        # A closed door is brown, a spellbook most often isn't
+        self.screen.printstr('\x1b[5;12H\x1b[33m+\x1b[0m\x1b[5;13H\x1b[35m+\x1b[0m')
+        view = MapView(self.screen)
+        self.assertTrue(view.doorways[3, 11])
+        self.assertFalse(view.doorways[3, 12])
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestMapAnalysis))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
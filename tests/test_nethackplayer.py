@@ -3,6 +3,40 @@ import unittest
 
 sys.path.append('..')
 from nethack.serialize import unserialize
+from nethack.nethack import NetHackPlayer
+from nethack.connection import NetHackConnection
+from nethack.interactions import Information
+
+class KeyLogChild(object):
+    """ Writes down what's sent, and lets watch time out right away """
+    def __init__(self):
+        self.sent = []
+        self.before = ''
+        self.after = ''
+    def expect(self, patterns, timeout):
+        return 1
+    def send(self, msg):
+        self.sent.append(msg)
+
+class MenuChild(KeyLogChild):
+    """ Shows a menu page every time it's asked for one """
+    def __init__(self, pages):
+        super(MenuChild, self).__init__()
+        self.pages = pages
+        self.output = []
+    def expect(self, patterns, timeout):
+        if self.output:
+            self.after = self.output.pop(0)
+            return len(patterns) - 1
+        return 1
+    def send(self, msg):
+        super(MenuChild, self).send(msg)
+        page = len([key for key in self.sent if key in 'i '])
+        if msg in 'i ' and page <= len(self.pages):
+            self.output.append('\x1b[H\x1b[2J' + self.pages[page - 1] +
+                               ' (%d of %d)' % (page, len(self.pages)))
+        else:
+            self.output.append('\x1b[H\x1b[2J\x1b[10;10H@')
 
 class TestBasicFunctions (unittest.TestCase):
     def setUp(self):
@@ -53,7 +87,7 @@ class TestBasicFunctions (unittest.TestCase):
         self.np.go('W')
         self.np.go('W')
         m = self.np.loot()
-        m = m.answer(m.options)
+        m = m.choose(lambda item: True)
         inv = self.np.inventory()
         self.assertEquals(16, len(inv))
 
@@ -61,13 +95,13 @@ class TestBasicFunctions (unittest.TestCase):
         self.np.go('W')
         self.np.go('W')
         m = self.np.loot()
-        m = m.answer(m.options)
+        m = m.choose(lambda item: True)
         m = self.np.loot()
         m = self.np.loot(takeOut=False)
-        self.assertEquals(16, len(m.options))
+        self.assertEquals(16, len(m.readOptions()))
         m.answer(m.options[-4:])
         m = self.np.loot()
-        self.assertEquals(4, len(m.options))
+        self.assertEquals(4, len(m.readOptions()))
         m.answerDefault()
 
     def testClothes(self):
@@ -109,8 +143,61 @@ class TestDrink (unittest.TestCase):
         self.np.quaff(drink)
         
 
+class TestCountedCommands (unittest.TestCase):
+    def setUp(self):
+        conn = NetHackConnection()
+        conn.child = KeyLogChild()
+        conn.screen.printstr('You stop searching.\x1b[10;10H')
+        self.np = NetHackPlayer(conn)
+    def testSearch(self):
+        info = self.np.search(20)
+        self.assertEquals(['20s'], self.np.server.child.sent)
+        self.assertTrue(isinstance(info, Information))
+        self.assertEquals(['You stop searching.'], info.message)
+    def testNumberPad(self):
+        self.np.numberPad = True
+        self.np.rest(5)
+        self.np.search()
+        self.assertEquals(['n5.', 's'], self.np.server.child.sent)
+    def testRuns(self):
+        self.np.go('E', 3)
+        self.np.goFar('NW')
+        self.np.rush('S')
+        self.assertEquals(['3l', 'Y', 'Gj'], self.np.server.child.sent)
+        self.assertRaises(ValueError, self.np.goFar, 'Down')
+    def testNumberPadRuns(self):
+        self.np.numberPad = True
+        self.np.go('E', 3)
+        self.np.goFar('NW')
+        self.np.rush('S')
+        self.np.fight('SE')
+        self.np.go('Down')
+        self.assertEquals(['n36', chr(0xb7), '52', 'F', '3', '>'], self.np.server.child.sent)
+
+class TestInventory (unittest.TestCase):
+    def setUp(self):
+        conn = NetHackConnection()
+        conn.child = MenuChild([' Weapons\r\n a - a dagger (weapon in hand)\r\n',
+                                ' Potions\r\n f - a bubbly potion\r\n',
+                                ' g - a murky potion\r\n'])
+        self.np = NetHackPlayer(conn)
+    def testAllPages(self):
+        inv = self.np.inventory()
+        self.assertEquals(['a', 'f', 'g'], sorted(inv.keys()))
+        self.assertEquals('Potions', inv['g'].category)
+        self.assertEquals(['i', ' ', ' ', ' '], self.np.server.child.sent)
+    def testCached(self):
+        self.np.inventory()
+        self.np.server.history.append(Information(self.np.server, ['h - a scroll labeled FOOBIE BLETCH.']))
+        inv = self.np.inventory('Scrolls')
+        self.assertEquals(['h'], inv.keys())
+        self.assertEquals(4, len(self.np.server.child.sent))
+        self.assertEquals((1, 1), (self.np.pack.hits, self.np.pack.misses))
+
 def suite():
     suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestCountedCommands))
+    suite.addTest(unittest.makeSuite(TestInventory))
     suite.addTest(unittest.makeSuite(TestBasicFunctions))
     suite.addTest(unittest.makeSuite(TestFood))
     suite.addTest(unittest.makeSuite(TestDrink))
@@ -0,0 +1,86 @@
+import sys
+import unittest
+
+sys.path.append('..')
+import numpy
+from nethack.scraper import Screen, ROWS, WIDTH
+from nethack.status import Status
+from nethack.observation import ObservationEncoder, statusVector, STATUS_FIELDS, \
+     STRENGTH, CHARISMA, ALIGNMENT, DUNGEON_LEVEL, HIT_POINTS, MAX_HIT_POINTS, \
+     ARMOUR_CLASS, EXPERIENCE, TURN, HUNGER, ENCUMBRANCE, CONDITIONS
+from test_replay import STATUS
+
+class TestStatusVector (unittest.TestCase):
+    def testLayout(self):
+        status = Status('Anthony the Stripling  St:18/50 Dx:13 Co:18 In:11 Wi:10 Ch:8  Chaotic',
+                        'Dlvl:3  $:10  HP:-1(16) Pw:2(2) AC:-2  Exp:1  T:900 Weak Burdened Conf Blind')
+        vector = statusVector(status)
+        self.assertEquals(len(STATUS_FIELDS), len(vector))
+        self.assertEquals(numpy.float32, vector.dtype)
+        self.assertAlmostEquals(18.5, vector[STRENGTH])
+        self.assertEquals(8, vector[CHARISMA])
+        self.assertEquals(2, vector[ALIGNMENT])
+        self.assertEquals(3, vector[DUNGEON_LEVEL])
+        self.assertEquals(-1, vector[HIT_POINTS])
+        self.assertEquals(-2, vector[ARMOUR_CLASS])
+        self.assertEquals(900, vector[TURN])
+        self.assertEquals(3, vector[HUNGER])
+        self.assertEquals(1, vector[ENCUMBRANCE])
+        self.assertEquals(1 + 16, vector[CONDITIONS])
+        self.assertTrue(numpy.isnan(vector[EXPERIENCE]))
+
+    def testBlank(self):
+        vector = statusVector(Status('', ''))
+        self.assertTrue(numpy.isnan(vector[HIT_POINTS]))
+        self.assertEquals(-1, vector[TURN])
+        self.assertEquals(0, vector[HUNGER])
+
+class TestObservationEncoder (unittest.TestCase):
+    def setUp(self):
+        self.screen = Screen()
+        self.screen.printstr('\x1b[2J\x1b[10;10H\x1b[1m\x1b[31m@\x1b[0m' + STATUS % 1 + '\x1b[10;10H')
+        self.encoder = ObservationEncoder(self.screen)
+
+    def testPlanes(self):
+        observation = self.encoder.encode()
+        self.assertEquals((4, ROWS, WIDTH), observation.planes.shape)
+        self.assertEquals(numpy.uint8, observation.planes.dtype)
+        self.assertEquals(ord('@'), observation.chars[9, 9])
+        self.assertEquals(ord('@'), observation.mapChars[8, 9])
+        self.assertEquals(1, observation.mapForeground[8, 9])
+        self.assertEquals(1, observation.mapBold[8, 9])
+        self.assertEquals(0, observation.mapInverse[8, 9])
+        self.assertEquals((21, 80), observation.mapChars.shape)
+        self.assertEquals((9, 9), observation.cursor)
+        self.assertEquals(16, observation.status[MAX_HIT_POINTS])
+
+    def testCopies(self):
+        observation = self.encoder.encode()
+        self.screen.printstr('.\x1b[24;1HDlvl:1  $:0  HP:9(16) Pw:2(2) AC:6  Exp:1  T:2')
+        self.assertEquals(ord('@'), observation.chars[9, 9])
+        self.assertEquals(16, observation.status[HIT_POINTS])
+        later = self.encoder.encode()
+        self.assertEquals(ord('.'), later.chars[9, 9])
+        self.assertEquals(9, later.status[HIT_POINTS])
+
+    def testZeroCopy(self):
+        observation = self.encoder.encode(copy=False)
+        self.screen.printstr('.')
+        self.assertEquals(ord('.'), observation.chars[9, 9])
+        self.assertRaises((ValueError, RuntimeError), observation.chars.__setitem__, (0, 0), 1)
+        self.assertTrue(self.encoder.encode(copy=False).status is observation.status)
+
+    def testStatusOnlyWhenChanged(self):
+        self.encoder.encode()
+        self.screen.printstr('\x1b[10;10H.')
+        self.encoder.encode()
+        self.assertEquals(1, self.encoder.reader.parses)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestStatusVector))
+    suite.addTest(unittest.makeSuite(TestObservationEncoder))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import sys
+import unittest
+
+sys.path.append('..')
+import numpy
+from nethack.pathfinding import PathFinder
+from nethack.mapanalysis import H, W
+
+def level(rows):
+    """ Returns the walkable and doorway masks for a map drawn with '.' for
+        floor and '+' for doorways, starting at the top left corner """
+    walkable = numpy.zeros((H, W), dtype=numpy.bool_)
+    doorways = numpy.zeros((H, W), dtype=numpy.bool_)
+    for y, row in enumerate(rows):
+        for x, char in enumerate(row):
+            walkable[y, x] = char in '.+'
+            doorways[y, x] = char == '+'
+    return walkable, doorways
+
+# Two rooms joined by a doorway at (4, 2)
+ROOMS = ['....    ',
+         '....    ',
+         '....+...',
+         '    ....',
+         '    ....']
+
+class TestPathFinder (unittest.TestCase):
+    def setUp(self):
+        self.walkable, self.doorways = level(ROOMS)
+        self.paths = PathFinder(self.walkable, self.doorways)
+
+    def testDoorways(self):
+        dist = self.paths.distances(1, 3)
+        # Without the doorway rule it would take two steps
+        self.assertEquals(3, dist[3, 5])
+        self.assertEquals('S', self.paths.firstStep(dist, 3, 5))
+        self.assertEquals(-1, dist[0, 7])
+        self.assertEquals(['S', 'E', 'E', 'SE'], self.paths.path(1, 3, 3, 6))
+
+    def testCached(self):
+        first = self.paths.distances(0, 0)
+        self.assertTrue(first is self.paths.distances(0, 0))
+        self.assertEquals(1, self.paths.computed)
+
+    def testOpening(self):
+        self.paths.distances(0, 0)
+        walkable, doorways = level(ROOMS[:2] + ['........'] + ROOMS[3:])
+        self.paths.update(walkable, doorways)
+        self.assertEquals((1, 1), (self.paths.computed, self.paths.corrected))
+        fresh = PathFinder(walkable, doorways).distances(0, 0)
+        self.assertTrue((fresh == self.paths.distances(0, 0)).all())
+
+    def testDoorwayGone(self):
+        # Standing in the doorway, when the door turns out to be broken
+        self.paths.distances(2, 4)
+        walkable, doorways = level(ROOMS[:2] + ['........'] + ROOMS[3:])
+        self.paths.update(walkable, doorways)
+        dist = self.paths.distances(2, 4)
+        self.assertEquals(1, self.paths.computed)
+        self.assertEquals(1, dist[3, 5])
+        self.assertTrue((PathFinder(walkable, doorways).distances(2, 4) == dist).all())
+
+    def testNoWayBack(self):
+        # A field that doesn't match the level any more
+        dist = numpy.array(self.paths.distances(0, 0))
+        dist[4, 7] = 2
+        self.assertEquals(None, self.paths.firstStep(dist, 4, 7))
+
+    def testClosing(self):
+        self.paths.distances(0, 0)
+        walkable, doorways = level(ROOMS[:2] + ['...     '] + ROOMS[3:])
+        self.paths.update(walkable, doorways)
+        self.assertEquals(-1, self.paths.distances(0, 0)[3, 5])
+        self.assertEquals(2, self.paths.computed)
+
+    def testCosts(self):
+        cost = numpy.ones((H, W))
+        cost[1, 1] = cost[1, 2] = 10
+        dist = self.paths.dijkstra(0, 0, cost)
+        self.assertEquals(3, dist[2, 2])
+        self.assertEquals(numpy.inf, dist[0, 7])
+        self.assertEquals(3, len(self.paths.path(0, 0, 2, 2, cost)))
+        self.assertEquals(None, self.paths.path(0, 0, 0, 7))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestPathFinder))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
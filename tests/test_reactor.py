@@ -0,0 +1,130 @@
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.append('..')
+import pexpect
+from nethack.reactor import Reactor, ReactorChild, ReactorNetHackConnection, Pending
+from nethack.nethack import NetHackPlayer
+from nethack.interactions import FreeEntryInteraction
+from test_replay import STATUS
+
+SCREEN = '\x1b[2J\x1b[10;10H@' + STATUS % 1 + '\x1b[10;10H'
+
+class FakeGame (object):
+    """ A script that draws a screen, then waits for a while like a game would.
+        With a 'question', it asks that first, and waits for a line. """
+    def __init__ (self, question=None):
+        self.filenames = []
+        command = 'cat %s; sleep 5' % self.write(SCREEN)
+        if not question is None:
+            command = 'cat %s; read line; %s' % (self.write(question), command)
+        self.command = "/bin/sh -c '%s'" % command
+    def write (self, output):
+        handle, filename = tempfile.mkstemp()
+        os.write(handle, output)
+        os.close(handle)
+        self.filenames.append(filename)
+        return filename
+    def remove (self):
+        for filename in self.filenames:
+            os.remove(filename)
+
+class TestReactorChild (unittest.TestCase):
+    def setUp(self):
+        self.reactor = Reactor().start()
+    def tearDown(self):
+        self.reactor.stop()
+
+    def testExpect(self):
+        child = ReactorChild(self.reactor, '/bin/cat')
+        child.sendline('hello')
+        self.assertEquals(0, child.expect(['hello\r\nhello', pexpect.TIMEOUT], timeout=5))
+        self.assertEquals(1, child.expect(['goodbye', pexpect.TIMEOUT], timeout=0.1))
+        self.assertRaises(pexpect.TIMEOUT, child.expect, 'goodbye', 0.1)
+        child.close()
+
+    def testEOF(self):
+        child = ReactorChild(self.reactor, '/bin/echo hi')
+        self.assertEquals(1, child.expect(['bye', pexpect.EOF], timeout=5))
+        self.assertEquals('hi', child.before.strip())
+        self.assertTrue(child.flag_eof)
+
+class TestReactorConnection (unittest.TestCase):
+    def setUp(self):
+        self.game = FakeGame()
+    def tearDown(self):
+        self.game.remove()
+
+    def testBlockingAPI(self):
+        reactor = Reactor().start()
+        conn = ReactorNetHackConnection(reactor=reactor, command=self.game.command)
+        np = NetHackPlayer(conn)
+        np.watch()
+        self.assertEquals(1, np.turn())
+        self.assertEquals((9, 8), (np.x(), np.y()))
+        conn.child.close()
+        reactor.stop()
+
+    def testManyGamesOnOneThread(self):
+        reactor = Reactor()
+        conns = [ReactorNetHackConnection(reactor=reactor, command=self.game.command)
+                 for i in range(20)]
+        results = []
+        def bot (conn):
+            yield conn.watchLater()
+            answer = yield conn.later(lambda: 42)
+            results.append((NetHackPlayer(conn).turn(), answer))
+        for pending in [reactor.spawn(bot(conn)) for conn in conns]:
+            reactor.runUntil(pending)
+        self.assertEquals([(1, 42)] * 20, results)
+        for conn in conns:
+            self.assertEquals('@', conn.cellAt(9, 9).char)
+            conn.child.close()
+
+    def testAnswerOnTheReactor(self):
+        game = FakeGame('\x1b[2J\x1b[HWhat do you want to name it? ')
+        reactor = Reactor()
+        conn = ReactorNetHackConnection(reactor=reactor, command=game.command)
+        results = []
+        def bot ():
+            asked = yield conn.watchLater()
+            results.append(asked.__class__)
+            yield conn.answerLater(asked, 'Bob')
+            results.append(conn.cellAt(9, 9).char)
+        reactor.runUntil(reactor.spawn(bot()))
+        self.assertEquals([FreeEntryInteraction, '@'], results)
+        self.assertEquals([], reactor.workers)
+        self.assertEquals(None, conn.pendingInteraction)
+        conn.child.close()
+        game.remove()
+
+    def testWorkersAreReused(self):
+        reactor = Reactor()
+        def bot ():
+            for i in range(10):
+                yield reactor.inThread(int, '7')
+        reactor.runUntil(reactor.spawn(bot()))
+        self.assertEquals(1, len(reactor.workers))
+
+    def testErrorsReachTheBot(self):
+        reactor = Reactor()
+        def bot ():
+            try:
+                yield reactor.inThread(int, 'zork')
+            except ValueError:
+                yield reactor.inThread(int, '7')
+        self.assertEquals(None, reactor.runUntil(reactor.spawn(bot())))
+        failing = Pending()
+        failing.fail(ValueError('zork'))
+        self.assertRaises(ValueError, failing.result)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestReactorChild))
+    suite.addTest(unittest.makeSuite(TestReactorConnection))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
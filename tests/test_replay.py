@@ -0,0 +1,107 @@
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.append('..')
+import pexpect
+from nethack.replay import Recording, ReplayNetHackConnection, ReplayMismatch, load, READ, SENT, ENDED
+from nethack.nethack import NetHackPlayer
+from nethack.interactions import Information, YesNoQuitInteraction
+
+STATUS = ('\x1b[23;1HAnthony the Stripling  St:15 Dx:13 Co:18 In:11 Wi:10 Ch:8  Lawful'
+          '\x1b[24;1HDlvl:1  $:0  HP:16(16) Pw:2(2) AC:6  Exp:1  T:%d')
+
+def recordedGame():
+    """ A short game: the hero walks east twice, then is asked a question """
+    recording = Recording()
+    recording.add(READ, '\x1b[2J\x1b[10;10H@' + STATUS % 1 + '\x1b[10;10H')
+    recording.add(SENT, 'l')
+    recording.add(READ, '\x1b[10;10H.@' + STATUS % 2 + '\x1b[10;11H')
+    recording.add(SENT, 'l')
+    recording.add(READ, '\x1b[HYou see here a lichen corpse.')
+    recording.add(READ, '\x1b[10;11H.@' + STATUS % 3 + '\x1b[10;12H')
+    recording.add(SENT, 'e')
+    recording.add(READ, '\x1b[HThere is a lichen corpse here; eat it? [ynq] (n) ')
+    return recording
+
+class TestReplay (unittest.TestCase):
+    def testPlayBack(self):
+        np = NetHackPlayer(ReplayNetHackConnection(recordedGame()))
+        np.watch()
+        self.assertEquals(1, np.turn())
+        self.assertEquals(None, np.go('E'))
+        self.assertEquals(2, np.turn())
+        info = np.go('E')
+        self.assertTrue(isinstance(info, Information))
+        self.assertEquals(['You see here a lichen corpse.'], info.message)
+        self.assertEquals((11, 8), (np.x(), np.y()))
+        np.send('e')
+        self.assertTrue(isinstance(np.watch(), YesNoQuitInteraction))
+        self.assertTrue(np.server.child.finished())
+
+    def testEnded(self):
+        recording = recordedGame()
+        recording.add(ENDED, '')
+        conn = ReplayNetHackConnection(recording)
+        conn.watch()
+        conn.send('lle')
+        self.assertEquals(2, conn.child.expect(['--More--', pexpect.TIMEOUT, pexpect.EOF]))
+
+    def testMismatch(self):
+        np = NetHackPlayer(ReplayNetHackConnection(recordedGame()))
+        np.watch()
+        self.assertRaises(ReplayMismatch, np.go, 'W')
+
+    def testInteract(self):
+        recording = recordedGame()
+        recording.add(ENDED, '')
+        conn = ReplayNetHackConnection(recording)
+        conn.watch()
+        showing, conn.child.STDOUT_FILENO = os.pipe()
+        conn.child.interact()
+        os.close(conn.child.STDOUT_FILENO)
+        shown = os.read(showing, 4096)
+        os.close(showing)
+        self.assertTrue(shown.startswith('\x1b[10;10H.@'), repr(shown))
+        self.assertTrue(shown.endswith('eat it? [ynq] (n) '))
+        self.assertTrue(conn.child.finished())
+        self.assertTrue(conn.child.flag_eof)
+
+    def testSplitKeys(self):
+        recording = Recording()
+        recording.add(SENT, '#pray')
+        recording.add(SENT, '\n')
+        conn = ReplayNetHackConnection(recording)
+        conn.send('#pr')
+        conn.sendline('ay')
+        self.assertTrue(conn.child.finished())
+
+    def testSaveAndLoad(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            recordedGame().save(filename)
+            recording = load(filename)
+        finally:
+            os.remove(filename)
+        self.assertEquals('lle', recording.keys())
+        self.assertEquals(recordedGame().output(), recording.output())
+
+    def testTapsAPexpectChild(self):
+        recording = Recording()
+        child = pexpect.spawn('/bin/cat')
+        recording.attach(child)
+        child.sendline('hello')
+        child.expect('hello\r\nhello')
+        child.close()
+        self.assertEquals('hello\n', recording.keys())
+        self.assertTrue(recording.output().startswith('hello'))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestReplay))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.append('..')
+import pexpect
+from nethack.runner import Runner, FINISHED, EOF, CRASHED
+from nethack.replay import ReplayNetHackConnection
+from nethack.nethack import NetHackPlayer
+from test_replay import recordedGame
+
+def replayFactory (username):
+    """ A game that needs no nethack binary """
+    return ReplayNetHackConnection(recordedGame())
+
+class Walker (NetHackPlayer):
+    def play (self):
+        self.watch()
+    def run (self):
+        self.go('E')
+        self.go('E')
+
+class Crasher (Walker):
+    def run (self):
+        raise ValueError, "I'm lost :("
+
+class Hungup (Walker):
+    def run (self):
+        raise pexpect.EOF, "The game went away"
+
+class WorkerKiller (Walker):
+    """ Kills the whole worker process the first time it plays """
+    flagFile = None
+    def run (self):
+        if not os.path.exists(self.flagFile):
+            open(self.flagFile, 'w').close()
+            os._exit(1)
+        Walker.run(self)
+
+class TestRunner (unittest.TestCase):
+    def play (self, playerClass, games, cores=2, botsPerCore=2):
+        runner = Runner(playerClass, games=games, cores=cores, botsPerCore=botsPerCore,
+                        connectionFactory=replayFactory)
+        runner.pollInterval = 0.05
+        return runner, list(runner.results())
+
+    def testPlaysAllTheGames(self):
+        runner, results = self.play(Walker, 7)
+        self.assertEquals(7, len(results))
+        self.assertEquals([FINISHED] * 7, [r.outcome for r in results])
+        self.assertEquals([3] * 7, [r.turns for r in results])
+        self.assertEquals(7, runner.played())
+        self.assertTrue(runner.gamesPerHour() > 0)
+
+    def testUniqueUsernames(self):
+        runner, results = self.play(Walker, 20)
+        usernames = set([r.username for r in results])
+        self.assertTrue(len(usernames) <= 4)
+        for r in results:
+            self.assertEquals('bot%dx%d' % (r.worker, r.slot), r.username)
+
+    def testCrashesAreReportedAndSlotsGoOn(self):
+        runner, results = self.play(Crasher, 5)
+        self.assertEquals([CRASHED] * 5, [r.outcome for r in results])
+        self.assertTrue("I'm lost" in results[0].error)
+        runner, results = self.play(Hungup, 3)
+        self.assertEquals([EOF] * 3, [r.outcome for r in results])
+
+    def testDeadWorkersAreRestarted(self):
+        handle, WorkerKiller.flagFile = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(WorkerKiller.flagFile)
+        try:
+            runner, results = self.play(WorkerKiller, 4, cores=1, botsPerCore=1)
+        finally:
+            os.remove(WorkerKiller.flagFile)
+        self.assertEquals(1, runner.restarts)
+        self.assertEquals([FINISHED] * 4, [r.outcome for r in results])
+
+    def testReport(self):
+        runner, results = self.play(Crasher, 2, cores=1)
+        self.assertTrue(runner.report().startswith('2 games (0 finished, 0 EOF, 2 crashed, 0 worker restarts)'))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestRunner))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
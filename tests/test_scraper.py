@@ -1,9 +1,11 @@
 import unittest
 import sys
 import re
+import pickle
+from array import array
 sys.path.append('..')
 
-from nethack.scraper import WIDTH, HEIGHT, Screen
+from nethack.scraper import WIDTH, HEIGHT, Screen, Cell
 
 class TestScraper(unittest.TestCase):
     def test_init(self):
@@ -142,14 +144,140 @@ class TestScraper(unittest.TestCase):
         sc.printstr('\x1b[?1049l')
         sc.printstr('\x1b[1049l')
 
+    def test_printstrWrap(self):
+        sc = Screen()
+        sc.printstr('\x1b[24;1H' + 'x' * 85)
+        self.assertEquals(sc.getRow(23), 'x' * WIDTH)
+        self.assertEquals(sc.cursorY, 23)
+        self.assertEquals(sc.cursorX, 5)
+        sc.printstr('\x1b[H' + 'y' * 85)
+        self.assertEquals(sc.getRow(1), 'y' * 5 + ' ' * (WIDTH - 5))
+        self.assertEquals(sc.cursorY, 1)
+        self.assertEquals(sc.cursorX, 5)
+
+    def test_printstrAttributes(self):
+        sc = Screen()
+        sc.printstr('a\x1b[1m\x1b[31mb\x1b[7mc\x1b[md\r\ne')
+        self.assertEquals(sc.getRow(0, finish=4), 'abcd')
+        self.assertEquals(sc.getRow(1, finish=1), 'e')
+        cells = sc.screen[0]
+        self.assertEquals([c.bold for c in cells[:4]], [False, True, True, False])
+        self.assertEquals([c.inverse for c in cells[:4]], [False, False, True, False])
+        self.assertEquals([c.foreground for c in cells[:4]], [9, 1, 1, 9])
+
+    def test_printstrSplitEscape(self):
+        sc = Screen()
+        sc.printstr('ab\x1b[1')
+        self.assertEquals(sc.cursorX, 2)
+        sc.printstr('0;5Hc\x1b')
+        self.assertEquals(sc.getRow(9, finish=5), '    c')
+        sc.printstr('[H')
+        self.assertEquals(sc.cursorY, 0)
+        self.assertEquals(sc.cursorX, 0)
+
+    def test_unhandledEscape(self):
+        sc = Screen()
+        self.assertRaises(ValueError, sc.printstr, '\x1b[5X')
+
+    def test_cellAt(self):
+        sc = Screen()
+        sc.printstr('\x1b[3;5H\x1b[1m\x1b[33m+\x1b[m')
+        cell = sc.cellAt(4, 2)
+        self.assertEquals(cell.char, '+')
+        self.assertEquals(cell.bold, True)
+        self.assertEquals(cell.foreground, 3)
+        self.assertEquals(str(cell), '\x1b[1m\x1b[33m+\x1b[m')
+        sc.printstr('\x1b[3;5H.')
+        self.assertEquals(cell.char, '.')
+        self.assertEquals(cell.foreground, 9)
+        sc.screen[2][4] = Cell('#')
+        self.assertEquals(sc.getRow(2, start=4, finish=5), '#')
+        self.assertRaises(IndexError, sc.cellAt, WIDTH, 0)
+
+    def test_getArea(self):
+        sc = Screen()
+        sc.printstr('\x1b[2;1Habcdef\x1b[3;1Hghijkl')
+        self.assertEquals(sc.getArea(1, 1, 3, 2), ['bcd', 'hij'])
+        self.assertEquals(sc.getRow(1, start=2, finish=4), 'cd')
+        self.assertEquals(sc.getRow(1, start=-78, finish=3), 'c')
+
+    def test_pickle(self):
+        sc = Screen()
+        sc.printstr('\x1b[5;3H\x1b[7mHello\x1b[m')
+        copy = pickle.loads(pickle.dumps(sc))
+        self.assertEquals(copy.getArea(), sc.getArea())
+        self.assertEquals(copy.cellAt(2, 4).inverse, True)
+        copy.printstr('\x1b[H!')
+        self.assertEquals(copy.getRow(0, finish=1), '!')
+
     def test_matchMultiSelectMarker (self):
         sc = Screen()
         sc.printstr('\x1b[24;1H (1 of 2) ')
         self.assertTrue (sc.matches (r'\(end\) |\(\d of \d\) '))
 
+class TestVersions(unittest.TestCase):
+    def testChangedSince(self):
+        sc = Screen()
+        sc.printstr('\x1b[3;5Hab')
+        first = sc.version
+        self.assertEquals([2], sc.changedSince(0))
+        self.assertEquals([(4, 2), (5, 2)], sc.cellsChangedSince(0))
+        sc.printstr('\x1b[10;1Hx\x1b[11;80Hy')
+        self.assertEquals([9, 10], sc.changedSince(first))
+        self.assertEquals([(0, 9), (79, 10)], sc.cellsChangedSince(first))
+        self.assertEquals([2, 9, 10], sc.changedSince(0))
+
+    def testCursorMovesChangeNothing(self):
+        sc = Screen()
+        sc.printstr('abc')
+        version = sc.version
+        sc.printstr('\x1b[5;5H\x1b[1m')
+        self.assertTrue(sc.version > version)
+        self.assertEquals([], sc.changedSince(version))
+
+    def testErase(self):
+        sc = Screen()
+        sc.printstr('abc')
+        version = sc.version
+        sc.printstr('\x1b[2;70H\x1b[K')
+        self.assertEquals([1], sc.changedSince(version))
+        self.assertEquals(11, len(sc.cellsChangedSince(version)))
+        sc.printstr('\x1b[2J')
+        self.assertEquals(range(25), sc.changedSince(version))
+
+    def testCellViews(self):
+        sc = Screen()
+        version = sc.version
+        sc.cellAt(3, 4).char = 'x'
+        self.assertEquals([(3, 4)], sc.cellsChangedSince(version))
+        version = sc.version
+        sc.screen[5][6] = Cell('y')
+        self.assertEquals([(6, 5)], sc.cellsChangedSince(version))
+
+    def testPickle(self):
+        sc = Screen()
+        sc.printstr('\x1b[3;5Hab')
+        copy = pickle.loads(pickle.dumps(sc))
+        self.assertEquals(sc.version, copy.version)
+        self.assertEquals([(4, 2), (5, 2)], copy.cellsChangedSince(0))
+        self.assertEquals('I', copy.cellVersions.typecode)
+        self.assertFalse('stamp' in sc.__getstate__())
+        copy.printstr('c')
+        self.assertEquals([(6, 2)], copy.cellsChangedSince(sc.version))
+
+    def testPickledLongVersions(self):
+        sc = Screen()
+        sc.printstr('\x1b[3;5Hab')
+        sc.rowVersions = array('l', sc.rowVersions)
+        sc.cellVersions = array('l', sc.cellVersions)
+        copy = pickle.loads(pickle.dumps(sc))
+        self.assertEquals('I', copy.cellVersions.typecode)
+        self.assertEquals([(4, 2), (5, 2)], copy.cellsChangedSince(0))
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestScraper))
+    suite.addTest(unittest.makeSuite(TestVersions))
     return suite
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+import sys
+import unittest
+
+sys.path.append('..')
+from nethack.scraper import Screen
+from nethack.status import Status, StatusReader
+
+TOP = 'Anthony the Stripling  St:18/** Dx:13 Co:18 In:11 Wi:10 Ch:8  Lawful'
+BOTTOM = 'Dlvl:3  $:42  HP:16(20) Pw:2(7) AC:-1  Xp:2/25 T:1234  Satiated Burdened Conf Blind'
+
+class TestStatus (unittest.TestCase):
+    def testParse(self):
+        status = Status(TOP, BOTTOM)
+        self.assertEquals(19.0, status.strength)
+        self.assertEquals(8, status.charisma)
+        self.assertEquals('Lawful', status.alignment)
+        self.assertEquals((3, 42, 16, 20, 2, 7, -1),
+                          (status.dungeonLevel, status.gold, status.hitPoints, status.maxHitPoints,
+                           status.power, status.maxPower, status.armourClass))
+        self.assertEquals((2, 25, 1234), (status.experienceLevel, status.experience, status.turn))
+        self.assertEquals('Satiated', status.hunger)
+        self.assertEquals('Burdened', status.encumbrance)
+        self.assertEquals(('Conf', 'Blind'), status.conditions)
+
+    def testDefaults(self):
+        status = Status(TOP.replace('18/**', '18/25'), 'Dlvl:1  $:0  HP:16(16) Pw:2(2) AC:6  Exp:1')
+        self.assertEquals(18.25, status.strength)
+        self.assertEquals(1, status.experienceLevel)
+        self.assertEquals(None, status.experience)
+        self.assertEquals(-1, status.turn)
+        self.assertEquals('Not Hungry', status.hunger)
+        self.assertEquals('Unencumbered', status.encumbrance)
+        self.assertEquals((), status.conditions)
+
+    def testReadOnlyOnChange(self):
+        screen = Screen()
+        screen.printstr('\x1b[23;1H' + TOP + '\x1b[24;1H' + BOTTOM)
+        reader = StatusReader()
+        first = reader.read(screen)
+        screen.printstr('\x1b[10;10H@')
+        self.assertTrue(first is reader.read(screen))
+        screen.printstr('\x1b[24;18H15')
+        self.assertEquals(15, reader.read(screen).hitPoints)
+        self.assertEquals(2, reader.parses)
+        screen.printstr('\x1b[24;18H15')
+        self.assertEquals(15, reader.read(screen).hitPoints)
+        self.assertEquals(2, reader.parses)
+        other = Screen()
+        other.printstr('\x1b[23;1H' + TOP + '\x1b[24;1H' + BOTTOM)
+        self.assertEquals(first.hitPoints, reader.read(other).hitPoints)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestStatus))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
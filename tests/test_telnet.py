@@ -0,0 +1,185 @@
+import sys
+import os
+import socket
+import threading
+import unittest
+
+sys.path.append('..')
+import pexpect
+from telnetlib import IAC, DO, WILL, SB, SE, ECHO, SGA, TTYPE, NAWS
+from nethack.telnet import TelnetChild, address, IS, SEND
+from nethack.connection import RemoteNetHackConnection
+from nethack.nethack import NetHackPlayer
+from test_replay import STATUS
+
+SCREEN = '\x1b[2J\x1b[10;10H@' + STATUS % 1 + '\x1b[10;10H'
+
+def menu (options, firstRow, promptRow, title=''):
+    """ A dgamelaunch screen, with 'options' from 'firstRow' on and a prompt
+        on 'promptRow' (rows counted from 0) """
+    result = '\x1b[2J\x1b[1;1H' + title
+    for row, (key, label) in enumerate(options):
+        result += '\x1b[%d;2H%s) %s' % (firstRow + row + 1, key, label)
+    return result + '\x1b[%d;1H=> ' % (promptRow + 1)
+
+class StandInServer (threading.Thread):
+    """ A telnet server on localhost that negotiates the way dgamelaunch does,
+        and then follows 'script': waits for each set of keys, and sends the
+        output that goes with them.  Then it hangs up. """
+    def __init__ (self, script):
+        super (StandInServer, self).__init__()
+        self.daemon = True
+        self.script = script
+        self.received = ''
+        self.seen = 0
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        self.start()
+
+    def waitFor (self, conn, data):
+        while not data in self.received[self.seen:]:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return
+            self.received += chunk
+        self.seen = self.received.index(data, self.seen) + len(data)
+
+    def run (self):
+        conn, peer = self.listener.accept()
+        try:
+            conn.sendall(IAC + DO + NAWS + IAC + DO + TTYPE + IAC + WILL + ECHO + IAC + WILL + SGA)
+            self.waitFor(conn, IAC + SB + NAWS)
+            conn.sendall(IAC + SB + TTYPE + SEND + IAC + SE)
+            self.waitFor(conn, TTYPE + IS)
+            for keys, output in self.script:
+                self.waitFor(conn, keys)
+                conn.sendall(output)
+        except socket.error:
+            pass # The client hung up
+        conn.close()
+        self.listener.close()
+
+class TestTelnetChild (unittest.TestCase):
+    def testNegotiation(self):
+        server = StandInServer([('', 'Hello\r\n' + IAC + IAC + 'x')])
+        child = TelnetChild('127.0.0.1', server.port)
+        self.assertEquals(0, child.expect(['x', pexpect.EOF], timeout=5))
+        self.assertEquals('Hello\r\n' + IAC, child.before)
+        self.assertEquals(1, child.expect(['x', pexpect.EOF], timeout=5))
+        server.join()
+        self.assertTrue(IAC + WILL + NAWS in server.received)
+        self.assertTrue(IAC + SB + NAWS + '\x00\x50\x00\x18' + IAC + SE in server.received)
+        self.assertTrue(IAC + SB + TTYPE + IS + 'xterm' + IAC + SE in server.received)
+        self.assertTrue(IAC + DO + ECHO in server.received)
+        self.assertEquals(1, server.received.count(IAC + DO + ECHO))
+
+    def testNoDelay(self):
+        server = StandInServer([])
+        child = TelnetChild('127.0.0.1', server.port)
+        self.assertNotEquals(0, child.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        child.close()
+
+    def testCommandsSplitAcrossReads(self):
+        server = StandInServer([])
+        child = TelnetChild('127.0.0.1', server.port)
+        self.assertEquals('ab', child.process('ab' + IAC))
+        self.assertEquals(IAC + 'c', child.process(IAC + 'c' + IAC + SB + TTYPE))
+        self.assertEquals('d', child.process(SEND + IAC + SE + 'd'))
+        child.close()
+
+    def testTimeout(self):
+        server = StandInServer([('never', '')])
+        child = TelnetChild('127.0.0.1', server.port)
+        self.assertEquals(1, child.expect(['@', pexpect.TIMEOUT], timeout=0.2))
+        self.assertRaises(pexpect.TIMEOUT, child.expect, '@', 0.1)
+        child.close()
+
+    def testBareCarriageReturn(self):
+        server = StandInServer([('', 'Hello'), ('ok', '')])
+        child = TelnetChild('127.0.0.1', server.port)
+        child.expect('Hello', timeout=5)
+        child.send('\r')
+        child.sendline('ok')
+        self.assertEquals(0, child.expect([pexpect.EOF], timeout=5))
+        server.join()
+        self.assertTrue('\r\0ok\r\n' in server.received, repr(server.received))
+        child.close()
+
+    def interactWith (self, child, keys):
+        """ Runs 'child.interact()', typing 'keys' once 'Hello' shows, and
+            returns what it showed """
+        stdin, typing = os.pipe()
+        showing, stdout = os.pipe()
+        child.STDIN_FILENO, child.STDOUT_FILENO = stdin, stdout
+        shown = []
+        def typist ():
+            typed = False
+            while True:
+                data = os.read(showing, 4096)
+                if not data:
+                    return
+                shown.append(data)
+                if not typed and 'Hello' in ''.join(shown):
+                    os.write(typing, keys)
+                    typed = True
+        thread = threading.Thread(target=typist)
+        thread.start()
+        child.interact()
+        os.close(stdout)
+        thread.join()
+        for fd in [stdin, typing, showing]:
+            os.close(fd)
+        return ''.join(shown)
+
+    def testInteract(self):
+        server = StandInServer([('', 'Hello' + IAC + IAC), ('p\r\0', SCREEN)])
+        child = TelnetChild('127.0.0.1', server.port)
+        shown = self.interactWith(child, 'p\r')
+        server.join()
+        self.assertEquals('Hello' + IAC + SCREEN, shown)
+        child.close()
+
+    def testInteractEscape(self):
+        server = StandInServer([('', 'Hello'), ('ab', 'done')])
+        child = TelnetChild('127.0.0.1', server.port)
+        self.assertEquals('Hello', self.interactWith(child, 'ab' + chr(29) + 'c'))
+        self.assertEquals(0, child.expect(['done', pexpect.EOF], timeout=5))
+        server.join()
+        self.assertFalse('c' in server.received[server.received.index('ab'):])
+        child.close()
+
+    def testAddress(self):
+        self.assertEquals(('nethack.alt.org', 23), address('nethack.alt.org'))
+        self.assertEquals(('localhost', 2323), address('localhost:2323'))
+        self.assertEquals(('localhost', 2323), address('localhost 2323'))
+
+class TestRemoteConnection (unittest.TestCase):
+    def testLoginAndPlay(self):
+        welcome = menu([('l', 'Login'), ('r', 'Register new user'),
+                        ('w', 'Watch games in progress'), ('q', 'Quit')], 6, 12,
+                       'dgamelaunch stand-in')
+        play = menu([('c', 'Change password'), ('o', 'Edit options file'),
+                     ('w', 'Watch games in progress'), ('p', 'Play nethack!'),
+                     ('q', 'Quit')], 13, 20, 'Logged in as: bot')
+        server = StandInServer([('', welcome),
+                                ('l', menu([], 0, 5, 'Please enter your username.')),
+                                ('bot\r\n', menu([], 0, 5, 'Please enter your password.')),
+                                ('secret\r\n', play),
+                                ('p', SCREEN)])
+        conn = RemoteNetHackConnection('bot', 'secret', '127.0.0.1:%d' % server.port)
+        np = NetHackPlayer(conn)
+        np.watch()
+        self.assertEquals(1, np.turn())
+        self.assertEquals('@', conn.cellAt(9, 9).char)
+        conn.child.close()
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestTelnetChild))
+    suite.addTest(unittest.makeSuite(TestRemoteConnection))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
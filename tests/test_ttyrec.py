@@ -0,0 +1,326 @@
+import sys
+import os
+import time
+import gzip
+import zlib
+import pickle
+import gc
+import tempfile
+import logging
+import subprocess
+import unittest
+
+sys.path.append('..')
+from nethack.ttyrec import TtyrecWriter, TtyrecReader, HEADER, GZIP, ZLIB, INDEX_SUFFIX, loadIndex
+from nethack.replay import ReplayNetHackConnection
+from nethack.nethack import NetHackPlayer
+from test_replay import recordedGame, STATUS
+
+class FullDisk (object):
+    """ A file that can't be written to """
+    def write (self, data):
+        raise IOError, "No space left on device"
+    def flush (self):
+        pass
+    def close (self):
+        pass
+
+class LogCounter (logging.Handler):
+    """ Counts the records that are logged """
+    def __init__ (self):
+        logging.Handler.__init__(self)
+        self.records = []
+    def emit (self, record):
+        self.records.append(record)
+
+def frames (data):
+    """ The (seconds, microseconds, output) frames in a ttyrec's 'data' """
+    result = []
+    offset = 0
+    while offset < len(data):
+        seconds, useconds, length = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        result.append((seconds, useconds, data[offset:offset + length]))
+        offset += length
+    return result
+
+class TestTtyrecWriter (unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.ttyrec')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def testFrames(self):
+        writer = TtyrecWriter(self.filename)
+        writer.write('\x1b[2J@', 1200000000.25)
+        writer.write('') # Nothing was read, so no frame
+        writer.write('.@', 1200000001.5)
+        writer.close()
+        self.assertEquals(2, writer.frames)
+        self.assertEquals([(1200000000, 250000, '\x1b[2J@'), (1200000001, 500000, '.@')],
+                          frames(open(self.filename, 'rb').read()))
+
+    def testGzip(self):
+        writer = TtyrecWriter(self.filename, compression=GZIP)
+        writer.write('You see here a lichen corpse.', 10.0)
+        writer.close()
+        self.assertEquals([(10, 0, 'You see here a lichen corpse.')],
+                          frames(gzip.open(self.filename).read()))
+
+    def testZlib(self):
+        writer = TtyrecWriter(self.filename, compression=ZLIB)
+        writer.write('--More--', 10.0)
+        writer.flush()
+        writer.write('\x1b[H\x1b[K', 11.0)
+        writer.close()
+        data = zlib.decompress(open(self.filename, 'rb').read())
+        self.assertEquals([(10, 0, '--More--'), (11, 0, '\x1b[H\x1b[K')], frames(data))
+
+    def testFlushesInTheBackground(self):
+        writer = TtyrecWriter(self.filename, bufferSize=100, interval=10)
+        writer.write('x' * 10)
+        time.sleep(0.1)
+        self.assertEquals(0, os.path.getsize(self.filename))
+        writer.write('x' * 100)
+        deadline = time.time() + 5
+        while os.path.getsize(self.filename) == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEquals(2 * HEADER.size + 110, os.path.getsize(self.filename))
+        writer.close()
+
+    def testClosed(self):
+        writer = TtyrecWriter(self.filename)
+        writer.close()
+        writer.close()
+        self.assertRaises(ValueError, writer.write, 'x')
+
+    def testCollected(self):
+        writer = TtyrecWriter(self.filename, interval=60)
+        writer.write('@', 10.0)
+        thread = writer.thread
+        del writer
+        gc.collect()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEquals([(10, 0, '@')], frames(open(self.filename, 'rb').read()))
+
+    def testDrainedAtExit(self):
+        # The writer is never closed, and the interval is much longer than the program
+        script = ("import sys; sys.path.append('..'); from nethack.ttyrec import TtyrecWriter; "
+                  "TtyrecWriter(sys.argv[1], interval=60).write('@', 10.0)")
+        subprocess.check_call([sys.executable, '-c', script, self.filename])
+        self.assertEquals([(10, 0, '@')], frames(open(self.filename, 'rb').read()))
+
+def writeGame (filename, compression=None):
+    """ Writes a ttyrec of the hero walking east for three turns """
+    writer = TtyrecWriter(filename, compression)
+    writer.write('\x1b[2J\x1b[10;10H@' + STATUS % 1 + '\x1b[10;10H', 100.0)
+    writer.write('\x1b[10;10H.@' + STATUS % 2 + '\x1b[10;11H', 101.5)
+    # An escape sequence split between two frames
+    writer.write('\x1b[10;11H.@' + STATUS % 3 + '\x1b[10', 102.0)
+    writer.write(';12H', 102.25)
+    writer.close()
+
+class TestTtyrecReader (unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.ttyrec')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def testReplay(self):
+        writeGame(self.filename)
+        reader = TtyrecReader(self.filename)
+        frames = list(reader.replay())
+        self.assertEquals([0, 1, 2, 3], [frame.index for frame in frames])
+        self.assertEquals([100.0, 101.5, 102.0, 102.25], [frame.stamp for frame in frames])
+        self.assertEquals(0, frames[0].offset)
+        self.assertEquals([1, 2, 3, 3], [frame.status.turn for frame in frames])
+        self.assertEquals((9, 8), (frames[0].x, frames[0].y))
+        self.assertEquals((11, 8), (frames[3].x, frames[3].y))
+        self.assertEquals(ord('@'), frames[3].chars[8, 11])
+        self.assertEquals(ord('.'), frames[3].chars[8, 10])
+        # Each frame is a copy, not a view of the screen
+        self.assertEquals(ord('@'), frames[0].chars[8, 9])
+        self.assertTrue(frames[2].status is frames[3].status)
+        reader.close()
+
+    def testSkipTimestamps(self):
+        writeGame(self.filename)
+        reader = TtyrecReader(self.filename)
+        frames = list(reader.replay(timestamps=False))
+        self.assertEquals([None] * 4, [frame.stamp for frame in frames])
+        self.assertEquals(3, frames[-1].status.turn)
+
+    def testStart(self):
+        writeGame(self.filename)
+        reader = TtyrecReader(self.filename)
+        offsets = [offset for offset, stamp, data in reader.frames()]
+        self.assertEquals([';12H'], [data for offset, stamp, data in reader.frames(offsets[3])])
+        self.assertEquals(len(reader), offsets[3] + HEADER.size + 4)
+
+    def testCutShort(self):
+        writeGame(self.filename)
+        f = open(self.filename, 'ab')
+        f.write(HEADER.pack(103, 0, 100) + 'x' * 10)
+        f.close()
+        self.assertEquals(4, len(list(TtyrecReader(self.filename).frames())))
+
+    def testCompressed(self):
+        for compression in [GZIP, ZLIB]:
+            os.remove(self.filename)
+            writeGame(self.filename, compression)
+            frames = list(TtyrecReader(self.filename, compression).replay())
+            self.assertEquals(3, frames[-1].status.turn)
+
+    def testEmpty(self):
+        self.assertEquals([], list(TtyrecReader(self.filename).replay()))
+
+def writeLongGame (filename, turns):
+    """ Writes a ttyrec of the hero pacing along a corridor for 'turns' turns """
+    writer = TtyrecWriter(filename)
+    writer.write('\x1b[2J\x1b[10;11H@' + STATUS % 1 + '\x1b[10;11H', 100.0)
+    for turn in range(2, turns + 1):
+        x = 10 + turn % 20
+        writer.write('\x1b[10;1H\x1b[K\x1b[10;%dH@' % (x + 1) + STATUS % turn +
+                     '\x1b[10;%dH' % (x + 1), 100.0 + turn)
+    writer.close()
+
+class TestKeyframeIndex (unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.ttyrec')
+        os.close(fd)
+        writeLongGame(self.filename, 50)
+
+    def tearDown(self):
+        for name in [self.filename, self.filename + INDEX_SUFFIX]:
+            if os.path.exists(name):
+                os.remove(name)
+
+    def testSeekMatchesReplay(self):
+        reader = TtyrecReader(self.filename)
+        frames = list(reader.replay())
+        index = reader.keyframes(interval=8)
+        self.assertEquals(50, len(index))
+        self.assertEquals(7, len(index.keyframes))
+        self.assertEquals([-1, 8, 16, 24, 32, 40, 48], list(index.turns))
+        for number in [0, 7, 8, 9, 30, 49]:
+            frame = reader.seek(number)
+            self.assertEquals(number, frame.index)
+            self.assertEquals(frames[number].offset, frame.offset)
+            self.assertEquals(frames[number].stamp, frame.stamp)
+            self.assertEquals(frames[number].status.turn, frame.status.turn)
+            self.assertEquals(frames[number].chars.tolist(), frame.chars.tolist())
+            self.assertEquals((frames[number].x, frames[number].y), (frame.x, frame.y))
+        self.assertRaises(IndexError, reader.seek, 50)
+
+    def testSeekTurn(self):
+        reader = TtyrecReader(self.filename)
+        reader.keyframes(interval=8)
+        for turn in [1, 9, 10, 33, 50]:
+            frame = reader.seekTurn(turn)
+            self.assertEquals(turn, frame.status.turn)
+            self.assertEquals(turn - 1, frame.index)
+        self.assertEquals(None, reader.seekTurn(51))
+
+    def testKeyframesWithoutStatus(self):
+        # A menu covers the screen, status and all, at frame 19, right before a keyframe
+        os.remove(self.filename)
+        writer = TtyrecWriter(self.filename)
+        for number in range(40):
+            if number == 19:
+                writer.write('\x1b[2J\x1b[1;1H Pick an object (end) ', 100.0 + number)
+            else:
+                writer.write('\x1b[2J\x1b[10;11H@' + STATUS % (10 * (number + 1)) + '\x1b[10;11H',
+                             100.0 + number)
+        writer.close()
+        reader = TtyrecReader(self.filename)
+        self.assertEquals([-1, 100, 190, 300], list(reader.keyframes(interval=10).turns))
+        frame = reader.seekTurn(160)
+        self.assertEquals((15, 160), (frame.index, frame.status.turn))
+        frame = reader.seekTurn(195)
+        self.assertEquals((20, 210), (frame.index, frame.status.turn))
+
+    def testCached(self):
+        reader = TtyrecReader(self.filename)
+        reader.keyframes(interval=8)
+        self.assertTrue(os.path.exists(self.filename + INDEX_SUFFIX))
+        saved = loadIndex(self.filename + INDEX_SUFFIX)
+        self.assertEquals(list(reader.index.offsets), list(saved.offsets))
+        self.assertTrue(saved.describes(self.filename))
+        # Another reader uses the saved one, unless it wants another interval
+        self.assertEquals(list(saved.turns), list(TtyrecReader(self.filename).keyframes(8).turns))
+        self.assertEquals(4, len(TtyrecReader(self.filename).keyframes(16).keyframes))
+
+    def testOutOfDate(self):
+        TtyrecReader(self.filename).keyframes(interval=8)
+        os.remove(self.filename)
+        writeLongGame(self.filename, 60)
+        os.utime(self.filename, (0, 0))
+        self.assertFalse(loadIndex(self.filename + INDEX_SUFFIX).describes(self.filename))
+        reader = TtyrecReader(self.filename)
+        self.assertEquals(60, len(reader.keyframes(interval=8)))
+        self.assertEquals(60, reader.seek(59).status.turn)
+
+    def testBrokenCache(self):
+        f = open(self.filename + INDEX_SUFFIX, 'wb')
+        f.write('not an index')
+        f.close()
+        self.assertEquals(50, len(TtyrecReader(self.filename).keyframes(interval=8)))
+
+class TestRecordingGames (unittest.TestCase):
+    def testWatchIsRecorded(self):
+        fd, filename = tempfile.mkstemp(suffix='.ttyrec')
+        os.close(fd)
+        try:
+            recording = recordedGame()
+            conn = ReplayNetHackConnection(recording)
+            conn.ttyrec = TtyrecWriter(filename)
+            np = NetHackPlayer(conn)
+            np.watch()
+            np.go('E')
+            np.go('E')
+            np.send('e')
+            np.watch()
+            conn.ttyrec.close()
+            recorded = frames(open(filename, 'rb').read())
+            self.assertEquals(recording.output(), ''.join([data for s, u, data in recorded]))
+            stamps = [(s, u) for s, u, data in recorded]
+            self.assertEquals(sorted(stamps), stamps)
+            self.assertEquals(None, pickle.loads(pickle.dumps(conn)).ttyrec)
+        finally:
+            os.remove(filename)
+
+    def testRecordingFails(self):
+        conn = ReplayNetHackConnection(recordedGame())
+        conn.ttyrec = TtyrecWriter(FullDisk(), interval=0.01)
+        conn.ttyrec.write('x')
+        deadline = time.time() + 5
+        while conn.ttyrec.error is None and time.time() < deadline:
+            time.sleep(0.01)
+        counter = LogCounter()
+        logging.getLogger('nethack').addHandler(counter)
+        try:
+            np = NetHackPlayer(conn)
+            np.watch()
+            np.go('E')
+            np.go('E')
+        finally:
+            logging.getLogger('nethack').removeHandler(counter)
+        self.assertEquals(None, conn.ttyrec)
+        self.assertEquals(1, len(counter.records))
+        self.assertEquals(3, np.turn())
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestTtyrecWriter))
+    suite.addTest(unittest.makeSuite(TestTtyrecReader))
+    suite.addTest(unittest.makeSuite(TestKeyframeIndex))
+    suite.addTest(unittest.makeSuite(TestRecordingGames))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
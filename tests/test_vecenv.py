@@ -0,0 +1,113 @@
+import sys
+import time
+import unittest
+
+sys.path.append('..')
+import numpy
+import pexpect
+from nethack.vecenv import VectorEnv, StatusReward, ACTIONS
+from nethack.replay import Recording, ReplayChild, ReplayNetHackConnection, READ, SENT, ENDED
+from nethack.observation import STATUS_FIELDS, GOLD, TURN, HIT_POINTS
+from nethack.scraper import ROWS, WIDTH
+
+STATUS = ('\x1b[23;1HAnthony the Stripling  St:15 Dx:13 Co:18 In:11 Wi:10 Ch:8  Lawful'
+          '\x1b[24;1HDlvl:1  $:%d  HP:16(16) Pw:2(2) AC:6  Exp:1  T:%d')
+
+def walkingGame(gold=5):
+    """ The hero walks east twice, finding 'gold' gold on the first step,
+        and then the game ends """
+    recording = Recording()
+    recording.add(READ, '\x1b[2J\x1b[10;10H@' + STATUS % (0, 1) + '\x1b[10;10H')
+    recording.add(SENT, 'l')
+    recording.add(READ, '\x1b[10;10H.@' + STATUS % (gold, 2) + '\x1b[10;11H')
+    recording.add(SENT, 'l')
+    recording.add(READ, '\x1b[10;11H.@' + STATUS % (gold, 3) + '\x1b[10;12H')
+    recording.add(ENDED, '')
+    return recording
+
+class SlowChild (ReplayChild):
+    """ A replayed game that takes 'delay' seconds to settle, as a real one would """
+    delay = 0.2
+    def expect (self, patterns, timeout=None):
+        index = ReplayChild.expect(self, patterns, timeout)
+        if self.after is pexpect.TIMEOUT:
+            time.sleep(self.delay)
+        return index
+
+def slowGame(number):
+    connection = ReplayNetHackConnection(walkingGame())
+    connection.child = SlowChild(connection.recording)
+    return connection
+
+EAST = ACTIONS.index('l')
+
+class TestVectorEnv (unittest.TestCase):
+    def testStep(self):
+        env = VectorEnv(lambda number: ReplayNetHackConnection(walkingGame(number * 10)), 3)
+        observations = env.reset()
+        self.assertEquals((3, 4, ROWS, WIDTH), observations['planes'].shape)
+        self.assertEquals((3, len(STATUS_FIELDS)), observations['status'].shape)
+        self.assertEquals([1, 1, 1], observations['status'][:, TURN].tolist())
+        self.assertEquals([9, 9], observations['cursor'][0].tolist())
+        observations, rewards, dones, infos = env.step(numpy.array([EAST] * 3))
+        self.assertEquals([0.0, 10.0, 20.0], rewards.tolist())
+        self.assertEquals([False] * 3, dones.tolist())
+        self.assertEquals(ord('@'), observations['planes'][1, 0, 9, 10])
+        self.assertEquals([2, 2, 2], observations['status'][:, TURN].tolist())
+        self.assertEquals([10, 9], observations['cursor'][2].tolist())
+        env.close()
+
+    def testGamesStartAgain(self):
+        started = []
+        def factory(number):
+            started.append(number)
+            return ReplayNetHackConnection(walkingGame())
+        env = VectorEnv(factory, 2)
+        env.reset()
+        env.step([EAST, EAST])
+        observations, rewards, dones, infos = env.step([EAST, EAST])
+        self.assertEquals([True, True], dones.tolist())
+        self.assertEquals(3, infos[0]['final_status'][TURN])
+        # The observation is of the new game
+        self.assertEquals([1, 1], observations['status'][:, TURN].tolist())
+        self.assertEquals([0, 0], observations['status'][:, GOLD].tolist())
+        self.assertEquals([0, 0, 1, 1], sorted(started))
+        observations, rewards, dones, infos = env.step([EAST, EAST])
+        self.assertEquals([False, False], dones.tolist())
+        self.assertEquals([5.0, 5.0], rewards.tolist())
+        env.close()
+
+    def testOverlapped(self):
+        env = VectorEnv(slowGame, 4)
+        start = time.time()
+        env.reset()
+        env.step([EAST] * 4)
+        elapsed = time.time() - start
+        # Two waits for each game, that would be 1.6s one after the other
+        self.assertTrue(elapsed < 4 * SlowChild.delay, elapsed)
+        env.close()
+
+    def testActionCount(self):
+        env = VectorEnv(lambda number: ReplayNetHackConnection(walkingGame()), 2)
+        env.reset()
+        self.assertRaises(ValueError, env.step, [EAST])
+        env.close()
+
+class TestStatusReward (unittest.TestCase):
+    def testDeltas(self):
+        before = numpy.zeros((2, len(STATUS_FIELDS)), dtype=numpy.float32)
+        after = before.copy()
+        after[0, GOLD] = 7
+        after[1, GOLD] = numpy.nan
+        after[1, HIT_POINTS] = -3
+        self.assertEquals([7.0, 0.0], StatusReward()(before, after).tolist())
+        self.assertEquals([0.0, -3.0], StatusReward({HIT_POINTS: 1.0})(before, after).tolist())
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestVectorEnv))
+    suite.addTest(unittest.makeSuite(TestStatusReward))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()